@@ -0,0 +1,154 @@
+"""Incremental parsing of bulk upload bodies.
+
+Bodies arrive as an async stream of byte chunks and are turned into one
+dict per record as lines complete, so an upload is never held in memory
+as a whole. NDJSON carries one JSON object per line; CSV starts with a
+header row naming the fields, and quoted fields may span lines. A line (or
+CSV record) longer than ``max_line_length`` characters raises
+:class:`LineTooLong`.
+"""
+import codecs
+import collections
+import csv
+import json
+from typing import AsyncIterator, Iterator, Tuple, Union
+
+NDJSON_TYPES = ("application/x-ndjson", "application/jsonl", "application/json-seq")
+CSV_TYPES = ("text/csv", "application/csv")
+
+
+class UnsupportedFormat(Exception):
+    pass
+
+
+class LineTooLong(Exception):
+    pass
+
+
+class _LineFeed(Iterator[str]):
+    """Lines for one long-lived ``csv.reader``, handed over a whole record at a time."""
+
+    def __init__(self):
+        self.lines = collections.deque()
+
+    def __next__(self) -> str:
+        if not self.lines:
+            raise StopIteration
+        return self.lines.popleft()
+
+
+def body_format(content_type: str) -> str:
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    if media_type in NDJSON_TYPES:
+        return "ndjson"
+    if media_type in CSV_TYPES:
+        return "csv"
+    raise UnsupportedFormat(media_type)
+
+
+async def iter_lines(chunks: AsyncIterator[bytes], max_line_length: int) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            if len(line) > max_line_length:
+                raise LineTooLong()
+            yield line.rstrip("\r")
+        if len(pending) > max_line_length:
+            raise LineTooLong()
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+
+async def iter_records(chunks: AsyncIterator[bytes], fmt: str,
+                       max_line_length: int = 65536) -> AsyncIterator[Tuple[int, Union[dict, str]]]:
+    """Yield ``(index, record)`` for each non-blank record in the body.
+
+    A record that cannot be parsed is yielded as an error string instead of
+    a dict, so callers can report it against its index and carry on.
+    """
+    lines = iter_lines(chunks, max_line_length)
+    index = 0
+    if fmt == "csv":
+        header = None
+        async for row in _csv_rows(lines, max_line_length):
+            if header is None:
+                header = [name.strip() for name in row]
+                continue
+            if len(row) != len(header):
+                yield index, f"Expected {len(header)} fields, got {len(row)}"
+            else:
+                yield index, {name: value for name, value in zip(header, row) if value != ""}
+            index += 1
+        return
+    async for line in lines:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            record = f"Invalid JSON: {e}"
+        yield index, record
+        index += 1
+
+
+def _quoted_field_open(line: str, quoted: bool) -> bool:
+    """Whether a quoted field is still open after ``line``, following the ``csv`` module's rules.
+
+    A quote only opens a field when it is the field's first character; inside
+    one, ``""`` is an escaped quote and a lone ``"`` closes it. A quote
+    anywhere else is read literally.
+    """
+    if not quoted and '"' not in line:
+        return False
+    field_start = not quoted
+    i = 0
+    while i < len(line):
+        char = line[i]
+        if quoted:
+            if char == '"':
+                if line[i + 1:i + 2] == '"':
+                    i += 1
+                else:
+                    quoted = False
+        elif char == ",":
+            field_start = True
+            i += 1
+            continue
+        elif char == '"' and field_start:
+            quoted = True
+        field_start = False
+        i += 1
+    return quoted
+
+
+async def _csv_rows(lines: AsyncIterator[str], max_line_length: int) -> AsyncIterator[list]:
+    # The reader only ever sees complete records: lines are held back while a
+    # quoted field is open.
+    feed = _LineFeed()
+    reader = csv.reader(feed)
+    pending = []
+    quoted = False
+    length = 0
+    async for line in lines:
+        if not pending and not line.strip():
+            continue
+        pending.append(line + "\n")
+        quoted = _quoted_field_open(line, quoted)
+        length += len(line) + 1
+        if quoted:
+            if length > max_line_length:
+                raise LineTooLong()
+            continue
+        feed.lines.extend(pending)
+        pending = []
+        length = 0
+        while feed.lines:
+            yield next(reader)
+    # An unterminated quote: the reader takes the field to the end of the body.
+    feed.lines.extend(pending)
+    while feed.lines:
+        yield next(reader)
@@ -0,0 +1,242 @@
+"""asyncpg pool setup and instrumentation.
+
+Sizing, timeouts and connection recycling come from the environment.
+``InstrumentedPool`` wraps the asyncpg pool with the same ``acquire()`` /
+``close()`` interface, records how long handlers wait for a connection and
+turns a drained pool into :class:`PoolExhausted` instead of an unbounded
+wait.
+
+``ReadRouter`` sends read-only queries to an optional replica pool, except
+for users who wrote recently (so they read their own writes) and while the
+replica is failing.
+"""
+import asyncio
+import functools
+import logging
+import os
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Sequence, Tuple
+
+import asyncpg
+
+from cache import MISSING, ResultCache
+from metrics import Histogram, HistogramFamily
+
+logger = logging.getLogger(__name__)
+
+DB_POOL_MIN_SIZE = int(os.environ.get('DB_POOL_MIN_SIZE', '1'))
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '5'))
+DB_ACQUIRE_TIMEOUT_SECONDS = float(os.environ.get('DB_ACQUIRE_TIMEOUT_SECONDS', '2'))
+DB_MAX_WAITERS = int(os.environ.get('DB_MAX_WAITERS', '100'))
+DB_STATEMENT_CACHE_SIZE = int(os.environ.get('DB_STATEMENT_CACHE_SIZE', '100'))
+DB_MAX_CONNECTION_LIFETIME_SECONDS = float(os.environ.get('DB_MAX_CONNECTION_LIFETIME_SECONDS', '1800'))
+DB_MAX_INACTIVE_CONNECTION_LIFETIME_SECONDS = float(os.environ.get('DB_MAX_INACTIVE_CONNECTION_LIFETIME_SECONDS', '300'))
+DB_READ_YOUR_WRITES_SECONDS = float(os.environ.get('DB_READ_YOUR_WRITES_SECONDS', '5'))  # > worst expected replica lag
+DB_REPLICA_RETRY_SECONDS = float(os.environ.get('DB_REPLICA_RETRY_SECONDS', '10'))
+DB_MAX_PINNED_USERS = int(os.environ.get('DB_MAX_PINNED_USERS', '100000'))
+
+
+class PoolExhausted(Exception):
+    """Raised when no connection frees up within the acquire timeout."""
+
+
+# Errors that mean the server or connection is unusable rather than the query being wrong.
+TRANSIENT_ERRORS = (PoolExhausted, OSError, asyncio.TimeoutError, asyncpg.InterfaceError,
+                    asyncpg.PostgresConnectionError, asyncpg.CannotConnectNowError)
+# A replica failing with one of these is skipped in favour of the primary.
+REPLICA_ERRORS = TRANSIENT_ERRORS
+
+
+@functools.lru_cache(maxsize=1024)
+def statement_label(query: str) -> str:
+    """Collapse whitespace so the same SQL always maps to the same metric label."""
+    return " ".join(query.split())[:200]
+
+
+class InstrumentedPool:
+    def __init__(self, acquire_timeout: float, max_waiters: int, max_lifetime: float,
+                 query_seconds: Optional[HistogramFamily] = None):
+        self.acquire_timeout = acquire_timeout
+        self.max_waiters = max_waiters
+        self.max_lifetime = max_lifetime
+        self.pool = None
+        self.waiting = 0
+        self.exhausted = 0
+        self.recycled = 0
+        self.acquire_seconds = Histogram()
+        self.query_seconds = query_seconds
+        self._connected_at: Dict[int, float] = {}
+
+    async def init_connection(self, conn):
+        """asyncpg ``init`` hook: remember when each server connection was opened."""
+        self._connected_at[conn.get_server_pid()] = time.monotonic()
+        if self.query_seconds is not None:
+            conn.add_query_logger(self._observe_query)
+
+    def _observe_query(self, record):
+        self.query_seconds.labels(statement_label(record.query)).observe(record.elapsed)
+
+    @asynccontextmanager
+    async def acquire(self):
+        if self.waiting >= self.max_waiters:
+            self.exhausted += 1
+            raise PoolExhausted()
+        started_at = time.perf_counter()
+        self.waiting += 1
+        try:
+            conn = await self.pool.acquire(timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            self.exhausted += 1
+            raise PoolExhausted() from None
+        finally:
+            self.waiting -= 1
+            self.acquire_seconds.observe(time.perf_counter() - started_at)
+        try:
+            yield conn
+        finally:
+            await self._release(conn)
+
+    async def _release(self, conn):
+        pid = conn.get_server_pid()
+        connected_at = self._connected_at.get(pid)
+        if (
+            self.max_lifetime > 0
+            and connected_at is not None
+            and time.monotonic() - connected_at > self.max_lifetime
+            and not conn.is_closed()
+        ):
+            # Closing a pooled connection hands its slot back to the pool,
+            # which opens a fresh connection on the next acquire.
+            del self._connected_at[pid]
+            self.recycled += 1
+            await conn.close()
+        else:
+            await self.pool.release(conn)
+
+    async def warmup(self, queries: Iterable[Tuple[str, Sequence]]):
+        """Open the minimum number of connections and prepare ``queries`` on each.
+
+        Running a query once stores its prepared statement in the
+        connection's statement cache, so later calls skip the parse step.
+        """
+        queries = list(queries)
+        connections = [await self.pool.acquire() for _ in range(self.pool.get_min_size())]
+        try:
+            for conn in connections:
+                for query, args in queries:
+                    await conn.fetch(query, *args)
+        finally:
+            for conn in connections:
+                await self.pool.release(conn)
+
+    def stats(self) -> dict:
+        size = self.pool.get_size() if self.pool else 0
+        idle = self.pool.get_idle_size() if self.pool else 0
+        return {
+            "size": size,
+            "idle": idle,
+            "in_use": size - idle,
+            "min_size": self.pool.get_min_size() if self.pool else 0,
+            "max_size": self.pool.get_max_size() if self.pool else 0,
+            "waiting": self.waiting,
+            "exhausted": self.exhausted,
+            "recycled": self.recycled,
+            "acquire_seconds": self.acquire_seconds.snapshot(),
+        }
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+
+
+async def connect(dsn: str):
+    """One connection outside the pool, for holding a session lock without taking a pool slot."""
+    return await asyncpg.connect(dsn)
+
+
+async def create_pool(dsn: str, query_seconds: Optional[HistogramFamily] = None) -> InstrumentedPool:
+    """Open the pool; pass ``query_seconds`` to time every statement by its SQL."""
+    instrumented = InstrumentedPool(
+        DB_ACQUIRE_TIMEOUT_SECONDS, DB_MAX_WAITERS, DB_MAX_CONNECTION_LIFETIME_SECONDS, query_seconds
+    )
+    instrumented.pool = await asyncpg.create_pool(
+        dsn=dsn,
+        min_size=DB_POOL_MIN_SIZE,
+        max_size=DB_POOL_MAX_SIZE,
+        max_inactive_connection_lifetime=DB_MAX_INACTIVE_CONNECTION_LIFETIME_SECONDS,
+        statement_cache_size=DB_STATEMENT_CACHE_SIZE,
+        init=instrumented.init_connection,
+    )
+    return instrumented
+
+
+class ReadRouter:
+    """Pick the pool for a read: the replica, unless the reader needs the primary.
+
+    Reads go to the primary while no replica is configured, for
+    ``read_your_writes`` seconds after :meth:`mark_write` for the same key,
+    and for ``retry_after`` seconds after the replica fails. Pins live in
+    this process only, so they hold for a user whose requests reach the
+    same worker.
+    """
+
+    def __init__(self, get_primary: Callable[[], Any], get_replica: Callable[[], Any],
+                 read_your_writes: float, retry_after: float, max_pinned: int):
+        self.get_primary = get_primary
+        self.get_replica = get_replica
+        self.retry_after = retry_after
+        self._recent_writes = ResultCache(max_pinned, max_pinned, read_your_writes)
+        self._replica_down_until = 0.0
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self.pinned_reads = 0
+        self.replica_failures = 0
+
+    def mark_write(self, key: Hashable):
+        self._recent_writes.put(key, True, 1)
+
+    def replica_healthy(self) -> bool:
+        return time.monotonic() >= self._replica_down_until
+
+    def _replica_failed(self, error: BaseException):
+        self.replica_failures += 1
+        self._replica_down_until = time.monotonic() + self.retry_after
+        logger.warning("Read replica failed, reading from the primary for %ss: %r", self.retry_after, error)
+
+    @asynccontextmanager
+    async def acquire(self, key: Optional[Hashable] = None):
+        """A connection for read-only queries on behalf of ``key`` (usually a user id)."""
+        replica = self.get_replica()
+        if replica is not None and key is not None and self._recent_writes.get(key) is not MISSING:
+            self.pinned_reads += 1
+            replica = None
+        async with AsyncExitStack() as stack:
+            conn = None
+            if replica is not None and self.replica_healthy():
+                try:
+                    conn = await stack.enter_async_context(replica.acquire())
+                except REPLICA_ERRORS as e:
+                    self._replica_failed(e)
+            if conn is None:
+                self.primary_reads += 1
+                conn = await stack.enter_async_context(self.get_primary().acquire())
+                yield conn
+                return
+            self.replica_reads += 1
+            try:
+                yield conn
+            except REPLICA_ERRORS as e:
+                self._replica_failed(e)
+                raise
+
+    def stats(self) -> dict:
+        return {
+            "replica_configured": self.get_replica() is not None,
+            "replica_healthy": self.replica_healthy(),
+            "replica_reads": self.replica_reads,
+            "primary_reads": self.primary_reads,
+            "pinned_reads": self.pinned_reads,
+            "replica_failures": self.replica_failures,
+            "pinned_users": self._recent_writes.stats()["entries"],
+        }
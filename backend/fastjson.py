@@ -0,0 +1,44 @@
+"""Opt-in fast JSON encoding for large responses.
+
+With ``FAST_JSON_RESPONSES`` set and orjson installed, routes can encode
+asyncpg records or already-validated models straight to bytes and return
+them as a ready :class:`~starlette.responses.Response`, which bypasses
+FastAPI's re-validation and ``jsonable_encoder`` pass for ``response_model``.
+"""
+import os
+from typing import Iterable, Mapping
+
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+ENABLED = os.environ.get('FAST_JSON_RESPONSES', '').lower() in ('1', 'true', 'yes') and orjson is not None
+DEFAULT_RESPONSE_CLASS = ORJSONResponse if ENABLED else JSONResponse
+
+# UTC datetimes as "...Z", matching pydantic's JSON output.
+_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_SERIALIZE_NUMPY if orjson is not None else 0
+
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content, option=_OPTIONS)
+
+
+def record(row: Mapping) -> bytes:
+    """Encode a database row whose columns already match the response model's fields."""
+    return dumps(dict(row))
+
+
+def records(rows: Iterable[Mapping]) -> bytes:
+    return dumps([dict(row) for row in rows])
+
+
+def response(content: bytes, headers: Mapping[str, str] = None, status_code: int = 200) -> Response:
+    return Response(content, status_code=status_code, headers=headers, media_type="application/json")
+
+
+def model(value: BaseModel) -> bytes:
+    return value.model_dump_json().encode()
@@ -0,0 +1,97 @@
+"""Password hashing off the event loop.
+
+pbkdf2 spends tens of milliseconds of CPU per call inside OpenSSL, which
+releases the GIL, so a small thread pool runs hashes in parallel without
+stalling other requests. Callers queue for one of ``max_concurrency`` slots
+and are turned away with :class:`HashingUnavailable` when the queue is full
+or the wait exceeds ``queue_timeout``.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Optional, Tuple, Union
+
+from metrics import Histogram
+
+if TYPE_CHECKING:
+    from passlib.context import CryptContext
+
+
+class HashingUnavailable(Exception):
+    """Raised when no hashing slot frees up in time."""
+
+
+class PasswordHasher:
+    """Hashes with ``context``, which may also be a function that builds it on first use."""
+
+    def __init__(self, context: Union["CryptContext", Callable[[], "CryptContext"]], max_concurrency: int,
+                 max_queue: int, queue_timeout: float):
+        self._context = context
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="password-hash")
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._slots_loop = None
+        self.waiting = 0
+        self.in_flight = 0
+        self.rejected = 0
+        self.wait_seconds = Histogram()
+        self.hash_seconds = Histogram()
+
+    @property
+    def context(self) -> "CryptContext":
+        if callable(self._context):
+            self._context = self._context()
+        return self._context
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify_and_update(self, password: str, password_hash: str) -> Tuple[bool, Optional[str]]:
+        """Verify ``password``; also return a new hash if the stored one uses outdated settings."""
+        return await self._run(self.context.verify_and_update, password, password_hash)
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "queue_depth": self.waiting,
+            "in_flight": self.in_flight,
+            "rejected": self.rejected,
+            "wait_seconds": self.wait_seconds.snapshot(),
+            "hash_seconds": self.hash_seconds.snapshot(),
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._slots_loop is not loop:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+            self._slots_loop = loop
+        return self._slots
+
+    async def _run(self, func, *args):
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise HashingUnavailable()
+        slots = self._get_slots()
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise HashingUnavailable() from None
+        finally:
+            self.waiting -= 1
+        started_at = time.perf_counter()
+        self.wait_seconds.observe(started_at - queued_at)
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self.in_flight -= 1
+            slots.release()
+            self.hash_seconds.observe(time.perf_counter() - started_at)
@@ -0,0 +1,30 @@
+"""Deferred imports for modules most workers never or only later need.
+
+``lazy_import`` returns a module object straight away and runs the real
+import on first attribute access, which keeps slow imports (passlib, pyjwt,
+multiprocessing) out of worker cold start. Profile what is left with
+``python -m benchmarks.bench_startup``.
+"""
+import importlib.util
+import sys
+import types
+
+
+def lazy_import(name: str) -> types.ModuleType:
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+def loaded(module: types.ModuleType) -> bool:
+    """Whether ``module`` has actually been imported; checking doesn't import it."""
+    # type() rather than an attribute, since any attribute access would load it.
+    return type(module) is not importlib.util._LazyModule
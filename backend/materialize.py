@@ -0,0 +1,176 @@
+"""Background materialization of goal projections.
+
+Each goal row carries its projected completion date and value, so goal
+listings read them instead of projecting on every request. A projection is
+stale when the goal's ``version`` differs from the version it was computed
+from, which is the case for every new goal and after every update.
+
+:class:`ProjectionWorker` runs as one task per process. Woken by
+:meth:`ProjectionWorker.notify` after goal writes, or every
+``poll_interval`` for writes made by other processes, it recomputes stale
+goals ``chunk_size`` at a time. A pass only runs while holding the storage's
+projection lock, so however many processes share the database one of them
+does the work and the others skip the pass; a goal written while another
+process holds the lock is picked up by that process or by the next poll.
+When the risk profile returns differ from those the stored projections
+were computed with (at startup, or after ``tables.watch`` reloads them), it
+sweeps every goal in id order and recomputes those projected with an old
+return. Each chunk is computed off the event loop and
+saved with one statement that only applies to goals still at the version
+read, so a concurrent edit is never overwritten with an outdated projection.
+"""
+import asyncio
+import calendar
+import logging
+import time
+from datetime import date, datetime, timezone
+from typing import Any, Callable, List, Mapping, Optional
+
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+from metrics import Histogram
+from projection import RISK_RETURNS, annual_return_for, goal_completions
+
+logger = logging.getLogger(__name__)
+
+
+def add_months(day: date, months: int) -> date:
+    """``day`` moved forward by whole months, clamped to the end of shorter months."""
+    year, month = divmod(day.month - 1 + months, 12)
+    year += day.year
+    return date(year, month + 1, min(day.day, calendar.monthrange(year, month + 1)[1]))
+
+
+def compute(rows: List[Mapping], horizon_months: int, today: date) -> tuple:
+    """Projections for ``rows`` as (values, completion dates, annual returns) lists."""
+    annual_returns = [annual_return_for(r["risk_profile"]) for r in rows]
+    reached_month, value = goal_completions(
+        [r["current_amount"] for r in rows],
+        [r["monthly_investment"] for r in rows],
+        [r["target_amount"] for r in rows],
+        annual_returns,
+        horizon_months,
+    )
+    value = np.where(np.isfinite(value), value.round(2), np.nan)
+    values = [None if np.isnan(v) else v for v in value.tolist()]
+    completion_dates = [add_months(today, month) if month >= 0 else None for month in reached_month.tolist()]
+    return values, completion_dates, annual_returns
+
+
+class ProjectionWorker:
+    def __init__(self, get_storage: Callable[[], Any], on_saved: Callable[[str], None], chunk_size: int,
+                 poll_interval: float, horizon_months: int):
+        self.get_storage = get_storage
+        self.on_saved = on_saved
+        self.chunk_size = chunk_size
+        self.poll_interval = poll_interval
+        self.horizon_months = horizon_months
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._returns: Optional[dict] = None
+        self.recomputed = 0
+        self.discarded = 0
+        self.sweeps = 0
+        self.skipped = 0
+        self.failures = 0
+        self.chunk_seconds = Histogram()
+
+    def start(self):
+        self._wake = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._wake = None
+
+    def notify(self):
+        """Call after writing goals, so their projections are recomputed soon."""
+        if self._wake is not None:
+            self._wake.set()
+
+    def stats(self) -> dict:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "recomputed": self.recomputed,
+            "discarded": self.discarded,
+            "sweeps": self.sweeps,
+            "skipped": self.skipped,
+            "failures": self.failures,
+            "chunk_seconds": self.chunk_seconds.snapshot(),
+        }
+
+    async def run_once(self):
+        """Sweep if projections were made with other returns, then recompute every stale goal."""
+        storage = self.get_storage()
+        async with storage.projection_lock() as acquired:
+            if not acquired:
+                self.skipped += 1
+                return
+            returns = dict(RISK_RETURNS)
+            if returns != self._returns:
+                if await self._returns_outdated(storage):
+                    await self.sweep()
+                self._returns = returns
+            while True:
+                rows = await storage.stale_projections(self.chunk_size)
+                if not rows:
+                    return
+                saved = await self._process(rows)
+                if saved == 0 and len(rows) < self.chunk_size:
+                    # Every goal read changed again before we saved; the next wake-up retries them.
+                    return
+
+    async def _returns_outdated(self, storage) -> bool:
+        rows = await storage.projected_returns()
+        return any(r["projected_return"] != annual_return_for(r["risk_profile"]) for r in rows)
+
+    async def sweep(self):
+        """Recompute every goal projected with a return other than its profile's current one."""
+        storage = self.get_storage()
+        after_id = ""
+        while True:
+            rows = await storage.projection_inputs(after_id, self.chunk_size)
+            if not rows:
+                break
+            after_id = rows[-1]["id"]
+            outdated = [r for r in rows if r["projected_return"] != annual_return_for(r["risk_profile"])]
+            if outdated:
+                await self._process(outdated)
+            else:
+                await asyncio.sleep(0)
+        self.sweeps += 1
+
+    async def _process(self, rows: List[Mapping]) -> int:
+        started_at = time.perf_counter()
+        today = datetime.now(timezone.utc).date()
+        values, completion_dates, annual_returns = await run_in_threadpool(compute, rows, self.horizon_months, today)
+        user_ids = await self.get_storage().save_projections(
+            [r["id"] for r in rows], [r["version"] for r in rows], values, completion_dates, annual_returns
+        )
+        for user_id in set(user_ids):
+            self.on_saved(user_id)
+        self.chunk_seconds.observe(time.perf_counter() - started_at)
+        self.recomputed += len(user_ids)
+        self.discarded += len(rows) - len(user_ids)
+        return len(user_ids)
+
+    async def _run(self):
+        while True:
+            self._wake.clear()
+            try:
+                await self.run_once()
+            except Exception:
+                self.failures += 1
+                logger.exception("Projection pass failed, retrying in %.1fs", self.poll_interval)
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
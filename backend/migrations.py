@@ -0,0 +1,238 @@
+"""Versioned schema migrations.
+
+Each migration is applied once, in its own transaction, and recorded in the
+``schema_version`` table. A session advisory lock serializes concurrent
+runners, so when several workers (or deploy jobs) migrate at once the first
+applies the pending steps and the rest find nothing left to do.
+
+Migrations run from the command line, before new workers start::
+
+    python -m migrations            # apply pending migrations
+    python -m migrations status     # print the current and latest version
+
+Worker startup only checks that the database is at least at
+:data:`LATEST_VERSION` (or migrates itself with ``DB_MIGRATE_ON_STARTUP``).
+Never edit an applied migration; append a new one.
+"""
+import argparse
+import asyncio
+import logging
+import os
+from typing import List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary, but fixed: every runner must use the same key.
+LOCK_ID = 0x7765616C7468  # "wealth"
+
+MIGRATIONS: List[Tuple[int, str, str]] = [
+    (1, "users, goals and contact messages", """
+        CREATE TABLE IF NOT EXISTS users (
+            id TEXT PRIMARY KEY,
+            email TEXT UNIQUE NOT NULL,
+            name TEXT NOT NULL,
+            picture TEXT NOT NULL,
+            password_hash TEXT NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS goals (
+            id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            goal_type TEXT NOT NULL,
+            target_amount DOUBLE PRECISION NOT NULL,
+            current_amount DOUBLE PRECISION NOT NULL,
+            monthly_investment DOUBLE PRECISION NOT NULL,
+            risk_profile TEXT NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_goals_user_id ON goals(user_id);
+        CREATE TABLE IF NOT EXISTS contact_messages (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            email TEXT NOT NULL,
+            message TEXT NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL
+        );
+    """),
+    (2, "keyset index for goal pages", """
+        CREATE INDEX IF NOT EXISTS idx_goals_user_created ON goals(user_id, created_at DESC, id);
+        DROP INDEX IF EXISTS idx_goals_user_id;
+    """),
+    (3, "goal versions and per-user goals version", """
+        ALTER TABLE goals ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+        ALTER TABLE users ADD COLUMN IF NOT EXISTS goals_version BIGINT NOT NULL DEFAULT 0;
+        CREATE OR REPLACE FUNCTION bump_goals_version() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                UPDATE users SET goals_version = goals_version + 1
+                WHERE id IN (SELECT DISTINCT user_id FROM old_goals);
+            ELSE
+                UPDATE users SET goals_version = goals_version + 1
+                WHERE id IN (SELECT DISTINCT user_id FROM new_goals);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        DROP TRIGGER IF EXISTS goals_version_insert ON goals;
+        CREATE TRIGGER goals_version_insert AFTER INSERT ON goals
+            REFERENCING NEW TABLE AS new_goals FOR EACH STATEMENT EXECUTE FUNCTION bump_goals_version();
+        DROP TRIGGER IF EXISTS goals_version_update ON goals;
+        CREATE TRIGGER goals_version_update AFTER UPDATE ON goals
+            REFERENCING NEW TABLE AS new_goals FOR EACH STATEMENT EXECUTE FUNCTION bump_goals_version();
+        DROP TRIGGER IF EXISTS goals_version_delete ON goals;
+        CREATE TRIGGER goals_version_delete AFTER DELETE ON goals
+            REFERENCING OLD TABLE AS old_goals FOR EACH STATEMENT EXECUTE FUNCTION bump_goals_version();
+    """),
+    (4, "goal contributions and their day, month and year rollups", """
+        CREATE TABLE IF NOT EXISTS goal_contributions (
+            id BIGSERIAL PRIMARY KEY,
+            goal_id TEXT NOT NULL REFERENCES goals(id) ON DELETE CASCADE,
+            amount DOUBLE PRECISION NOT NULL,
+            balance DOUBLE PRECISION NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_goal_contributions_goal ON goal_contributions(goal_id, created_at);
+        CREATE TABLE IF NOT EXISTS goal_contribution_rollups (
+            goal_id TEXT NOT NULL REFERENCES goals(id) ON DELETE CASCADE,
+            resolution TEXT NOT NULL,
+            period_start TIMESTAMPTZ NOT NULL,
+            contributed DOUBLE PRECISION NOT NULL,
+            balance DOUBLE PRECISION NOT NULL,
+            contributions INTEGER NOT NULL,
+            PRIMARY KEY (goal_id, resolution, period_start)
+        );
+        -- Every change to current_amount is a contribution: a new goal's opening
+        -- balance, an update, or a POST to /goals/{id}/contributions.
+        CREATE OR REPLACE FUNCTION record_goal_contributions() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                INSERT INTO goal_contributions (goal_id, amount, balance, created_at)
+                SELECT id, current_amount, current_amount, created_at FROM new_goals WHERE current_amount <> 0;
+            ELSE
+                INSERT INTO goal_contributions (goal_id, amount, balance, created_at)
+                SELECT n.id, n.current_amount - o.current_amount, n.current_amount, now()
+                FROM new_goals n JOIN old_goals o ON o.id = n.id
+                WHERE n.current_amount <> o.current_amount;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        DROP TRIGGER IF EXISTS goal_contributions_insert ON goals;
+        CREATE TRIGGER goal_contributions_insert AFTER INSERT ON goals
+            REFERENCING NEW TABLE AS new_goals FOR EACH STATEMENT EXECUTE FUNCTION record_goal_contributions();
+        DROP TRIGGER IF EXISTS goal_contributions_update ON goals;
+        CREATE TRIGGER goal_contributions_update AFTER UPDATE ON goals
+            REFERENCING OLD TABLE AS old_goals NEW TABLE AS new_goals
+            FOR EACH STATEMENT EXECUTE FUNCTION record_goal_contributions();
+        -- Rollups are kept up to date as contributions arrive, so history reads
+        -- never touch goal_contributions.
+        CREATE OR REPLACE FUNCTION roll_up_goal_contributions() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO goal_contribution_rollups AS r (goal_id, resolution, period_start, contributed, balance, contributions)
+            SELECT c.goal_id, p.resolution, date_trunc(p.resolution, c.created_at, 'UTC'),
+                   sum(c.amount), (array_agg(c.balance ORDER BY c.created_at DESC, c.id DESC))[1], count(*)
+            FROM new_contributions c CROSS JOIN (VALUES ('day'), ('month'), ('year')) AS p(resolution)
+            GROUP BY 1, 2, 3
+            ON CONFLICT (goal_id, resolution, period_start) DO UPDATE SET
+                contributed = r.contributed + EXCLUDED.contributed,
+                balance = EXCLUDED.balance,
+                contributions = r.contributions + EXCLUDED.contributions;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        DROP TRIGGER IF EXISTS goal_contribution_rollups_insert ON goal_contributions;
+        CREATE TRIGGER goal_contribution_rollups_insert AFTER INSERT ON goal_contributions
+            REFERENCING NEW TABLE AS new_contributions FOR EACH STATEMENT EXECUTE FUNCTION roll_up_goal_contributions();
+    """),
+    (5, "materialized goal projections", """
+        ALTER TABLE goals ADD COLUMN IF NOT EXISTS projected_value DOUBLE PRECISION;
+        ALTER TABLE goals ADD COLUMN IF NOT EXISTS projected_completion_date DATE;
+        ALTER TABLE goals ADD COLUMN IF NOT EXISTS projected_return DOUBLE PRECISION;
+        -- The goal version the projection was computed from; any other value means it is stale.
+        ALTER TABLE goals ADD COLUMN IF NOT EXISTS projected_version INTEGER;
+        CREATE INDEX IF NOT EXISTS idx_goals_projection_stale ON goals(id) WHERE projected_version IS DISTINCT FROM version;
+    """),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+CREATE_SCHEMA_VERSION = """
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+"""
+
+
+class SchemaOutOfDate(RuntimeError):
+    """Raised at startup when the database is behind this build's migrations."""
+
+
+async def current_version(conn) -> int:
+    if await conn.fetchval("SELECT to_regclass('schema_version')") is None:
+        return 0
+    return await conn.fetchval("SELECT COALESCE(max(version), 0) FROM schema_version")
+
+
+async def migrate(conn, migrations: Sequence[Tuple[int, str, str]] = MIGRATIONS) -> List[int]:
+    """Apply pending migrations in order and return the versions applied."""
+    await conn.execute("SELECT pg_advisory_lock($1)", LOCK_ID)
+    try:
+        await conn.execute(CREATE_SCHEMA_VERSION)
+        version = await current_version(conn)
+        applied = []
+        for number, name, sql in migrations:
+            if number <= version:
+                continue
+            async with conn.transaction():
+                await conn.execute(sql)
+                await conn.execute("INSERT INTO schema_version (version, name) VALUES ($1, $2)", number, name)
+            logger.info("Applied migration %d: %s", number, name)
+            applied.append(number)
+        return applied
+    finally:
+        await conn.execute("SELECT pg_advisory_unlock($1)", LOCK_ID)
+
+
+async def require_latest(conn):
+    # Newer is fine: during a rolling deploy old workers run against the new schema.
+    version = await current_version(conn)
+    if version < LATEST_VERSION:
+        raise SchemaOutOfDate(
+            f"Database schema is at version {version} but this build needs {LATEST_VERSION}; "
+            "run `python -m migrations` or set DB_MIGRATE_ON_STARTUP=true"
+        )
+
+
+async def _main(command: str, database_url: str):
+    import asyncpg
+
+    conn = await asyncpg.connect(database_url)
+    try:
+        if command == "status":
+            print(f"schema version {await current_version(conn)}, latest {LATEST_VERSION}")
+        else:
+            applied = await migrate(conn)
+            print(f"applied {applied}" if applied else "already up to date")
+    finally:
+        await conn.close()
+
+
+def main(argv=None):
+    from pathlib import Path
+
+    from dotenv import load_dotenv
+
+    load_dotenv(Path(__file__).parent / '.env')
+    parser = argparse.ArgumentParser(description="Apply or inspect schema migrations.")
+    parser.add_argument("command", nargs="?", choices=("upgrade", "status"), default="upgrade")
+    parser.add_argument("--database-url", default=os.environ.get('DATABASE_URL'))
+    args = parser.parse_args(argv)
+    if not args.database_url:
+        parser.error("DATABASE_URL is not set")
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(args.command, args.database_url))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Stochastic projections for /api/calculate/montecarlo.
+
+Monthly growth factors are lognormal with the same mean as the fixed return
+of each risk profile, so the deterministic projection is the average path.
+Paths are simulated in fixed-size chunks, each with its own child seed, which
+keeps results reproducible whether chunks run inline, in threads or in a
+process pool.
+"""
+import asyncio
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+from projection import RETIREMENT_AGE
+
+RISK_VOLATILITY = {
+    "conservative": 0.06,
+    "moderate": 0.12,
+    "aggressive": 0.18,
+}
+DEFAULT_VOLATILITY = 0.12
+
+CHUNK_PATHS = int(os.environ.get('MONTE_CARLO_CHUNK_PATHS', '2500'))
+POOL_MIN_PATHS = int(os.environ.get('MONTE_CARLO_POOL_MIN_PATHS', '5000'))
+POOL_WORKERS = int(os.environ.get('MONTE_CARLO_WORKERS', str(os.cpu_count() or 1)))
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def volatility_for(risk_profile: str) -> float:
+    return RISK_VOLATILITY.get(risk_profile.lower(), DEFAULT_VOLATILITY)
+
+
+def simulate_chunk(seed: np.random.SeedSequence, paths: int, years: int, monthly_investment: float,
+                   goal_amount: float, annual_return: float, volatility: float):
+    """Simulate ``paths`` balances for ``years`` years.
+
+    Returns the (year x path) balances at each year end and whether each path
+    has reached the goal by then.
+    """
+    months = years * 12
+    sigma = volatility / math.sqrt(12)
+    mu = math.log1p(annual_return / 12) - sigma * sigma / 2
+    rng = np.random.default_rng(seed)
+    growth = rng.standard_normal((months, paths), dtype=np.float32)
+    growth *= np.float32(sigma)
+    growth += np.float32(mu)
+    np.exp(growth, out=growth)
+
+    year_end = np.empty((years, paths))
+    reached_by_year = np.empty((years, paths), dtype=bool)
+    balance = np.zeros(paths)
+    reached = np.zeros(paths, dtype=bool)
+    for month in range(months):
+        balance += monthly_investment
+        balance *= growth[month]
+        reached |= balance >= goal_amount
+        if month % 12 == 11:
+            year_end[month // 12] = balance
+            reached_by_year[month // 12] = reached
+    return year_end, reached_by_year
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=POOL_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+
+async def simulate(age: int, monthly_investment: float, goal_amount: float, annual_return: float,
+                   volatility: float, paths: int, seed: int) -> dict:
+    """Percentile bands and goal probabilities per year until retirement.
+
+    Runs off the event loop: in a thread for small simulations and spread
+    over the process pool once ``paths`` reaches ``POOL_MIN_PATHS``.
+    """
+    years = max(RETIREMENT_AGE - age, 0)
+    if years == 0:
+        return {"projection": [], "probability_of_goal": 0.0}
+
+    chunk_sizes = [min(CHUNK_PATHS, paths - start) for start in range(0, paths, CHUNK_PATHS)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunk_sizes))
+    args = [
+        (chunk_seed, size, years, monthly_investment, goal_amount, annual_return, volatility)
+        for chunk_seed, size in zip(seeds, chunk_sizes)
+    ]
+    if paths >= POOL_MIN_PATHS and POOL_WORKERS > 1:
+        loop = asyncio.get_running_loop()
+        pool = _get_pool()
+        chunks = await asyncio.gather(*(loop.run_in_executor(pool, simulate_chunk, *chunk) for chunk in args))
+    else:
+        chunks = await run_in_threadpool(lambda: [simulate_chunk(*chunk) for chunk in args])
+    return await run_in_threadpool(_summarize, age, monthly_investment, chunks)
+
+
+def _summarize(age: int, monthly_investment: float, chunks) -> dict:
+    year_end = np.concatenate([values for values, _ in chunks], axis=1)
+    reached = np.concatenate([hits for _, hits in chunks], axis=1)
+    p10, p50, p90 = np.percentile(year_end, [10, 50, 90], axis=1).round(2).tolist()
+    probability = reached.mean(axis=1).round(4).tolist()
+    projection = [
+        {
+            "year": year,
+            "age": age + year,
+            "p10": p10[year - 1],
+            "p50": p50[year - 1],
+            "p90": p90[year - 1],
+            "invested": round(year * 12 * monthly_investment, 2),
+            "probability_of_goal": probability[year - 1],
+        }
+        for year in range(1, len(probability) + 1)
+    ]
+    return {"projection": projection, "probability_of_goal": probability[-1]}
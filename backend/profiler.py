@@ -0,0 +1,171 @@
+"""On-demand sampling profiler for individual requests.
+
+A profiled request runs with a background thread that snapshots every
+thread's Python stack each ``interval`` seconds (so work handed to thread
+pools, like password hashing, shows up too). Finished profiles are kept in
+a fixed-size ring buffer and can be exported as collapsed stacks (for
+flamegraph.pl and friends) or speedscope JSON. Requests that are not
+sampled only pay for a header lookup and one random number.
+"""
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Dict, List, Optional, Tuple
+
+_ids = itertools.count(1)
+
+
+def _frame_label(code) -> str:
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler(threading.Thread):
+    def __init__(self, interval: float):
+        super().__init__(name="request-profiler", daemon=True)
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        own_id = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, f"thread-{thread_id}"))
+                self.samples[tuple(reversed(stack))] += 1
+
+    def stop(self) -> Counter:
+        self._stop_event.set()
+        self.join()
+        return self.samples
+
+
+class Profile:
+    def __init__(self, method: str, path: str, interval: float):
+        self.id = next(_ids)
+        self.method = method
+        self.path = path
+        self.interval = interval
+        self.started_at = time.time()
+        self.duration = 0.0
+        self.status: Optional[int] = None
+        self.samples: Dict[Tuple[str, ...], int] = {}
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "started_at": self.started_at,
+            "duration_seconds": self.duration,
+            "samples": sum(self.samples.values()),
+        }
+
+    def collapsed(self) -> str:
+        """One ``frame;frame;frame count`` line per distinct stack, root first."""
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in sorted(self.samples.items()))
+
+    def speedscope(self) -> dict:
+        frames: List[dict] = []
+        frame_index: Dict[str, int] = {}
+        samples = []
+        weights = []
+        for stack, count in self.samples.items():
+            indexes = []
+            for label in stack:
+                if label not in frame_index:
+                    frame_index[label] = len(frames)
+                    frames.append({"name": label})
+                indexes.append(frame_index[label])
+            samples.append(indexes)
+            weights.append(count * self.interval)
+        name = f"{self.method} {self.path} #{self.id}"
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            }],
+            "name": name,
+            "exporter": "wealthhub",
+        }
+
+
+class ProfileStore:
+    """Ring buffer of the most recent profiles."""
+
+    def __init__(self, size: int):
+        self._profiles: deque = deque(maxlen=size)
+
+    def add(self, profile: Profile):
+        self._profiles.append(profile)
+
+    def get(self, profile_id: int) -> Optional[Profile]:
+        return next((profile for profile in self._profiles if profile.id == profile_id), None)
+
+    def list(self) -> List[dict]:
+        return [profile.summary() for profile in reversed(self._profiles)]
+
+
+class ProfilingMiddleware:
+    """Profile requests carrying ``X-Profile: <token>`` or picked at ``sample_rate``.
+
+    Only one request is profiled at a time; the profile id is returned in
+    the ``X-Profile-Id`` response header.
+    """
+
+    def __init__(self, app, store: ProfileStore, sample_rate: float, token: str, interval: float):
+        self.app = app
+        self.store = store
+        self.sample_rate = sample_rate
+        self.token = token.encode() if token else None
+        self.interval = interval
+        self._busy = threading.Lock()
+
+    def _wanted(self, scope) -> bool:
+        if self.token is not None:
+            for name, value in scope["headers"]:
+                if name == b"x-profile" and value == self.token:
+                    return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wanted(scope) or not self._busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+        profile = Profile(scope["method"], scope["path"], self.interval)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile-id", str(profile.id).encode())]}
+            await send(message)
+
+        sampler = StackSampler(self.interval)
+        started_at = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profile.samples = dict(sampler.stop())
+            profile.duration = time.perf_counter() - started_at
+            self._busy.release()
+            self.store.add(profile)
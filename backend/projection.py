@@ -0,0 +1,397 @@
+"""Investment projection engine behind /api/calculate.
+
+Balances follow the annuity-due recurrence ``v = (v + monthly) * (1 + r)``.
+Instead of stepping it month by month, year-end values come from the closed
+form ``v_n = monthly * g * (g**n - 1) / (g - 1)`` and the month the goal is
+reached is solved with a logarithm.
+"""
+import math
+from typing import Dict, List, Optional
+
+import numpy as np
+
+RISK_RETURNS = {
+    "conservative": 0.07,
+    "moderate": 0.10,
+    "aggressive": 0.13,
+}
+DEFAULT_ANNUAL_RETURN = 0.10
+RETIREMENT_AGE = 65
+
+_EPS = 2.0 ** -53
+# Below this many months stepping the balance is cheaper than NumPy's per-call overhead.
+_LOOP_CROSSOVER_MONTHS = 120
+_BATCH_CHUNK_SIZE = 2048
+# Annuity factors for months 0 .. 12 * RETIREMENT_AGE keyed by annual return; see tables.py.
+_factor_tables: Dict[float, np.ndarray] = {}
+
+
+def annual_return_for(risk_profile: str) -> float:
+    return RISK_RETURNS.get(risk_profile.lower(), DEFAULT_ANNUAL_RETURN)
+
+
+def annuity_factors(monthly_return: float, months) -> np.ndarray:
+    """Balance after ``months`` contributions of 1 made at the start of each month."""
+    growth = 1 + monthly_return
+    rate = growth - 1  # exact, so the factors match the recurrence's growth step
+    n = np.asarray(months, dtype=np.float64)
+    if rate == 0:
+        return n * growth
+    return growth * np.expm1(n * math.log1p(rate)) / rate
+
+
+def use_factor_tables(tables: Dict[float, np.ndarray]):
+    """Have :func:`project` look up annuity factors for these annual returns.
+
+    Each table must hold ``annuity_factors(annual_return / 12, months)`` for
+    months 0 .. 12 * RETIREMENT_AGE, so lookups give the same values.
+    """
+    global _factor_tables
+    _factor_tables = tables
+
+
+def _relative_tolerance(months: int) -> float:
+    # The recurrence rounds twice per month and the closed form loses a few
+    # ulps in log1p/expm1; anything closer than this to a cent or goal
+    # boundary could land on either side of it.
+    return (4 * months + 64) * _EPS
+
+
+def _round_cents(amounts: np.ndarray, tol: float):
+    """Vectorized ``round(x, 2)`` for increasing positive amounts known to relative ``tol``.
+
+    Returns None when any amount is within ``tol`` of a half cent, where
+    ``round`` could go either way.
+    """
+    cents = amounts * 100
+    if not cents[-1] < 2.0 ** 53:
+        return None
+    whole = np.rint(cents)
+    margin = np.abs(np.abs(cents - whole) - 0.5) - cents * tol
+    if margin.min() <= 0:
+        return None
+    # Integer cents divided by 100 is correctly rounded, i.e. what round() returns.
+    return (whole / 100).tolist()
+
+
+def _goal_month(monthly_investment: float, goal_amount: float, monthly_return: float, horizon: int):
+    """Return ``(month, decided)`` for the first month the balance reaches the goal.
+
+    ``month`` is None when the goal is not reached within ``horizon`` months.
+    ``decided`` is False when the closed form is too close to the goal to tell.
+    """
+    growth = 1 + monthly_return
+    if (0 + monthly_investment) * growth >= goal_amount:
+        return 1, True
+    rate = growth - 1
+    log_growth = math.log1p(rate)
+    estimate = math.log1p(goal_amount * rate / (monthly_investment * growth)) / log_growth
+    if not math.isfinite(estimate):
+        return None, False
+    month = min(max(math.ceil(estimate), 2), horizon + 1)
+    tol = _relative_tolerance(month)
+    scale = monthly_investment * growth / rate
+    if scale * math.expm1((month - 1) * log_growth) >= goal_amount * (1 - tol):
+        return None, False
+    if month > horizon:
+        return None, True
+    if scale * math.expm1(month * log_growth) < goal_amount * (1 + tol):
+        return None, False
+    return month, True
+
+
+def _project_iterative(age: int, monthly_investment: float, goal_amount: float, annual_return: float) -> dict:
+    monthly_return = annual_return / 12
+
+    projection = []
+    current_value = 0
+    months = 0
+    max_years = RETIREMENT_AGE - age
+
+    for year in range(max_years):
+        for month in range(12):
+            current_value = (current_value + monthly_investment) * (1 + monthly_return)
+            months += 1
+
+            if month == 11:
+                projection.append({
+                    "year": year + 1,
+                    "age": age + year + 1,
+                    "value": round(current_value, 2),
+                    "invested": round((months * monthly_investment), 2)
+                })
+
+            if current_value >= goal_amount:
+                return {
+                    "projection": projection,
+                    "total_invested": round(months * monthly_investment, 2),
+                    "projected_value": round(current_value, 2),
+                    "years_to_goal": year + 1,
+                }
+
+    return {
+        "projection": projection,
+        "total_invested": round(months * monthly_investment, 2),
+        "projected_value": round(current_value, 2),
+        "years_to_goal": max_years,
+    }
+
+
+def project(age: int, monthly_investment: float, goal_amount: float, annual_return: float) -> dict:
+    """Project a monthly investment plan until ``goal_amount`` or retirement.
+
+    Output is identical to stepping the balance month by month. Short
+    horizons, degenerate inputs (no positive contribution or growth,
+    non-finite amounts) and the rare results that sit within rounding error
+    of a cent or of the goal are delegated to the month-by-month recurrence.
+    """
+    monthly_return = annual_return / 12
+    max_years = RETIREMENT_AGE - age
+    if max_years <= 0:
+        return _project_iterative(age, monthly_investment, goal_amount, annual_return)
+    if not (
+        monthly_investment > 0
+        and 1 + monthly_return > 1
+        and math.isfinite(monthly_investment)
+        and math.isfinite(goal_amount)
+    ):
+        return _project_iterative(age, monthly_investment, goal_amount, annual_return)
+
+    horizon = max_years * 12
+    goal_month, decided = _goal_month(monthly_investment, goal_amount, monthly_return, horizon)
+    if not decided:
+        return _project_iterative(age, monthly_investment, goal_amount, annual_return)
+    last_month = goal_month or horizon
+    if last_month <= _LOOP_CROSSOVER_MONTHS:
+        return _project_iterative(age, monthly_investment, goal_amount, annual_return)
+
+    # Sized from the horizon: for negative ages it runs past 12 * RETIREMENT_AGE.
+    months = np.arange(12, last_month + 1, 12, dtype=np.float64)
+    if last_month % 12:
+        months = np.append(months, last_month)
+    table = _factor_tables.get(annual_return)
+    if table is not None and last_month < len(table):
+        factors = table[12:last_month + 1:12]
+        if last_month % 12:
+            factors = np.append(factors, table[last_month])
+    else:
+        factors = annuity_factors(monthly_return, months)
+    values = _round_cents(monthly_investment * factors, _relative_tolerance(last_month))
+    if values is None:
+        return _project_iterative(age, monthly_investment, goal_amount, annual_return)
+    invested = months * monthly_investment
+    invested_rounded = _round_cents(invested, 4 * _EPS)
+    if invested_rounded is None:
+        invested_rounded = [round(amount, 2) for amount in invested.tolist()]
+
+    projection = [
+        {"year": year, "age": age + year, "value": value, "invested": amount}
+        for year, value, amount in zip(range(1, last_month // 12 + 1), values, invested_rounded)
+    ]
+    return {
+        "projection": projection,
+        "total_invested": invested_rounded[-1],
+        "projected_value": values[-1],
+        "years_to_goal": (goal_month - 1) // 12 + 1 if goal_month else max_years,
+    }
+
+
+def _round_cents_exact(amounts: np.ndarray) -> np.ndarray:
+    """Vectorized ``round(x, 2)`` for exactly known amounts.
+
+    ``amounts * 100`` can itself round onto the wrong side of a half cent, so
+    entries that land within a few ulps of one are rounded with ``round``.
+    """
+    cents = amounts * 100
+    whole = np.rint(cents)
+    rounded = whole / 100
+    unsure = ~(np.abs(cents) < 2.0 ** 53) | (np.abs(np.abs(cents - whole) - 0.5) <= np.abs(cents) * (4 * _EPS))
+    for index in zip(*np.nonzero(unsure)):
+        rounded[index] = round(float(amounts[index]), 2)
+    return rounded
+
+
+def project_batch(ages, monthly_investments, goal_amounts, annual_returns) -> List[dict]:
+    """Project many plans at once, in input order.
+
+    The balances of every plan are stepped together as one (month x plan)
+    array, so each result is identical to :func:`project` for the same plan.
+    Plans are processed in chunks to bound the size of that array.
+    """
+    if len(ages) > _BATCH_CHUNK_SIZE:
+        return [
+            result
+            for start in range(0, len(ages), _BATCH_CHUNK_SIZE)
+            for result in project_batch(
+                ages[start:start + _BATCH_CHUNK_SIZE],
+                monthly_investments[start:start + _BATCH_CHUNK_SIZE],
+                goal_amounts[start:start + _BATCH_CHUNK_SIZE],
+                annual_returns[start:start + _BATCH_CHUNK_SIZE],
+            )
+        ]
+    if not len(ages):
+        return []
+    ages = np.asarray(ages, dtype=np.int64)
+    monthly_investments = np.asarray(monthly_investments, dtype=np.float64)
+    goal_amounts = np.asarray(goal_amounts, dtype=np.float64)
+    growth = 1 + np.asarray(annual_returns, dtype=np.float64) / 12
+
+    max_years = RETIREMENT_AGE - ages
+    horizons = np.maximum(max_years, 0) * 12
+    total_months = int(horizons.max(initial=0))
+
+    balances = np.empty((total_months, len(ages)))
+    balance = np.zeros(len(ages))
+    for month in range(total_months):
+        balance = (balance + monthly_investments) * growth
+        balances[month] = balance
+
+    # Sized from the longest horizon: for negative ages it runs past 12 * RETIREMENT_AGE.
+    months = np.arange(total_months + 1, dtype=np.float64)
+    reached = (balances >= goal_amounts) & (months[1:, None] <= horizons)
+    reached_any = reached.any(axis=0)
+    first_reached = reached.argmax(axis=0) + 1 if total_months else np.zeros(len(ages), dtype=np.int64)
+    last_months = np.where(reached_any, first_reached, horizons)
+
+    year_values = _round_cents_exact(balances[11::12]).T.tolist()
+    year_invested = _round_cents_exact(months[12::12, None] * monthly_investments).T.tolist()
+    final_values = np.zeros(len(ages))
+    if total_months:
+        final_values = balances[np.maximum(last_months - 1, 0), np.arange(len(ages))]
+    final_values = _round_cents_exact(np.where(last_months > 0, final_values, 0.0)).tolist()
+    total_invested = _round_cents_exact(last_months * monthly_investments).tolist()
+
+    results = []
+    for index, (age, last_month) in enumerate(zip(ages.tolist(), last_months.tolist())):
+        years = last_month // 12
+        projection = [
+            {"year": year, "age": age + year, "value": value, "invested": invested}
+            for year, value, invested in zip(range(1, years + 1), year_values[index], year_invested[index])
+        ]
+        results.append({
+            "projection": projection,
+            "total_invested": total_invested[index],
+            "projected_value": final_values[index],
+            "years_to_goal": (last_month - 1) // 12 + 1 if reached_any[index] else int(max_years[index]),
+        })
+    return results
+
+
+def months_to_goal(monthly_investment: float, goal_amount: float, annual_return: float, horizon: int) -> Optional[int]:
+    """First month the balance reaches the goal, as :func:`project` decides it, or None."""
+    monthly_return = annual_return / 12
+    if (
+        monthly_investment > 0
+        and 1 + monthly_return > 1
+        and math.isfinite(monthly_investment)
+        and math.isfinite(goal_amount)
+    ):
+        month, decided = _goal_month(monthly_investment, goal_amount, monthly_return, horizon)
+        if decided:
+            return month
+    balance = 0
+    for month in range(1, horizon + 1):
+        balance = (balance + monthly_investment) * (1 + monthly_return)
+        if balance >= goal_amount:
+            return month
+    return None
+
+
+def required_monthly_investment(goal_amount: float, annual_return: float, months: int) -> float:
+    """Smallest whole-cent monthly investment that reaches the goal within ``months``."""
+    if months_to_goal(0.0, goal_amount, annual_return, months) is not None:
+        return 0.0
+
+    def reaches(cents: int) -> bool:
+        return months_to_goal(cents / 100, goal_amount, annual_return, months) is not None
+
+    estimate = goal_amount / annuity_factors(annual_return / 12, months).item()
+    # Scaled after rounding when huge, so the cents cannot overflow to inf.
+    hi = max(math.ceil(estimate * 100) if estimate < 1e300 else math.ceil(estimate) * 100, 1)
+    lo = hi - 1
+    # The closed form is only off by rounding, but past 2**53 cents neighbouring
+    # cents are the same float, so bracket with growing steps and bisect
+    # instead of stepping a cent at a time. lo == 0 is known not to reach.
+    step = 1
+    while not reaches(hi):
+        lo, hi = hi, hi + step
+        step *= 2
+    step = 1
+    while lo > 0 and reaches(lo):
+        lo, hi = max(lo - step, 0), lo
+        step *= 2
+    while hi - lo > 1:
+        middle = (lo + hi) // 2
+        if reaches(middle):
+            hi = middle
+        else:
+            lo = middle
+    return hi / 100
+
+
+def project_grid(monthly_investments, annual_returns, horizon_months, goal_amount: float, max_months: int):
+    """Balances over a (monthly investment x return x horizon) grid by broadcasting.
+
+    Returns the balance after each horizon, shaped (investments, returns,
+    horizons), and the years each (investment, return) pair needs to reach
+    the goal within ``max_months``, NaN where it does not.
+    """
+    monthly = np.asarray(monthly_investments, dtype=np.float64)[:, None]
+    monthly_returns = np.asarray(annual_returns, dtype=np.float64) / 12
+    horizons = np.asarray(horizon_months, dtype=np.float64)
+    factors = np.stack([annuity_factors(rate, horizons) for rate in monthly_returns.tolist()])
+    values = monthly[:, :, None] * factors[None, :, :]
+
+    growth = 1 + monthly_returns
+    with np.errstate(divide="ignore", invalid="ignore"):
+        months = np.ceil(np.log1p(goal_amount * monthly_returns / (monthly * growth)) / np.log1p(monthly_returns))
+    months = np.where(monthly * growth >= goal_amount, 1.0, months)
+    months[~(months <= max_months)] = np.nan
+    return values, np.ceil(months / 12)
+
+
+def project_portfolio(current_amounts, monthly_investments, goal_amounts, annual_returns, years: int):
+    """Step several goals' balances together, each starting from its current amount.
+
+    Contributions continue after a goal is reached. Returns the year-end
+    balances shaped (years, goals) and the first month each goal reaches its
+    target: 0 when it already has, -1 when not within ``years``.
+    """
+    balance = np.array(current_amounts, dtype=np.float64)
+    monthly_investments = np.asarray(monthly_investments, dtype=np.float64)
+    goal_amounts = np.asarray(goal_amounts, dtype=np.float64)
+    growth = 1 + np.asarray(annual_returns, dtype=np.float64) / 12
+
+    year_end = np.empty((years, len(balance)))
+    reached_month = np.where(balance >= goal_amounts, 0, -1)
+    for month in range(1, years * 12 + 1):
+        balance = (balance + monthly_investments) * growth
+        reached_month[(reached_month < 0) & (balance >= goal_amounts)] = month
+        if month % 12 == 0:
+            year_end[month // 12 - 1] = balance
+    return year_end, reached_month
+
+
+def goal_completions(current_amounts, monthly_investments, goal_amounts, annual_returns, horizon_months: int):
+    """When each goal reaches its target and its balance then, stepped like :func:`project_portfolio`.
+
+    Returns the first month each goal reaches its target (0 when it already
+    has, -1 when not within ``horizon_months``) and the balance in that
+    month, or after ``horizon_months`` for goals that never get there.
+    """
+    balance = np.array(current_amounts, dtype=np.float64)
+    monthly_investments = np.asarray(monthly_investments, dtype=np.float64)
+    goal_amounts = np.asarray(goal_amounts, dtype=np.float64)
+    growth = 1 + np.asarray(annual_returns, dtype=np.float64) / 12
+
+    reached_month = np.where(balance >= goal_amounts, 0, -1)
+    value = balance.copy()
+    for month in range(1, horizon_months + 1):
+        pending = reached_month < 0
+        if not pending.any():
+            break
+        balance = (balance + monthly_investments) * growth
+        reached = pending & (balance >= goal_amounts)
+        reached_month[reached] = month
+        value[pending] = balance[pending]
+    return reached_month, value
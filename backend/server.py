@@ -1,31 +1,188 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header, Body, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
 from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-import asyncpg
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, model_validator
+from typing import Any, List, Literal, Optional, Union
 import uuid
-from datetime import datetime, timezone, timedelta
-import jwt
-from passlib.context import CryptContext
+import asyncio
+import base64
+import hashlib
+import json
+import secrets
+import time
+from datetime import date, datetime, timezone, timedelta
+import numpy as np
+
+from projection import (
+    RETIREMENT_AGE,
+    RISK_RETURNS,
+    annual_return_for,
+    months_to_goal,
+    project,
+    project_batch,
+    project_grid,
+    project_portfolio,
+    required_monthly_investment,
+)
+import bulk
+import fastjson
+import tables
+from hashing import HashingUnavailable, PasswordHasher
+from cache import MISSING, ResultCache
+import db
+import migrations
+from lazy import lazy_import, loaded
+from db import PoolExhausted
+from metrics import Exposition, Histogram, HistogramFamily, RequestMetricsMiddleware
+from profiler import ProfileStore, ProfilingMiddleware
+from materialize import ProjectionWorker
+import storage
+from storage import GOAL_INSERT_COLUMNS, GOAL_UPDATE_TYPES
+from writebehind import QueueFull, WriteBehindQueue
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-DATABASE_URL = os.environ.get('DATABASE_URL')  # Neon Postgres URL
+DATABASE_URL = os.environ.get('DATABASE_URL')  # Neon Postgres URL, or sqlite:///path for a single node
+DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')  # optional read replica
 JWT_SECRET = os.environ.get('JWT_SECRET', 'dev-secret')
 JWT_ALG = 'HS256'
 ACCESS_TOKEN_EXPIRE_MINUTES = 7 * 24 * 60
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', '5000'))
+MONTE_CARLO_MAX_PATHS = int(os.environ.get('MONTE_CARLO_MAX_PATHS', '100000'))
+MAX_GRID_CELLS = int(os.environ.get('MAX_GRID_CELLS', '250000'))
+MAX_AMOUNT = float(os.environ.get('MAX_AMOUNT', '1e15'))  # largest goal or monthly amount the solver and simulation accept
+GOALS_DEFAULT_PAGE_SIZE = int(os.environ.get('GOALS_DEFAULT_PAGE_SIZE', '100'))
+GOALS_MAX_PAGE_SIZE = int(os.environ.get('GOALS_MAX_PAGE_SIZE', '1000'))
+GOALS_BULK_MAX_ITEMS = int(os.environ.get('GOALS_BULK_MAX_ITEMS', '10000'))
+GOALS_BULK_COPY_ROWS = int(os.environ.get('GOALS_BULK_COPY_ROWS', '1000'))  # rows per COPY
+GOALS_BULK_MAX_LINE_LENGTH = int(os.environ.get('GOALS_BULK_MAX_LINE_LENGTH', '65536'))  # characters
+GOAL_HISTORY_DEFAULT_POINTS = int(os.environ.get('GOAL_HISTORY_DEFAULT_POINTS', '500'))
+GOAL_HISTORY_MAX_POINTS = int(os.environ.get('GOAL_HISTORY_MAX_POINTS', '5000'))
+PROJECTION_WORKER_ENABLED = os.environ.get('PROJECTION_WORKER_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+PROJECTION_CHUNK_SIZE = int(os.environ.get('PROJECTION_CHUNK_SIZE', '500'))  # goals per compute and save
+PROJECTION_POLL_SECONDS = float(os.environ.get('PROJECTION_POLL_SECONDS', '5'))  # picks up other workers' writes
+PROJECTION_HORIZON_MONTHS = int(os.environ.get('PROJECTION_HORIZON_MONTHS', str(12 * 50)))
+RESULT_CACHE_MAX_ENTRIES = int(os.environ.get('RESULT_CACHE_MAX_ENTRIES', '10000'))
+RESULT_CACHE_MAX_BYTES = int(os.environ.get('RESULT_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+RESULT_CACHE_TTL_SECONDS = float(os.environ.get('RESULT_CACHE_TTL_SECONDS', '3600'))
+AUTH_CACHE_MAX_ENTRIES = int(os.environ.get('AUTH_CACHE_MAX_ENTRIES', '10000'))
+AUTH_CACHE_TTL_SECONDS = float(os.environ.get('AUTH_CACHE_TTL_SECONDS', '60'))  # max staleness of cached users
+GOALS_VERSION_TTL_SECONDS = float(os.environ.get('GOALS_VERSION_TTL_SECONDS', '5'))  # max staleness across workers
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))  # fraction of requests profiled
+PROFILE_ADMIN_TOKEN = os.environ.get('PROFILE_ADMIN_TOKEN', '')  # enables X-Profile, /metrics and the admin endpoints
+PROFILE_INTERVAL_SECONDS = float(os.environ.get('PROFILE_INTERVAL_SECONDS', '0.005'))
+PROFILE_BUFFER_SIZE = int(os.environ.get('PROFILE_BUFFER_SIZE', '50'))
+CALCULATE_MAX_AGE_SECONDS = int(os.environ.get('CALCULATE_MAX_AGE_SECONDS', '3600'))
+AUTH_STATELESS_TOKENS = os.environ.get('AUTH_STATELESS_TOKENS', '').lower() in ('1', 'true', 'yes')
+PBKDF2_ROUNDS = int(os.environ.get('PBKDF2_ROUNDS', '29000'))  # passlib's default; changing it rehashes on login
+HASH_MAX_CONCURRENCY = int(os.environ.get('HASH_MAX_CONCURRENCY', str(os.cpu_count() or 1)))
+HASH_MAX_QUEUE = int(os.environ.get('HASH_MAX_QUEUE', '64'))
+HASH_QUEUE_TIMEOUT_SECONDS = float(os.environ.get('HASH_QUEUE_TIMEOUT_SECONDS', '2'))
+HASH_RETRY_AFTER_SECONDS = 1
+DB_RETRY_AFTER_SECONDS = 1
+DB_MIGRATE_ON_STARTUP = os.environ.get('DB_MIGRATE_ON_STARTUP', '').lower() in ('1', 'true', 'yes')
+CONTACT_QUEUE_MAX = int(os.environ.get('CONTACT_QUEUE_MAX', '10000'))
+CONTACT_BATCH_SIZE = int(os.environ.get('CONTACT_BATCH_SIZE', '500'))
+CONTACT_FLUSH_INTERVAL_SECONDS = float(os.environ.get('CONTACT_FLUSH_INTERVAL_SECONDS', '0.5'))
+CONTACT_ENQUEUE_TIMEOUT_SECONDS = float(os.environ.get('CONTACT_ENQUEUE_TIMEOUT_SECONDS', '1'))
+CONTACT_DRAIN_TIMEOUT_SECONDS = float(os.environ.get('CONTACT_DRAIN_TIMEOUT_SECONDS', '10'))
+CONTACT_RETRY_AFTER_SECONDS = 1
+CONTACT_RETRY_MAX_SECONDS = float(os.environ.get('CONTACT_RETRY_MAX_SECONDS', '30'))  # backoff cap while the db is down
+
+jwt = lazy_import("jwt")
+montecarlo = lazy_import("montecarlo")
+sqlite_storage = lazy_import("sqlite_storage")
+
+
+def build_pwd_context():
+    from passlib.context import CryptContext  # slow to import, so only built on the first hash
+
+    return CryptContext(
+        schemes=["pbkdf2_sha256"],
+        deprecated="auto",
+        pbkdf2_sha256__default_rounds=PBKDF2_ROUNDS,
+        pbkdf2_sha256__min_rounds=PBKDF2_ROUNDS,
+        pbkdf2_sha256__max_rounds=PBKDF2_ROUNDS,
+    )
 
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+password_hasher = PasswordHasher(build_pwd_context, HASH_MAX_CONCURRENCY, HASH_MAX_QUEUE, HASH_QUEUE_TIMEOUT_SECONDS)
+result_cache = ResultCache(RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_MAX_BYTES, RESULT_CACHE_TTL_SECONDS)
+# Entries count as one byte each, so both caches are bounded by entry count.
+token_cache = ResultCache(AUTH_CACHE_MAX_ENTRIES, AUTH_CACHE_MAX_ENTRIES, AUTH_CACHE_TTL_SECONDS)
+user_cache = ResultCache(AUTH_CACHE_MAX_ENTRIES, AUTH_CACHE_MAX_ENTRIES, AUTH_CACHE_TTL_SECONDS)
+# Mirror of users.goals_version, which a trigger bumps on every write to a user's goals.
+goals_version_cache = ResultCache(AUTH_CACHE_MAX_ENTRIES, AUTH_CACHE_MAX_ENTRIES, GOALS_VERSION_TTL_SECONDS)
+profile_store = ProfileStore(PROFILE_BUFFER_SIZE)
 
-app = FastAPI()
+app = FastAPI(default_response_class=fastjson.DEFAULT_RESPONSE_CLASS)
+request_seconds = HistogramFamily(["method", "route", "status"])
+query_seconds = HistogramFamily(["statement"])
+compute_seconds = HistogramFamily(["operation"])
+auth_seconds = Histogram()
+contact_queue = WriteBehindQueue(
+    "contact_messages",
+    lambda batch: app.state.storage.add_contact_messages(batch),
+    CONTACT_QUEUE_MAX,
+    CONTACT_BATCH_SIZE,
+    CONTACT_FLUSH_INTERVAL_SECONDS,
+    CONTACT_ENQUEUE_TIMEOUT_SECONDS,
+    max_retry_seconds=CONTACT_RETRY_MAX_SECONDS,
+    transient=db.TRANSIENT_ERRORS,
+)
+# Read-only queries use the replica when there is one; see db.ReadRouter.
+read_pool = db.ReadRouter(
+    lambda: app.state.pg_pool,
+    lambda: getattr(app.state, 'pg_read_pool', None),
+    db.DB_READ_YOUR_WRITES_SECONDS,
+    db.DB_REPLICA_RETRY_SECONDS,
+    db.DB_MAX_PINNED_USERS,
+)
+# Replaced at startup with SqliteStorage when DATABASE_URL is a sqlite: URL.
+app.state.storage = storage.PostgresStorage(
+    lambda: getattr(app.state, 'pg_pool', None), read_pool, lambda: db.connect(DATABASE_URL)
+)
+# Keeps the goals' projected fields current off the request path; see materialize.py.
+projection_worker = ProjectionWorker(
+    lambda: app.state.storage,
+    goals_version_cache.discard,
+    PROJECTION_CHUNK_SIZE,
+    PROJECTION_POLL_SECONDS,
+    PROJECTION_HORIZON_MONTHS,
+)
 api_router = APIRouter(prefix="/api")
 
+@app.exception_handler(HashingUnavailable)
+async def hashing_unavailable_handler(request, exc):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Authentication is busy, try again shortly"},
+        headers={"Retry-After": str(HASH_RETRY_AFTER_SECONDS)},
+    )
+
+@app.exception_handler(PoolExhausted)
+async def pool_exhausted_handler(request, exc):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Database is busy, try again shortly"},
+        headers={"Retry-After": str(DB_RETRY_AFTER_SECONDS)},
+    )
+
+@app.exception_handler(QueueFull)
+async def queue_full_handler(request, exc):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Too many messages right now, try again shortly"},
+        headers={"Retry-After": str(CONTACT_RETRY_AFTER_SECONDS)},
+    )
+
 class User(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     email: str
@@ -46,7 +203,7 @@ class TokenResponse(BaseModel):
     token_type: str = "bearer"
 
 class InvestmentCalculation(BaseModel):
-    age: int
+    age: int = Field(ge=0)
     monthly_investment: float
     goal_amount: float
     risk_profile: str
@@ -57,6 +214,89 @@ class InvestmentResult(BaseModel):
     projected_value: float
     years_to_goal: int
 
+class BatchCalculationError(BaseModel):
+    index: int
+    detail: List[dict]
+
+class BatchCalculationResult(BaseModel):
+    results: List[Optional[InvestmentResult]]
+    errors: List[BatchCalculationError]
+
+class MonteCarloRequest(InvestmentCalculation):
+    # Bounded so no simulated path overflows to inf.
+    monthly_investment: float = Field(allow_inf_nan=False, ge=-MAX_AMOUNT, le=MAX_AMOUNT)
+    goal_amount: float = Field(allow_inf_nan=False, ge=-MAX_AMOUNT, le=MAX_AMOUNT)
+    paths: int = Field(default=1000, ge=1, le=MONTE_CARLO_MAX_PATHS)
+    seed: Optional[int] = Field(default=None, ge=0)
+
+class MonteCarloYear(BaseModel):
+    year: int
+    age: int
+    p10: float
+    p50: float
+    p90: float
+    invested: float
+    probability_of_goal: float
+
+class MonteCarloResult(BaseModel):
+    projection: List[MonteCarloYear]
+    probability_of_goal: float
+    annual_return: float
+    volatility: float
+    paths: int
+    seed: int
+
+class SolveRequest(BaseModel):
+    age: int = Field(ge=0)
+    goal_amount: float = Field(allow_inf_nan=False, le=MAX_AMOUNT)
+    risk_profile: str
+    target_age: Optional[int] = None
+    monthly_budget: Optional[float] = Field(default=None, allow_inf_nan=False, le=MAX_AMOUNT)
+
+    @model_validator(mode="after")
+    def one_unknown(self):
+        if (self.target_age is None) == (self.monthly_budget is None):
+            raise ValueError("Provide exactly one of target_age or monthly_budget")
+        return self
+
+class SolveResult(BaseModel):
+    achievable: bool
+    monthly_investment: float
+    target_age: Optional[int]
+    years_to_goal: Optional[int]
+    total_invested: float
+    projected_value: float
+
+class AmountRange(BaseModel):
+    start: float = Field(allow_inf_nan=False)
+    stop: float = Field(allow_inf_nan=False)
+    num: int = Field(ge=1)
+
+class YearRange(BaseModel):
+    start: int = Field(ge=1)
+    stop: int = Field(ge=1)
+    step: int = Field(default=1, ge=1)
+
+class GridRequest(BaseModel):
+    age: int = Field(ge=0)
+    goal_amount: float = Field(allow_inf_nan=False)
+    monthly_investment: AmountRange
+    risk_profiles: List[str] = Field(default_factory=lambda: list(RISK_RETURNS), min_length=1)
+    horizon_years: YearRange
+    encoding: Literal["json", "base64"] = "json"
+
+class EncodedArray(BaseModel):
+    dtype: str = "<f4"
+    shape: List[int]
+    data: str
+
+class GridResult(BaseModel):
+    monthly_investment: List[float]
+    risk_profiles: List[str]
+    horizon_years: List[int]
+    projected_value: Union[EncodedArray, List[List[List[float]]]]
+    years_to_goal: Union[EncodedArray, List[List[Optional[int]]]]
+
 class Goal(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     user_id: str
@@ -66,6 +306,12 @@ class Goal(BaseModel):
     monthly_investment: float
     risk_profile: str
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    version: int = 1
+    # Materialized by the projection worker; None until it has caught up with this version.
+    # The value is the balance in the month the target is reached, or at the end of the
+    # projection horizon when it is not reached (and the date is None).
+    projected_value: Optional[float] = None
+    projected_completion_date: Optional[date] = None
 
 class GoalCreate(BaseModel):
     goal_type: str
@@ -74,6 +320,77 @@ class GoalCreate(BaseModel):
     monthly_investment: float
     risk_profile: str
 
+class GoalUpdate(BaseModel):
+    """The mutable goal columns; only fields present in the request are written."""
+    model_config = ConfigDict(extra='forbid')
+
+    goal_type: Optional[str] = None
+    target_amount: Optional[float] = None
+    current_amount: Optional[float] = None
+    monthly_investment: Optional[float] = None
+    risk_profile: Optional[str] = None
+
+class GoalProjection(BaseModel):
+    id: str
+    goal_type: str
+    target_amount: float
+    current_amount: float
+    monthly_investment: float
+    risk_profile: str
+    projected_value: float
+    years_to_target: Optional[int]  # None when not reached by retirement
+
+class PortfolioYear(BaseModel):
+    year: int
+    age: int
+    value: float
+    invested: float
+
+class PortfolioSummary(BaseModel):
+    goals: List[GoalProjection]
+    total_current: float
+    total_monthly_investment: float
+    total_invested: float
+    total_projected: float
+    timeline: List[PortfolioYear]
+
+class GoalBulkUpdate(GoalUpdate):
+    id: str
+    version: Optional[int] = None  # expected current version, as with If-Match
+
+class BulkGoalResult(BaseModel):
+    index: int
+    status: int
+    id: Optional[str] = None
+    version: Optional[int] = None
+    detail: Optional[Any] = None
+
+class BulkGoalResponse(BaseModel):
+    results: List[BulkGoalResult]
+
+class ContributionCreate(BaseModel):
+    """Money paid into (or, when negative, taken out of) a goal."""
+    amount: float = Field(allow_inf_nan=False)
+
+    @model_validator(mode="after")
+    def non_zero(self):
+        if self.amount == 0:
+            raise ValueError("amount must not be zero")
+        return self
+
+class HistoryPoint(BaseModel):
+    period_start: datetime
+    contributed: float
+    balance: float  # current_amount after the period's last contribution
+    contributions: int
+
+class GoalHistory(BaseModel):
+    goal_id: str
+    resolution: Literal["day", "month", "year"]
+    points: List[HistoryPoint]
+    # Pass as ``end`` to fetch the periods before these, when there are more.
+    next_end: Optional[datetime] = None
+
 class ContactForm(BaseModel):
     name: str
     email: str
@@ -88,50 +405,90 @@ class LoginRequest(BaseModel):
     email: str
     password: str
 
+def goals_changed(user_id: str):
+    """Call after any write to a user's goals."""
+    goals_version_cache.discard(user_id)
+    projection_worker.notify()
+
+def invalidate_user(user_id: str):
+    """Drop a cached ``UserPublic``; call after any write to the users row."""
+    user_cache.discard(user_id)
+
+def user_from_claims(payload: dict) -> Optional[UserPublic]:
+    if "email" not in payload:
+        return None
+    return UserPublic(
+        id=payload["sub"],
+        email=payload["email"],
+        name=payload["name"],
+        picture=payload["picture"],
+        created_at=payload["created_at"],
+    )
+
 async def get_current_user(authorization: Optional[str] = Header(None)) -> Optional[UserPublic]:
+    started_at = time.perf_counter()
+    try:
+        return await load_current_user(authorization)
+    finally:
+        auth_seconds.observe(time.perf_counter() - started_at)
+
+async def load_current_user(authorization: Optional[str]) -> Optional[UserPublic]:
     if not authorization or not authorization.startswith("Bearer "):
         return None
     token = authorization.split(" ", 1)[1]
-    try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALG])
-        user_id = payload.get("sub")
-        if not user_id:
+    payload = token_cache.get(token)
+    if payload is MISSING:
+        try:
+            payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALG])
+        except Exception:
             return None
-    except Exception:
+        token_cache.put(token, payload, 1, ttl=payload.get("exp", 0) - time.time())
+    user_id = payload.get("sub")
+    if not user_id:
         return None
-    async with app.state.pg_pool.acquire() as conn:
-        row = await conn.fetchrow("SELECT id, email, name, picture, created_at FROM users WHERE id = $1", user_id)
+    if AUTH_STATELESS_TOKENS:
+        user = user_from_claims(payload)
+        if user:
+            return user
+    user = user_cache.get(user_id)
+    if user is not MISSING:
+        return user
+    row = await app.state.storage.get_user(user_id)
     if not row:
         return None
-    return UserPublic(
+    user = UserPublic(
         id=row["id"], email=row["email"], name=row["name"], picture=row["picture"], created_at=row["created_at"]
     )
+    user_cache.put(user_id, user, 1)
+    return user
 
 @api_router.post("/auth/register", response_model=UserPublic)
 async def register(payload: RegisterRequest):
-    password_hash = pwd_context.hash(payload.password)
+    password_hash = await password_hasher.hash(payload.password)
     user = User(email=payload.email, name=payload.name, password_hash=password_hash)
-    async with app.state.pg_pool.acquire() as conn:
-        existing = await conn.fetchrow("SELECT id FROM users WHERE email = $1", user.email)
-        if existing:
-            raise HTTPException(status_code=400, detail="Email already registered")
-        await conn.execute(
-            """
-            INSERT INTO users (id, email, name, picture, password_hash, created_at) 
-            VALUES ($1, $2, $3, $4, $5, $6)
-            """,
-            user.id, user.email, user.name, user.picture, user.password_hash, user.created_at
-        )
+    created = await app.state.storage.create_user(
+        (user.id, user.email, user.name, user.picture, user.password_hash, user.created_at)
+    )
+    if not created:
+        raise HTTPException(status_code=400, detail="Email already registered")
     return UserPublic(id=user.id, email=user.email, name=user.name, picture=user.picture, created_at=user.created_at)
 
 @api_router.post("/auth/login", response_model=TokenResponse)
 async def login(payload: LoginRequest):
-    async with app.state.pg_pool.acquire() as conn:
-        row = await conn.fetchrow("SELECT id, password_hash FROM users WHERE email = $1", payload.email)
-    if not row or not pwd_context.verify(payload.password, row["password_hash"]):
+    row = await app.state.storage.get_user_for_login(payload.email)
+    if not row:
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    valid, new_hash = await password_hasher.verify_and_update(payload.password, row["password_hash"])
+    if not valid:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    if new_hash:
+        await app.state.storage.set_password_hash(row["id"], new_hash)
+        invalidate_user(row["id"])
     expires = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    token = jwt.encode({"sub": row["id"], "exp": expires}, JWT_SECRET, algorithm=JWT_ALG)
+    claims = {"sub": row["id"], "exp": expires}
+    if AUTH_STATELESS_TOKENS:
+        claims.update(email=row["email"], name=row["name"], picture=row["picture"], created_at=row["created_at"].isoformat())
+    token = jwt.encode(claims, JWT_SECRET, algorithm=JWT_ALG)
     return TokenResponse(access_token=token)
 
 @api_router.get("/auth/me", response_model=UserPublic)
@@ -140,102 +497,362 @@ async def me(current_user: Optional[UserPublic] = Depends(get_current_user)):
         raise HTTPException(status_code=401, detail="Not authenticated")
     return current_user
 
+def calculation_key(data: InvestmentCalculation) -> tuple:
+    return ("calculate", data.age, data.monthly_investment, data.goal_amount, annual_return_for(data.risk_profile))
+
+def cached_size(result: BaseModel) -> int:
+    return len(result.model_dump_json())
+
+def make_etag(*parts) -> str:
+    return '"' + hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest() + '"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
+
+async def conditional_calculation(data: InvestmentCalculation, response: Response, if_none_match: Optional[str],
+                                  cache_control: str):
+    """Serve a calculation, or a 304 when the client already has it.
+
+    Results depend only on the inputs and the profile's return, so the ETag
+    is a hash of the cache key and matching it skips the projection.
+    """
+    key = calculation_key(data)
+    etag = make_etag(*key)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag, cache_control)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
+
+    async def compute():
+        started_at = time.perf_counter()
+        annual_return = annual_return_for(data.risk_profile)
+        result = InvestmentResult(**project(data.age, data.monthly_investment, data.goal_amount, annual_return))
+        compute_seconds.labels("calculate").observe(time.perf_counter() - started_at)
+        return result
+    result = await result_cache.get_or_compute(key, compute, cached_size)
+    if fastjson.ENABLED:
+        return fastjson.response(fastjson.model(result), response.headers)
+    return result
+
 @api_router.post("/calculate", response_model=InvestmentResult)
-async def calculate_investment(data: InvestmentCalculation):
-    risk_returns = {
-        "conservative": 0.07,
-        "moderate": 0.10,
-        "aggressive": 0.13
-    }
-    
-    annual_return = risk_returns.get(data.risk_profile.lower(), 0.10)
-    monthly_return = annual_return / 12
-    
-    projection = []
-    current_value = 0
-    months = 0
-    max_years = 65 - data.age
-    
-    for year in range(max_years):
-        for month in range(12):
-            current_value = (current_value + data.monthly_investment) * (1 + monthly_return)
-            months += 1
-            
-            if month == 11:
-                projection.append({
-                    "year": year + 1,
-                    "age": data.age + year + 1,
-                    "value": round(current_value, 2),
-                    "invested": round((months * data.monthly_investment), 2)
-                })
-            
-            if current_value >= data.goal_amount:
-                return InvestmentResult(
-                    projection=projection,
-                    total_invested=round(months * data.monthly_investment, 2),
-                    projected_value=round(current_value, 2),
-                    years_to_goal=year + 1
-                )
-    
-    return InvestmentResult(
-        projection=projection,
-        total_invested=round(months * data.monthly_investment, 2),
-        projected_value=round(current_value, 2),
-        years_to_goal=max_years
+async def calculate_investment(data: InvestmentCalculation, response: Response,
+                               if_none_match: Optional[str] = Header(None)):
+    return await conditional_calculation(data, response, if_none_match, "no-cache")
+
+@api_router.get("/calculate", response_model=InvestmentResult)
+async def calculate_investment_get(response: Response, data: InvestmentCalculation = Depends(),
+                                   if_none_match: Optional[str] = Header(None)):
+    """Query-string form of POST /calculate that shared caches can store."""
+    return await conditional_calculation(
+        data, response, if_none_match, f"public, max-age={CALCULATE_MAX_AGE_SECONDS}"
     )
 
+@api_router.post("/calculate/batch", response_model=BatchCalculationResult)
+async def calculate_investment_batch(items: List[Any] = Body(...)):
+    if len(items) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch is limited to {MAX_BATCH_SIZE} calculations")
+    results: List[Optional[InvestmentResult]] = [None] * len(items)
+    misses = []
+    errors = []
+    for index, item in enumerate(items):
+        try:
+            data = InvestmentCalculation.model_validate(item)
+        except ValidationError as e:
+            errors.append(BatchCalculationError(index=index, detail=jsonable_encoder(e.errors(include_url=False))))
+            continue
+        cached = result_cache.get(calculation_key(data))
+        if cached is MISSING:
+            misses.append((index, data))
+        else:
+            results[index] = cached
+    started_at = time.perf_counter()
+    projections = await run_in_threadpool(
+        project_batch,
+        [data.age for _, data in misses],
+        [data.monthly_investment for _, data in misses],
+        [data.goal_amount for _, data in misses],
+        [annual_return_for(data.risk_profile) for _, data in misses],
+    )
+    compute_seconds.labels("batch").observe(time.perf_counter() - started_at)
+    for (index, data), projection in zip(misses, projections):
+        results[index] = InvestmentResult(**projection)
+        result_cache.put(calculation_key(data), results[index], cached_size(results[index]))
+    return BatchCalculationResult(results=results, errors=errors)
+
+@api_router.post("/calculate/montecarlo", response_model=MonteCarloResult)
+async def calculate_montecarlo(data: MonteCarloRequest):
+    annual_return = annual_return_for(data.risk_profile)
+    volatility = montecarlo.volatility_for(data.risk_profile)
+    seed = data.seed if data.seed is not None else secrets.randbits(52)
+
+    async def compute():
+        result = await montecarlo.simulate(
+            data.age, data.monthly_investment, data.goal_amount, annual_return, volatility, data.paths, seed
+        )
+        return MonteCarloResult(annual_return=annual_return, volatility=volatility, paths=data.paths, seed=seed, **result)
+    if data.seed is None:
+        return await compute()
+    key = ("montecarlo", data.age, data.monthly_investment, data.goal_amount, annual_return, volatility, data.paths, seed)
+    return await result_cache.get_or_compute(key, compute, cached_size)
+
+@api_router.post("/calculate/solve", response_model=SolveResult)
+async def solve_investment(data: SolveRequest):
+    annual_return = annual_return_for(data.risk_profile)
+    if data.target_age is not None and not data.age < data.target_age <= RETIREMENT_AGE:
+        raise HTTPException(status_code=400, detail=f"target_age must be after age and at most {RETIREMENT_AGE}")
+
+    def solve() -> SolveResult:
+        if data.target_age is not None:
+            monthly_investment = required_monthly_investment(data.goal_amount, annual_return, (data.target_age - data.age) * 12)
+        else:
+            monthly_investment = data.monthly_budget
+        plan = project(data.age, monthly_investment, data.goal_amount, annual_return)
+        goal_month = months_to_goal(monthly_investment, data.goal_amount, annual_return, max(RETIREMENT_AGE - data.age, 0) * 12)
+        return SolveResult(
+            achievable=goal_month is not None,
+            monthly_investment=monthly_investment,
+            target_age=data.age + plan["years_to_goal"] if goal_month is not None else None,
+            years_to_goal=plan["years_to_goal"] if goal_month is not None else None,
+            total_invested=plan["total_invested"],
+            projected_value=plan["projected_value"],
+        )
+
+    async def compute():
+        return await run_in_threadpool(solve)
+    key = ("solve", data.age, data.goal_amount, annual_return, data.target_age, data.monthly_budget)
+    return await result_cache.get_or_compute(key, compute, cached_size)
+
+def encode_array(values) -> EncodedArray:
+    packed = values.astype("<f4")
+    return EncodedArray(shape=list(packed.shape), data=base64.b64encode(packed.tobytes()).decode("ascii"))
+
+@api_router.post("/calculate/grid", response_model=GridResult)
+async def calculate_grid(data: GridRequest):
+    # Sized from the ranges before anything is allocated; len(range) does not build it.
+    horizon_range = range(data.horizon_years.start, data.horizon_years.stop + 1, data.horizon_years.step)
+    if not horizon_range:
+        raise HTTPException(status_code=400, detail="horizon_years is empty")
+    if data.monthly_investment.num * len(data.risk_profiles) * len(horizon_range) > MAX_GRID_CELLS:
+        raise HTTPException(status_code=413, detail=f"Grid is limited to {MAX_GRID_CELLS} cells")
+    amounts = np.linspace(data.monthly_investment.start, data.monthly_investment.stop, data.monthly_investment.num)
+    horizons = list(horizon_range)
+    annual_returns = [annual_return_for(profile) for profile in data.risk_profiles]
+
+    def grid() -> GridResult:
+        values, years_to_goal = project_grid(
+            amounts,
+            annual_returns,
+            [years * 12 for years in horizons],
+            data.goal_amount,
+            max(RETIREMENT_AGE - data.age, 0) * 12,
+        )
+        if data.encoding == "base64":
+            projected_value, years_to_goal = encode_array(values), encode_array(years_to_goal)
+        else:
+            projected_value = values.round(2).tolist()
+            years_to_goal = [[None if np.isnan(years) else int(years) for years in row] for row in years_to_goal.tolist()]
+        return GridResult(
+            monthly_investment=amounts.round(2).tolist(),
+            risk_profiles=data.risk_profiles,
+            horizon_years=horizons,
+            projected_value=projected_value,
+            years_to_goal=years_to_goal,
+        )
+
+    async def compute():
+        return await run_in_threadpool(grid)
+    key = ("grid", data.model_dump_json(), tuple(annual_returns))
+    return await result_cache.get_or_compute(key, compute, cached_size)
+
+# Operational endpoints (stats, /metrics, profiles) share the profiler's admin token; scrapers send it as X-Admin-Token.
+def require_profile_admin(x_admin_token: Optional[str] = Header(None)):
+    if not PROFILE_ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, PROFILE_ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@api_router.get("/cache/stats", dependencies=[Depends(require_profile_admin)], include_in_schema=False)
+async def cache_stats():
+    return {
+        "results": result_cache.stats(),
+        "auth_tokens": token_cache.stats(),
+        "auth_users": user_cache.stats(),
+    }
+
+@api_router.get("/hashing/stats", dependencies=[Depends(require_profile_admin)], include_in_schema=False)
+async def hashing_stats():
+    return password_hasher.stats()
+
+@api_router.get("/db/stats", dependencies=[Depends(require_profile_admin)], include_in_schema=False)
+async def db_stats():
+    stats = app.state.storage.stats()
+    if stats is None:
+        raise HTTPException(status_code=503, detail="Database pool not initialised")
+    return stats
+
 @api_router.post("/goals", response_model=Goal)
 async def create_goal(goal_data: GoalCreate, current_user: UserPublic = Depends(get_current_user)):
     if not current_user:
         raise HTTPException(status_code=401, detail="Not authenticated")
     goal = Goal(user_id=current_user.id, **goal_data.dict())
-    async with app.state.pg_pool.acquire() as conn:
-        await conn.execute(
-            """
-            INSERT INTO goals (id, user_id, goal_type, target_amount, current_amount, monthly_investment, risk_profile, created_at)
-            VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
-            """,
-            goal.id, goal.user_id, goal.goal_type, goal.target_amount, goal.current_amount, goal.monthly_investment, goal.risk_profile, goal.created_at
-        )
+    await app.state.storage.create_goal(tuple(getattr(goal, column) for column in GOAL_INSERT_COLUMNS))
+    goals_changed(current_user.id)
     return goal
 
-@api_router.get("/goals", response_model=List[Goal])
-async def get_goals(current_user: UserPublic = Depends(get_current_user)):
+def bulk_error(index: int, status: int, detail: Any, goal_id: Optional[str] = None) -> BulkGoalResult:
+    return BulkGoalResult(index=index, status=status, id=goal_id, detail=detail)
+
+@api_router.get("/goals/summary", response_model=PortfolioSummary)
+async def goals_summary(
+    age: int = Query(..., ge=0, le=RETIREMENT_AGE),
+    current_user: UserPublic = Depends(get_current_user),
+):
+    """Project all of the user's goals from their current amounts until retirement.
+
+    Every goal keeps its monthly investment until ``RETIREMENT_AGE``; the
+    timeline adds up the balances and amounts invested across goals.
+    """
     if not current_user:
         raise HTTPException(status_code=401, detail="Not authenticated")
-    async with app.state.pg_pool.acquire() as conn:
-        rows = await conn.fetch("SELECT id, user_id, goal_type, target_amount, current_amount, monthly_investment, risk_profile, created_at FROM goals WHERE user_id = $1 ORDER BY created_at DESC LIMIT 1000", current_user.id)
-    return [
-        Goal(
-            id=r["id"],
-            user_id=r["user_id"],
-            goal_type=r["goal_type"],
-            target_amount=float(r["target_amount"]),
-            current_amount=float(r["current_amount"]),
-            monthly_investment=float(r["monthly_investment"]),
-            risk_profile=r["risk_profile"],
-            created_at=r["created_at"],
-        ) for r in rows
-    ]
+    rows = await app.state.storage.goals_for_summary(current_user.id)
+    years = RETIREMENT_AGE - age
+    current = np.array([r["current_amount"] for r in rows], dtype=np.float64)
+    monthly = np.array([r["monthly_investment"] for r in rows], dtype=np.float64)
+    year_end, reached_month = await run_in_threadpool(
+        project_portfolio,
+        current,
+        monthly,
+        [r["target_amount"] for r in rows],
+        [annual_return_for(r["risk_profile"]) for r in rows],
+        years,
+    )
+    projected = year_end[-1] if years else current
+    years_to_target = np.where(reached_month >= 0, -(-reached_month // 12), -1).tolist()
+    invested_by_year = current.sum() + monthly.sum() * 12 * np.arange(1, years + 1)
+    return PortfolioSummary(
+        goals=[
+            GoalProjection(
+                id=r["id"],
+                goal_type=r["goal_type"],
+                target_amount=r["target_amount"],
+                current_amount=r["current_amount"],
+                monthly_investment=r["monthly_investment"],
+                risk_profile=r["risk_profile"],
+                projected_value=value,
+                years_to_target=None if years_needed < 0 else years_needed,
+            )
+            for r, value, years_needed in zip(rows, projected.round(2).tolist(), years_to_target)
+        ],
+        total_current=round(float(current.sum()), 2),
+        total_monthly_investment=round(float(monthly.sum()), 2),
+        total_invested=round(float(current.sum() + monthly.sum() * 12 * years), 2),
+        total_projected=round(float(projected.sum()), 2),
+        timeline=[
+            PortfolioYear(year=year, age=age + year, value=value, invested=invested)
+            for year, value, invested in zip(
+                range(1, years + 1), year_end.sum(axis=1).round(2).tolist(), invested_by_year.round(2).tolist()
+            )
+        ],
+    )
+
+@api_router.post("/goals/bulk", response_model=BulkGoalResponse)
+async def create_goals_bulk(request: Request, current_user: UserPublic = Depends(get_current_user)):
+    """Import goals from a streamed NDJSON or CSV body in one transaction.
 
-@api_router.put("/goals/{goal_id}")
-async def update_goal(goal_id: str, update_data: dict, current_user: UserPublic = Depends(get_current_user)):
+    The body is parsed and validated as it arrives, then the valid goals go
+    to storage in chunks of ``GOALS_BULK_COPY_ROWS`` (one COPY each on
+    Postgres), so a slow upload never holds a connection open. Invalid
+    goals are reported against their index.
+    """
     if not current_user:
         raise HTTPException(status_code=401, detail="Not authenticated")
-    set_clauses = []
-    values = []
-    for idx, (k, v) in enumerate(update_data.items(), start=1):
-        set_clauses.append(f"{k} = ${idx}")
-        values.append(v)
-    if not set_clauses:
-        raise HTTPException(status_code=400, detail="No fields to update")
-    values.extend([current_user.id, goal_id])
-    async with app.state.pg_pool.acquire() as conn:
-        result = await conn.execute(f"UPDATE goals SET {', '.join(set_clauses)} WHERE user_id = ${len(values)-1} AND id = ${len(values)}")
-    if result.endswith("UPDATE 0"):
-        raise HTTPException(status_code=404, detail="Goal not found")
-    async with app.state.pg_pool.acquire() as conn:
-        row = await conn.fetchrow("SELECT id, user_id, goal_type, target_amount, current_amount, monthly_investment, risk_profile, created_at FROM goals WHERE id = $1 AND user_id = $2", goal_id, current_user.id)
+    try:
+        fmt = bulk.body_format(request.headers.get("content-type", ""))
+    except bulk.UnsupportedFormat:
+        raise HTTPException(status_code=415, detail="Send goals as NDJSON (application/x-ndjson) or CSV (text/csv)")
+    results = []
+    batches = [[]]
+    try:
+        async for index, record in bulk.iter_records(request.stream(), fmt, GOALS_BULK_MAX_LINE_LENGTH):
+            if index >= GOALS_BULK_MAX_ITEMS:
+                raise HTTPException(status_code=413, detail=f"Bulk requests are limited to {GOALS_BULK_MAX_ITEMS} goals")
+            if isinstance(record, str):
+                results.append(bulk_error(index, 422, record))
+                continue
+            try:
+                data = GoalCreate.model_validate(record)
+            except ValidationError as e:
+                results.append(bulk_error(index, 422, jsonable_encoder(e.errors(include_url=False))))
+                continue
+            goal = Goal(user_id=current_user.id, **data.model_dump())
+            if len(batches[-1]) >= GOALS_BULK_COPY_ROWS:
+                batches.append([])
+            batches[-1].append(tuple(getattr(goal, column) for column in GOAL_INSERT_COLUMNS))
+            results.append(BulkGoalResult(index=index, status=201, id=goal.id, version=goal.version))
+    except bulk.LineTooLong:
+        raise HTTPException(status_code=413, detail=f"Lines are limited to {GOALS_BULK_MAX_LINE_LENGTH} characters")
+    if batches[0]:
+        await app.state.storage.import_goals(current_user.id, batches)
+    goals_changed(current_user.id)
+    return BulkGoalResponse(results=results)
+
+@api_router.patch("/goals/bulk", response_model=BulkGoalResponse)
+async def update_goals_bulk(items: List[Any] = Body(...), current_user: UserPublic = Depends(get_current_user)):
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    if len(items) > GOALS_BULK_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Bulk requests are limited to {GOALS_BULK_MAX_ITEMS} goals")
+    results: List[Optional[BulkGoalResult]] = [None] * len(items)
+    updates = {}
+    for index, item in enumerate(items):
+        try:
+            data = GoalBulkUpdate.model_validate(item)
+        except ValidationError as e:
+            results[index] = bulk_error(index, 422, jsonable_encoder(e.errors(include_url=False)))
+            continue
+        if data.id in updates:
+            results[index] = bulk_error(index, 422, "Duplicate goal id", data.id)
+        elif not any(getattr(data, column) is not None for column in GOAL_UPDATE_TYPES):
+            results[index] = bulk_error(index, 400, "No fields to update", data.id)
+        else:
+            updates[data.id] = (index, data)
+    if updates:
+        entries = [data for _, data in updates.values()]
+        columns = [[getattr(data, column) for data in entries] for column in GOAL_UPDATE_TYPES]
+        updated, existing = await app.state.storage.update_goals(
+            current_user.id, list(updates), [data.version for data in entries], columns
+        )
+        goals_changed(current_user.id)
+        for goal_id, (index, _) in updates.items():
+            if goal_id in updated:
+                results[index] = BulkGoalResult(index=index, status=200, id=goal_id, version=updated[goal_id])
+            elif goal_id in existing:
+                results[index] = bulk_error(index, 412, "Goal has been modified", goal_id)
+            else:
+                results[index] = bulk_error(index, 404, "Goal not found", goal_id)
+    return BulkGoalResponse(results=results)
+
+@api_router.delete("/goals/bulk", response_model=BulkGoalResponse)
+async def delete_goals_bulk(ids: List[str] = Body(...), current_user: UserPublic = Depends(get_current_user)):
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    if len(ids) > GOALS_BULK_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Bulk requests are limited to {GOALS_BULK_MAX_ITEMS} goals")
+    deleted = await app.state.storage.delete_goals(current_user.id, ids)
+    goals_changed(current_user.id)
+    return BulkGoalResponse(results=[
+        BulkGoalResult(index=index, id=goal_id, status=200) if goal_id in deleted
+        else bulk_error(index, 404, "Goal not found", goal_id)
+        for index, goal_id in enumerate(ids)
+    ])
+
+def goal_from_row(row) -> Goal:
     return Goal(
         id=row["id"],
         user_id=row["user_id"],
@@ -245,32 +862,255 @@ async def update_goal(goal_id: str, update_data: dict, current_user: UserPublic
         monthly_investment=float(row["monthly_investment"]),
         risk_profile=row["risk_profile"],
         created_at=row["created_at"],
+        version=row["version"],
+        projected_value=row["projected_value"],
+        projected_completion_date=row["projected_completion_date"],
+    )
+
+def goal_etag(version: int) -> str:
+    return f'"{version}"'
+
+def encode_goal_cursor(created_at: datetime, goal_id: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps([created_at.isoformat(), goal_id]).encode()).decode()
+
+def decode_goal_cursor(cursor: str) -> tuple:
+    try:
+        created_at, goal_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), str(goal_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+GOALS_CACHE_CONTROL = "private, no-cache"
+
+@api_router.get("/goals", response_model=List[Goal])
+async def get_goals(
+    request: Request,
+    response: Response,
+    limit: int = Query(GOALS_DEFAULT_PAGE_SIZE, ge=1, le=GOALS_MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    goal_type: Optional[str] = None,
+    risk_profile: Optional[str] = None,
+    min_target: Optional[float] = None,
+    max_target: Optional[float] = None,
+    if_none_match: Optional[str] = Header(None),
+    current_user: UserPublic = Depends(get_current_user),
+):
+    """List goals newest first, one page at a time.
+
+    When more goals follow, the ``X-Next-Cursor`` header holds the value to
+    pass as ``after`` for the next page. The ETag combines the user's goals
+    version with the query, so an unchanged page is answered with 304; when
+    the version is cached that needs no database round trip.
+    """
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    cursor = decode_goal_cursor(after) if after else None
+    version = goals_version_cache.get(current_user.id)
+    if version is not MISSING:
+        etag = make_etag(current_user.id, version, request.url.query)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag, GOALS_CACHE_CONTROL)
+    if version is MISSING:
+        # Read before the goals, so a concurrent write can only make the ETag older than the page.
+        version = await app.state.storage.goals_version(current_user.id)
+        goals_version_cache.put(current_user.id, version, 1)
+    etag = make_etag(current_user.id, version, request.url.query)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag, GOALS_CACHE_CONTROL)
+    rows = await app.state.storage.goals_page(
+        current_user.id, limit, cursor, goal_type, risk_profile, min_target, max_target
+    )
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = GOALS_CACHE_CONTROL
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = encode_goal_cursor(rows[-1]["created_at"], rows[-1]["id"])
+    if fastjson.ENABLED:
+        return fastjson.response(fastjson.records(rows), response.headers)
+    return [goal_from_row(r) for r in rows]
+
+@api_router.put("/goals/{goal_id}", response_model=Goal)
+async def update_goal(
+    goal_id: str,
+    update_data: GoalUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    current_user: UserPublic = Depends(get_current_user),
+):
+    """Update a goal in one statement.
+
+    With ``If-Match`` set to the goal's ETag the update only applies if
+    nobody has changed the goal since; otherwise it fails with 412.
+    """
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    changes = update_data.model_dump(exclude_unset=True, exclude_none=True)
+    if not changes:
+        raise HTTPException(status_code=400, detail="No fields to update")
+    expected_version = None
+    if if_match is not None and if_match.strip() != "*":
+        try:
+            expected_version = int(if_match.strip().removeprefix("W/").strip('"'))
+        except ValueError:
+            raise HTTPException(status_code=412, detail="Goal has been modified")
+    row, exists = await app.state.storage.update_goal(current_user.id, goal_id, changes, expected_version)
+    goals_changed(current_user.id)
+    if not row and exists:
+        raise HTTPException(status_code=412, detail="Goal has been modified")
+    if not row:
+        raise HTTPException(status_code=404, detail="Goal not found")
+    response.headers["ETag"] = goal_etag(row["version"])
+    if fastjson.ENABLED:
+        return fastjson.response(fastjson.record(row), response.headers)
+    return goal_from_row(row)
+
+@api_router.post("/goals/{goal_id}/contributions", response_model=Goal)
+async def add_contribution(
+    goal_id: str,
+    contribution: ContributionCreate,
+    response: Response,
+    current_user: UserPublic = Depends(get_current_user),
+):
+    """Add a contribution to the goal's current amount; it shows up in the goal's history."""
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    row = await app.state.storage.add_contribution(current_user.id, goal_id, contribution.amount)
+    goals_changed(current_user.id)
+    if not row:
+        raise HTTPException(status_code=404, detail="Goal not found")
+    response.headers["ETag"] = goal_etag(row["version"])
+    return goal_from_row(row)
+
+@api_router.get("/goals/{goal_id}/history", response_model=GoalHistory)
+async def goal_history(
+    goal_id: str,
+    resolution: Literal["day", "month", "year"] = "month",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = Query(GOAL_HISTORY_DEFAULT_POINTS, ge=1, le=GOAL_HISTORY_MAX_POINTS),
+    current_user: UserPublic = Depends(get_current_user),
+):
+    """Contributions and balance per day, month or year, oldest first.
+
+    Points come from rollups maintained as contributions are recorded, so the
+    cost depends on the points returned, not on how many contributions the
+    goal has. Without ``start`` this returns the latest ``limit`` periods.
+    """
+    if not current_user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    rows = await app.state.storage.goal_history(current_user.id, goal_id, resolution, start, end, limit)
+    if rows is None:
+        raise HTTPException(status_code=404, detail="Goal not found")
+    next_end = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_end = rows[-1]["period_start"]
+    return GoalHistory(
+        goal_id=goal_id,
+        resolution=resolution,
+        points=[
+            HistoryPoint(period_start=r["period_start"], contributed=r["contributed"], balance=r["balance"],
+                         contributions=r["contributions"])
+            for r in reversed(rows)
+        ],
+        next_end=next_end,
     )
 
 @api_router.delete("/goals/{goal_id}")
 async def delete_goal(goal_id: str, current_user: UserPublic = Depends(get_current_user)):
     if not current_user:
         raise HTTPException(status_code=401, detail="Not authenticated")
-    async with app.state.pg_pool.acquire() as conn:
-        result = await conn.execute("DELETE FROM goals WHERE id = $1 AND user_id = $2", goal_id, current_user.id)
-    if result.endswith("DELETE 0"):
+    deleted = await app.state.storage.delete_goal(current_user.id, goal_id)
+    goals_changed(current_user.id)
+    if not deleted:
         raise HTTPException(status_code=404, detail="Goal not found")
     return {"message": "Goal deleted"}
 
 @api_router.post("/contact")
 async def contact(form_data: ContactForm):
-    async with app.state.pg_pool.acquire() as conn:
-        await conn.execute(
-            """
-            INSERT INTO contact_messages (id, name, email, message, created_at)
-            VALUES ($1, $2, $3, $4, $5)
-            """,
-            str(uuid.uuid4()), form_data.name, form_data.email, form_data.message, datetime.now(timezone.utc)
-        )
+    # Written in batches by contact_queue; the sender doesn't wait for the INSERT.
+    await contact_queue.put(
+        (str(uuid.uuid4()), form_data.name, form_data.email, form_data.message, datetime.now(timezone.utc))
+    )
     return {"message": "Message sent successfully"}
 
+@api_router.get("/contact/stats", dependencies=[Depends(require_profile_admin)], include_in_schema=False)
+async def contact_stats():
+    return contact_queue.stats()
+
+@api_router.get("/projections/stats", dependencies=[Depends(require_profile_admin)], include_in_schema=False)
+async def projection_stats():
+    return projection_worker.stats()
+
+@app.get("/metrics", dependencies=[Depends(require_profile_admin)], include_in_schema=False)
+async def prometheus_metrics():
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    exposition = Exposition(prefix="wealthhub_")
+    exposition.histogram("http_request_duration_seconds", "Request latency by route.", request_seconds.samples())
+    exposition.histogram("auth_duration_seconds", "Time spent resolving the current user.", [({}, auth_seconds)])
+    exposition.histogram("compute_duration_seconds", "Projection compute time.", compute_seconds.samples())
+    exposition.histogram("db_query_duration_seconds", "Time per SQL statement.", query_seconds.samples())
+    pg_pool = getattr(app.state, 'pg_pool', None)
+    if pg_pool:
+        pool = pg_pool.stats()
+        exposition.histogram("db_pool_acquire_seconds", "Time waiting for a pooled connection.", [({}, pg_pool.acquire_seconds)])
+        exposition.scalar("db_pool_connections", "gauge", "Pooled connections by state.",
+                          [({"state": "in_use"}, pool["in_use"]), ({"state": "idle"}, pool["idle"])])
+        exposition.scalar("db_pool_waiting", "gauge", "Requests waiting for a connection.", [({}, pool["waiting"])])
+        exposition.scalar("db_pool_exhausted_total", "counter", "Acquires rejected with 503.", [({}, pool["exhausted"])])
+        exposition.scalar("db_pool_recycled_total", "counter", "Connections closed for age.", [({}, pool["recycled"])])
+    if loaded(sqlite_storage) and isinstance(app.state.storage, sqlite_storage.SqliteStorage):
+        exposition.histogram("db_commit_seconds", "SQLite write batch commit time.", [({}, app.state.storage.commit_seconds)])
+        exposition.scalar("db_write_queue", "gauge", "Writes waiting for the SQLite writer.",
+                          [({}, app.state.storage.stats()["write_queue"])])
+    reads = read_pool.stats()
+    exposition.scalar("db_reads_total", "counter", "Read-only acquires by the pool that served them.",
+                      [({"pool": "replica"}, reads["replica_reads"]), ({"pool": "primary"}, reads["primary_reads"])])
+    exposition.scalar("db_replica_failures_total", "counter", "Replica errors that moved reads to the primary.",
+                      [({}, reads["replica_failures"])])
+    exposition.histogram("password_hash_wait_seconds", "Time queued for a hashing slot.", [({}, password_hasher.wait_seconds)])
+    exposition.histogram("password_hash_seconds", "Password hash and verify time.", [({}, password_hasher.hash_seconds)])
+    exposition.scalar("password_hash_rejected_total", "counter", "Hash requests rejected with 503.", [({}, password_hasher.rejected)])
+    caches = {"results": result_cache, "auth_tokens": token_cache, "auth_users": user_cache, "goals_version": goals_version_cache}
+    for counter in ("hits", "misses", "evictions"):
+        exposition.scalar(f"cache_{counter}_total", "counter", f"Cache {counter}.",
+                          [({"cache": name}, getattr(cache, counter)) for name, cache in caches.items()])
+    exposition.scalar("cache_entries", "gauge", "Cached entries.",
+                      [({"cache": name}, cache.stats()["entries"]) for name, cache in caches.items()])
+    exposition.scalar("contact_queue_depth", "gauge", "Contact messages waiting to be written.",
+                      [({}, contact_queue.stats()["queue_depth"])])
+    exposition.histogram("contact_flush_seconds", "Contact batch write time.", [({}, contact_queue.flush_seconds)])
+    exposition.scalar("contact_dropped_total", "counter", "Contact messages that could not be written.",
+                      [({}, contact_queue.dropped)])
+    exposition.histogram("projection_chunk_seconds", "Time to recompute and save a chunk of goal projections.",
+                         [({}, projection_worker.chunk_seconds)])
+    exposition.scalar("projections_recomputed_total", "counter", "Goal projections materialized.",
+                      [({}, projection_worker.recomputed)])
+    return Response(exposition.render(), media_type=Exposition.CONTENT_TYPE)
+
+@api_router.get("/admin/profiles", dependencies=[Depends(require_profile_admin)], include_in_schema=False)
+async def list_profiles():
+    return profile_store.list()
+
+@api_router.get("/admin/profiles/{profile_id}", dependencies=[Depends(require_profile_admin)], include_in_schema=False)
+async def get_profile(profile_id: int, format: Literal["speedscope", "collapsed"] = "speedscope"):
+    profile = profile_store.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "collapsed":
+        return Response(profile.collapsed(), media_type="text/plain; charset=utf-8")
+    return profile.speedscope()
+
 app.include_router(api_router)
 
+if METRICS_ENABLED:
+    app.add_middleware(RequestMetricsMiddleware, family=request_seconds)
+
+if PROFILE_SAMPLE_RATE > 0 or PROFILE_ADMIN_TOKEN:
+    app.add_middleware(ProfilingMiddleware, store=profile_store, sample_rate=PROFILE_SAMPLE_RATE,
+                       token=PROFILE_ADMIN_TOKEN, interval=PROFILE_INTERVAL_SECONDS)
+
 origins_env = os.environ.get('CORS_ORIGINS', '')
 origins = [o.strip() for o in origins_env.split(',') if o.strip()]
 if not origins:
@@ -285,6 +1125,7 @@ app.add_middleware(
     allow_origins=origins,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Profile-Id"],
 )
 
 logging.basicConfig(
@@ -293,45 +1134,58 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def startup_projection_tables():
+    await run_in_threadpool(tables.install, dict(RISK_RETURNS))
+    app.state.assumptions_watcher = None
+    if tables.RISK_RETURNS_FILE:
+        app.state.assumptions_watcher = asyncio.create_task(
+            tables.watch(tables.RISK_RETURNS_FILE, tables.RELOAD_INTERVAL_SECONDS)
+        )
+
 @app.on_event("startup")
 async def startup_db_pool():
     if not DATABASE_URL:
-        raise RuntimeError("DATABASE_URL environment variable is required for Postgres (Neon)")
-    app.state.pg_pool = await asyncpg.create_pool(dsn=DATABASE_URL, min_size=1, max_size=5)
+        raise RuntimeError("DATABASE_URL environment variable is required (Postgres, or sqlite:///path)")
+    if storage.is_sqlite_url(DATABASE_URL):
+        app.state.storage = await run_in_threadpool(sqlite_storage.SqliteStorage(storage.sqlite_path(DATABASE_URL)).open)
+        return
+    warmup_queries = storage.warmup_queries(GOALS_DEFAULT_PAGE_SIZE)
+    app.state.pg_pool = await db.create_pool(DATABASE_URL, query_seconds if METRICS_ENABLED else None)
     async with app.state.pg_pool.acquire() as conn:
-        await conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS users (
-                id TEXT PRIMARY KEY,
-                email TEXT UNIQUE NOT NULL,
-                name TEXT NOT NULL,
-                picture TEXT NOT NULL,
-                password_hash TEXT NOT NULL,
-                created_at TIMESTAMPTZ NOT NULL
-            );
-            CREATE TABLE IF NOT EXISTS goals (
-                id TEXT PRIMARY KEY,
-                user_id TEXT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
-                goal_type TEXT NOT NULL,
-                target_amount DOUBLE PRECISION NOT NULL,
-                current_amount DOUBLE PRECISION NOT NULL,
-                monthly_investment DOUBLE PRECISION NOT NULL,
-                risk_profile TEXT NOT NULL,
-                created_at TIMESTAMPTZ NOT NULL
-            );
-            CREATE INDEX IF NOT EXISTS idx_goals_user_id ON goals(user_id);
-            CREATE TABLE IF NOT EXISTS contact_messages (
-                id TEXT PRIMARY KEY,
-                name TEXT NOT NULL,
-                email TEXT NOT NULL,
-                message TEXT NOT NULL,
-                created_at TIMESTAMPTZ NOT NULL
-            );
-            """
-        )
+        if DB_MIGRATE_ON_STARTUP:
+            await migrations.migrate(conn)
+        else:
+            await migrations.require_latest(conn)
+    await app.state.pg_pool.warmup(warmup_queries)
+    app.state.pg_read_pool = None
+    if DATABASE_REPLICA_URL:
+        try:
+            app.state.pg_read_pool = await db.create_pool(DATABASE_REPLICA_URL, query_seconds if METRICS_ENABLED else None)
+            await app.state.pg_read_pool.warmup(warmup_queries)
+        except Exception as e:
+            # Serve everything from the primary rather than fail to start.
+            logger.error("Could not open the read replica pool, reading from the primary: %r", e)
+            if app.state.pg_read_pool is not None:
+                await app.state.pg_read_pool.close()
+                app.state.pg_read_pool = None
+
+@app.on_event("startup")
+async def startup_projection_worker():
+    if PROJECTION_WORKER_ENABLED:
+        projection_worker.start()
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    pg_pool = getattr(app.state, 'pg_pool', None)
-    if pg_pool:
-        await pg_pool.close()
\ No newline at end of file
+    watcher = getattr(app.state, 'assumptions_watcher', None)
+    if watcher:
+        watcher.cancel()
+    await projection_worker.stop()
+    await contact_queue.drain(CONTACT_DRAIN_TIMEOUT_SECONDS)
+    await app.state.storage.close()
+    read_replica = getattr(app.state, 'pg_read_pool', None)
+    if read_replica:
+        await read_replica.close()
+    if loaded(montecarlo):
+        montecarlo.shutdown_pool()
+    password_hasher.shutdown()
\ No newline at end of file
@@ -0,0 +1,511 @@
+"""Embedded SQLite storage for single-node installs.
+
+Selected with ``DATABASE_URL=sqlite:///path/to/wealthhub.db``. The database
+runs in WAL mode so readers never wait for the writer:
+
+* Reads run on a small pool of read-only connections, one per reader thread.
+* All writes go through one dedicated writer thread. It takes every write
+  queued at that moment (up to ``SQLITE_MAX_WRITE_BATCH``), applies each in
+  its own savepoint inside a single transaction and commits once, so a
+  burst of writes shares one fsync. Callers are answered after the commit.
+
+Timestamps are stored as integer microseconds since the epoch (UTC), which
+keeps ``created_at`` ordering exact for keyset pagination.
+"""
+import asyncio
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta, timezone
+from typing import AsyncIterator, Callable, Dict, List, Mapping, Optional, Sequence, Set, Tuple
+
+from metrics import Histogram
+from storage import (
+    CONTACT_COLUMNS,
+    GOAL_COLUMNS,
+    GOAL_INSERT_COLUMNS,
+    GOAL_UPDATE_TYPES,
+    PROJECTION_INPUT_COLUMNS,
+    goal_history_query,
+    goals_page_query,
+)
+
+logger = logging.getLogger(__name__)
+
+SQLITE_READERS = int(os.environ.get('SQLITE_READERS', '4'))
+SQLITE_MAX_WRITE_BATCH = int(os.environ.get('SQLITE_MAX_WRITE_BATCH', '256'))
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_STOP = object()
+_TIMESTAMP_COLUMNS = {"created_at", "period_start"}
+_DATE_COLUMNS = {"projected_completion_date"}
+# Leaves room under SQLite's default limit of 32766 bound parameters.
+_MAX_IN_IDS = 500
+
+SCHEMA = [
+    (1, """
+        CREATE TABLE IF NOT EXISTS users (
+            id TEXT PRIMARY KEY,
+            email TEXT UNIQUE NOT NULL,
+            name TEXT NOT NULL,
+            picture TEXT NOT NULL,
+            password_hash TEXT NOT NULL,
+            created_at INTEGER NOT NULL,
+            goals_version INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS goals (
+            id TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            goal_type TEXT NOT NULL,
+            target_amount REAL NOT NULL,
+            current_amount REAL NOT NULL,
+            monthly_investment REAL NOT NULL,
+            risk_profile TEXT NOT NULL,
+            created_at INTEGER NOT NULL,
+            version INTEGER NOT NULL DEFAULT 1
+        );
+        CREATE INDEX IF NOT EXISTS idx_goals_user_created ON goals(user_id, created_at DESC, id);
+        CREATE TABLE IF NOT EXISTS contact_messages (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            email TEXT NOT NULL,
+            message TEXT NOT NULL,
+            created_at INTEGER NOT NULL
+        );
+        CREATE TRIGGER IF NOT EXISTS goals_version_insert AFTER INSERT ON goals BEGIN
+            UPDATE users SET goals_version = goals_version + 1 WHERE id = NEW.user_id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS goals_version_update AFTER UPDATE ON goals BEGIN
+            UPDATE users SET goals_version = goals_version + 1 WHERE id = OLD.user_id;
+        END;
+        CREATE TRIGGER IF NOT EXISTS goals_version_delete AFTER DELETE ON goals BEGIN
+            UPDATE users SET goals_version = goals_version + 1 WHERE id = OLD.user_id;
+        END;
+    """),
+    # Mirrors Postgres migration 4, with row-level triggers.
+    (2, """
+        CREATE TABLE IF NOT EXISTS goal_contributions (
+            id INTEGER PRIMARY KEY,
+            goal_id TEXT NOT NULL REFERENCES goals(id) ON DELETE CASCADE,
+            amount REAL NOT NULL,
+            balance REAL NOT NULL,
+            created_at INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_goal_contributions_goal ON goal_contributions(goal_id, created_at);
+        CREATE TABLE IF NOT EXISTS goal_contribution_rollups (
+            goal_id TEXT NOT NULL REFERENCES goals(id) ON DELETE CASCADE,
+            resolution TEXT NOT NULL,
+            period_start INTEGER NOT NULL,
+            contributed REAL NOT NULL,
+            balance REAL NOT NULL,
+            contributions INTEGER NOT NULL,
+            PRIMARY KEY (goal_id, resolution, period_start)
+        ) WITHOUT ROWID;
+        CREATE TRIGGER IF NOT EXISTS goal_contributions_insert AFTER INSERT ON goals
+        WHEN NEW.current_amount <> 0 BEGIN
+            INSERT INTO goal_contributions (goal_id, amount, balance, created_at)
+            VALUES (NEW.id, NEW.current_amount, NEW.current_amount, NEW.created_at);
+        END;
+        CREATE TRIGGER IF NOT EXISTS goal_contributions_update AFTER UPDATE OF current_amount ON goals
+        WHEN NEW.current_amount <> OLD.current_amount BEGIN
+            INSERT INTO goal_contributions (goal_id, amount, balance, created_at)
+            VALUES (NEW.id, NEW.current_amount - OLD.current_amount, NEW.current_amount,
+                    CAST((julianday('now') - 2440587.5) * 86400000000 AS INTEGER));
+        END;
+        CREATE TRIGGER IF NOT EXISTS goal_contribution_rollups_insert AFTER INSERT ON goal_contributions BEGIN
+            INSERT INTO goal_contribution_rollups (goal_id, resolution, period_start, contributed, balance, contributions)
+            SELECT NEW.goal_id, resolution, period_start, NEW.amount, NEW.balance, 1 FROM (
+                SELECT 'day' AS resolution, NEW.created_at - NEW.created_at % 86400000000 AS period_start
+                UNION ALL
+                SELECT 'month', CAST(strftime('%s', NEW.created_at / 1000000, 'unixepoch', 'start of month') AS INTEGER) * 1000000
+                UNION ALL
+                SELECT 'year', CAST(strftime('%s', NEW.created_at / 1000000, 'unixepoch', 'start of year') AS INTEGER) * 1000000
+            ) WHERE true
+            ON CONFLICT (goal_id, resolution, period_start) DO UPDATE SET
+                contributed = contributed + excluded.contributed,
+                balance = excluded.balance,
+                contributions = contributions + 1;
+        END;
+    """),
+    (3, """
+        ALTER TABLE goals ADD COLUMN projected_value REAL;
+        ALTER TABLE goals ADD COLUMN projected_completion_date TEXT;
+        ALTER TABLE goals ADD COLUMN projected_return REAL;
+        ALTER TABLE goals ADD COLUMN projected_version INTEGER;
+        CREATE INDEX IF NOT EXISTS idx_goals_projection_stale ON goals(id) WHERE projected_version IS NOT version;
+    """),
+]
+
+
+def to_micros(value: datetime) -> int:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+def from_micros(value: int) -> datetime:
+    return EPOCH + timedelta(microseconds=value)
+
+
+def _param(value):
+    return to_micros(value) if isinstance(value, datetime) else value
+
+
+def _row(row: Optional[sqlite3.Row]) -> Optional[dict]:
+    if row is None:
+        return None
+    result = dict(row)
+    for column in _TIMESTAMP_COLUMNS.intersection(result):
+        result[column] = from_micros(result[column])
+    for column in _DATE_COLUMNS.intersection(result):
+        if result[column] is not None:
+            result[column] = date.fromisoformat(result[column])
+    return result
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA foreign_keys = ON")
+    return conn
+
+
+def _resolve(future: asyncio.Future, ok: bool, value):
+    if future.cancelled():
+        return
+    if ok:
+        future.set_result(value)
+    else:
+        future.set_exception(value)
+
+
+class SqliteStorage:
+    """Same interface as :class:`storage.PostgresStorage`."""
+
+    def __init__(self, path: str, readers: int = SQLITE_READERS, max_write_batch: int = SQLITE_MAX_WRITE_BATCH):
+        self.path = path
+        self.readers = readers
+        self.max_write_batch = max_write_batch
+        self._jobs: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._writer: Optional[threading.Thread] = None
+        self._reader_pool: Optional[ThreadPoolExecutor] = None
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self.writes = 0
+        self.write_batches = 0
+        self.reads = 0
+        self.commit_seconds = Histogram()
+
+    def open(self):
+        """Create or upgrade the schema and start the writer and reader threads. Blocking."""
+        conn = _connect(self.path)
+        conn.execute("PRAGMA journal_mode = WAL")
+        # With WAL, NORMAL loses at most the last commits on power loss, never consistency.
+        conn.execute("PRAGMA synchronous = NORMAL")
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, script in SCHEMA:
+            if number > version:
+                conn.executescript(f"BEGIN; {script} PRAGMA user_version = {number}; COMMIT;")
+        self._writer = threading.Thread(target=self._run_writer, args=(conn,), name="sqlite-writer", daemon=True)
+        self._writer.start()
+        self._reader_pool = ThreadPoolExecutor(self.readers, thread_name_prefix="sqlite-read")
+        return self
+
+    async def close(self):
+        if self._writer is None:
+            return
+        self._jobs.put(_STOP)
+        await asyncio.get_running_loop().run_in_executor(None, self._writer.join)
+        self._writer = None
+        self._reader_pool.shutdown(wait=True)
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+
+    def stats(self) -> dict:
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "readers": self.readers,
+            "write_queue": self._jobs.qsize(),
+            "writes": self.writes,
+            "write_batches": self.write_batches,
+            "reads": self.reads,
+            "commit_seconds": self.commit_seconds.snapshot(),
+        }
+
+    # Plumbing
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = _connect(self.path)
+            conn.execute("PRAGMA query_only = ON")
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    async def _read(self, fn: Callable, *args):
+        self.reads += 1
+        return await asyncio.get_running_loop().run_in_executor(self._reader_pool, lambda: fn(self._reader(), *args))
+
+    async def _write(self, fn: Callable, *args):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._jobs.put((fn, args, future, loop))
+        return await future
+
+    def _run_writer(self, conn: sqlite3.Connection):
+        try:
+            while True:
+                job = self._jobs.get()
+                if job is _STOP:
+                    return
+                batch = [job]
+                stop = False
+                while len(batch) < self.max_write_batch:
+                    try:
+                        job = self._jobs.get_nowait()
+                    except queue.Empty:
+                        break
+                    if job is _STOP:
+                        stop = True
+                        break
+                    batch.append(job)
+                self._commit(conn, batch)
+                if stop:
+                    return
+        finally:
+            conn.close()
+
+    def _commit(self, conn: sqlite3.Connection, batch: list):
+        started_at = time.perf_counter()
+        outcomes = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for fn, args, _, _ in batch:
+                conn.execute("SAVEPOINT job")
+                try:
+                    outcomes.append((True, fn(conn, *args)))
+                except Exception as e:
+                    conn.execute("ROLLBACK TO job")
+                    outcomes.append((False, e))
+                conn.execute("RELEASE job")
+            conn.execute("COMMIT")
+        except Exception as e:
+            logger.exception("SQLite write batch of %d failed", len(batch))
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            outcomes = [(False, e)] * len(batch)
+        self.commit_seconds.observe(time.perf_counter() - started_at)
+        self.writes += len(batch)
+        self.write_batches += 1
+        for (_, _, future, loop), (ok, value) in zip(batch, outcomes):
+            loop.call_soon_threadsafe(_resolve, future, ok, value)
+
+    # Users
+
+    async def get_user(self, user_id: str) -> Optional[Mapping]:
+        return await self._read(_fetchrow, "SELECT id, email, name, picture, created_at FROM users WHERE id = ?", user_id)
+
+    async def get_user_for_login(self, email: str) -> Optional[Mapping]:
+        return await self._read(
+            _fetchrow, "SELECT id, email, name, picture, created_at, password_hash FROM users WHERE email = ?", email
+        )
+
+    async def create_user(self, user: Sequence) -> bool:
+        return await self._write(_create_user, [_param(value) for value in user])
+
+    async def set_password_hash(self, user_id: str, password_hash: str):
+        await self._write(_execute, "UPDATE users SET password_hash = ? WHERE id = ?", (password_hash, user_id))
+
+    # Goals
+
+    async def goals_version(self, user_id: str) -> int:
+        row = await self._read(_fetchrow, "SELECT goals_version FROM users WHERE id = ?", user_id)
+        return row["goals_version"] if row else None
+
+    async def goals_page(self, user_id: str, limit: int, after: Optional[tuple] = None, goal_type: Optional[str] = None,
+                         risk_profile: Optional[str] = None, min_target: Optional[float] = None,
+                         max_target: Optional[float] = None) -> List[Mapping]:
+        query, args = goals_page_query(user_id, limit, after, goal_type, risk_profile, min_target, max_target,
+                                       placeholder="?")
+        return await self._read(_fetch, query, *[_param(arg) for arg in args])
+
+    async def goals_for_summary(self, user_id: str) -> List[Mapping]:
+        return await self._read(
+            _fetch,
+            "SELECT id, goal_type, target_amount, current_amount, monthly_investment, risk_profile "
+            "FROM goals WHERE user_id = ? ORDER BY created_at DESC, id",
+            user_id,
+        )
+
+    async def create_goal(self, goal: Sequence):
+        await self._write(_insert_many, "goals", GOAL_INSERT_COLUMNS, [goal])
+
+    async def import_goals(self, user_id: str, batches: List[List[tuple]]):
+        records = [record for batch in batches for record in batch]
+        await self._write(_insert_many, "goals", GOAL_INSERT_COLUMNS, records)
+
+    async def update_goal(self, user_id: str, goal_id: str, changes: Dict[str, object],
+                          expected_version: Optional[int] = None) -> Tuple[Optional[Mapping], bool]:
+        return await self._write(_update_goal, user_id, goal_id, changes, expected_version)
+
+    async def update_goals(self, user_id: str, ids: List[str], versions: List[Optional[int]],
+                           columns: List[list]) -> Tuple[Dict[str, int], Set[str]]:
+        return await self._write(_update_goals, user_id, ids, versions, columns)
+
+    async def delete_goal(self, user_id: str, goal_id: str) -> bool:
+        return await self._write(_execute, "DELETE FROM goals WHERE id = ? AND user_id = ?", (goal_id, user_id)) > 0
+
+    async def delete_goals(self, user_id: str, ids: List[str]) -> Set[str]:
+        return await self._write(_delete_goals, user_id, ids)
+
+    async def add_contribution(self, user_id: str, goal_id: str, amount: float) -> Optional[Mapping]:
+        return await self._write(
+            _fetchrow,
+            f"UPDATE goals SET current_amount = current_amount + ?, version = version + 1 "
+            f"WHERE user_id = ? AND id = ? RETURNING {GOAL_COLUMNS}",
+            amount, user_id, goal_id,
+        )
+
+    async def goal_history(self, user_id: str, goal_id: str, resolution: str, start: Optional[datetime] = None,
+                           end: Optional[datetime] = None, limit: int = 500) -> Optional[List[Mapping]]:
+        query, args = goal_history_query(goal_id, resolution, start, end, limit, placeholder="?")
+        return await self._read(_goal_history, user_id, goal_id, query, [_param(arg) for arg in args])
+
+    # Materialized projections
+
+    async def stale_projections(self, limit: int) -> List[Mapping]:
+        return await self._read(
+            _fetch, f"SELECT {PROJECTION_INPUT_COLUMNS} FROM goals WHERE projected_version IS NOT version LIMIT ?", limit
+        )
+
+    async def projection_inputs(self, after_id: str, limit: int) -> List[Mapping]:
+        return await self._read(
+            _fetch, f"SELECT {PROJECTION_INPUT_COLUMNS} FROM goals WHERE id > ? ORDER BY id LIMIT ?", after_id, limit
+        )
+
+    @asynccontextmanager
+    async def projection_lock(self) -> AsyncIterator[bool]:
+        # A single-node install runs one projection worker, so there is nobody to exclude.
+        yield True
+
+    async def projected_returns(self) -> List[Mapping]:
+        return await self._read(
+            _fetch, "SELECT DISTINCT risk_profile, projected_return FROM goals WHERE projected_version = version"
+        )
+
+    async def save_projections(self, ids: List[str], versions: List[int], values: List[Optional[float]],
+                               completion_dates: List[Optional[date]], annual_returns: List[float]) -> List[str]:
+        return await self._write(_save_projections, list(zip(values, completion_dates, annual_returns, ids, versions)))
+
+    # Contact messages
+
+    async def add_contact_messages(self, records: List[tuple]):
+        await self._write(_insert_many, "contact_messages", CONTACT_COLUMNS, records)
+
+
+# Statements, run on a reader connection or inside the writer's transaction.
+
+def _fetchrow(conn: sqlite3.Connection, query: str, *args) -> Optional[dict]:
+    return _row(conn.execute(query, args).fetchone())
+
+
+def _fetch(conn: sqlite3.Connection, query: str, *args) -> List[dict]:
+    return [_row(row) for row in conn.execute(query, args)]
+
+
+def _goal_history(conn: sqlite3.Connection, user_id: str, goal_id: str, query: str, args: List) -> Optional[List[dict]]:
+    if conn.execute("SELECT 1 FROM goals WHERE id = ? AND user_id = ?", (goal_id, user_id)).fetchone() is None:
+        return None
+    return [_row(row) for row in conn.execute(query, args)]
+
+
+def _execute(conn: sqlite3.Connection, query: str, args: Sequence) -> int:
+    return conn.execute(query, args).rowcount
+
+
+def _insert_many(conn: sqlite3.Connection, table: str, columns: List[str], records: List[Sequence]):
+    query = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+    conn.executemany(query, ([_param(value) for value in record] for record in records))
+
+
+def _create_user(conn: sqlite3.Connection, user: List) -> bool:
+    try:
+        conn.execute(
+            "INSERT INTO users (id, email, name, picture, password_hash, created_at) VALUES (?, ?, ?, ?, ?, ?)", user
+        )
+    except sqlite3.IntegrityError:
+        return False
+    return True
+
+
+def _update_goal(conn: sqlite3.Connection, user_id: str, goal_id: str, changes: Dict[str, object],
+                 expected_version: Optional[int]) -> Tuple[Optional[dict], bool]:
+    set_clauses = ", ".join(f"{column} = ?" for column in changes)
+    query = f"UPDATE goals SET {set_clauses}, version = version + 1 WHERE user_id = ? AND id = ?"
+    args = [*changes.values(), user_id, goal_id]
+    if expected_version is not None:
+        query += " AND version = ?"
+        args.append(expected_version)
+    row = _row(conn.execute(f"{query} RETURNING {GOAL_COLUMNS}", args).fetchone())
+    exists = row is not None
+    if row is None and expected_version is not None:
+        exists = conn.execute("SELECT 1 FROM goals WHERE id = ? AND user_id = ?", (goal_id, user_id)).fetchone() is not None
+    return row, exists
+
+
+_BULK_UPDATE_GOAL = (
+    "UPDATE goals SET "
+    + ", ".join(f"{column} = COALESCE(?, {column})" for column in GOAL_UPDATE_TYPES)
+    + ", version = version + 1 WHERE user_id = ? AND id = ? AND (? IS NULL OR version = ?) RETURNING version"
+)
+
+
+def _update_goals(conn: sqlite3.Connection, user_id: str, ids: List[str], versions: List[Optional[int]],
+                  columns: List[list]) -> Tuple[Dict[str, int], Set[str]]:
+    updated = {}
+    existing = set()
+    for position, goal_id in enumerate(ids):
+        values = [column[position] for column in columns]
+        row = conn.execute(_BULK_UPDATE_GOAL, (*values, user_id, goal_id, versions[position], versions[position])).fetchone()
+        if row is not None:
+            updated[goal_id] = row["version"]
+        elif conn.execute("SELECT 1 FROM goals WHERE id = ? AND user_id = ?", (goal_id, user_id)).fetchone():
+            existing.add(goal_id)
+    return updated, existing
+
+
+def _save_projections(conn: sqlite3.Connection, records: List[tuple]) -> List[str]:
+    user_ids = []
+    for value, completion_date, annual_return, goal_id, version in records:
+        row = conn.execute(
+            "UPDATE goals SET projected_value = ?, projected_completion_date = ?, projected_return = ?, "
+            "projected_version = version WHERE id = ? AND version = ? RETURNING user_id",
+            (value, completion_date.isoformat() if completion_date else None, annual_return, goal_id, version),
+        ).fetchone()
+        if row is not None:
+            user_ids.append(row["user_id"])
+    return user_ids
+
+
+def _delete_goals(conn: sqlite3.Connection, user_id: str, ids: List[str]) -> Set[str]:
+    deleted = set()
+    for start in range(0, len(ids), _MAX_IN_IDS):
+        chunk = ids[start:start + _MAX_IN_IDS]
+        rows = conn.execute(
+            f"DELETE FROM goals WHERE user_id = ? AND id IN ({', '.join('?' * len(chunk))}) RETURNING id",
+            (user_id, *chunk),
+        )
+        deleted.update(row["id"] for row in rows)
+    return deleted
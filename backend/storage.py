@@ -0,0 +1,382 @@
+"""Storage for users, goals and contact messages.
+
+Handlers talk to a storage object instead of issuing SQL themselves, so the
+same API runs on Postgres (:class:`PostgresStorage`, on an asyncpg-style
+pool) or, for single-node installs, on an embedded SQLite file
+(:class:`sqlite_storage.SqliteStorage`). ``DATABASE_URL`` picks one by
+scheme; see :func:`is_sqlite_url`.
+
+Rows come back as mappings with the column names used below; ``created_at``
+is always a timezone-aware datetime.
+"""
+from contextlib import asynccontextmanager
+from datetime import date, datetime
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Mapping, Optional, Sequence, Set, Tuple
+
+from db import ReadRouter
+
+# Hot queries, shared with the pool warmup so their statements are prepared at startup.
+SELECT_USER_BY_ID = "SELECT id, email, name, picture, created_at FROM users WHERE id = $1"
+SELECT_GOALS_VERSION = "SELECT goals_version FROM users WHERE id = $1"
+SELECT_USER_FOR_LOGIN = "SELECT id, email, name, picture, created_at, password_hash FROM users WHERE email = $1"
+GOAL_COLUMNS = (
+    "id, user_id, goal_type, target_amount, current_amount, monthly_investment, risk_profile, created_at, version, "
+    # Null until the projection worker has caught up with the goal's current version.
+    "CASE WHEN projected_version = version THEN projected_value END AS projected_value, "
+    "CASE WHEN projected_version = version THEN projected_completion_date END AS projected_completion_date"
+)
+SELECT_GOALS = f"SELECT {GOAL_COLUMNS} FROM goals"
+SELECT_GOALS_FOR_SUMMARY = (
+    "SELECT id, goal_type, target_amount, current_amount, monthly_investment, risk_profile "
+    "FROM goals WHERE user_id = $1 ORDER BY created_at DESC, id"
+)
+
+USER_INSERT_COLUMNS = ["id", "email", "name", "picture", "password_hash", "created_at"]
+GOAL_INSERT_COLUMNS = ["id", "user_id", "goal_type", "target_amount", "current_amount", "monthly_investment", "risk_profile", "created_at"]
+CONTACT_COLUMNS = ["id", "name", "email", "message", "created_at"]
+GOAL_UPDATE_TYPES = {
+    "goal_type": "text",
+    "target_amount": "float8",
+    "current_amount": "float8",
+    "monthly_investment": "float8",
+    "risk_profile": "text",
+}
+# One statement for a whole bulk update: each unnested row is a goal id, its
+# expected version (NULL skips the check) and new values (NULL keeps the old one).
+BULK_UPDATE_GOALS = (
+    "UPDATE goals AS g SET "
+    + ", ".join(f"{column} = COALESCE(u.{column}, g.{column})" for column in GOAL_UPDATE_TYPES)
+    + ", version = g.version + 1 FROM unnest($2::text[], $3::int[], "
+    + ", ".join(f"${idx}::{sql_type}[]" for idx, sql_type in enumerate(GOAL_UPDATE_TYPES.values(), start=4))
+    + ") AS u(id, expected_version, " + ", ".join(GOAL_UPDATE_TYPES) + ") "
+    "WHERE g.user_id = $1 AND g.id = u.id AND (u.expected_version IS NULL OR g.version = u.expected_version) "
+    "RETURNING g.id, g.version"
+)
+
+# Inputs for the projection worker: stale goals, or every goal in id order for a full recompute.
+PROJECTION_INPUT_COLUMNS = (
+    "id, user_id, version, current_amount, monthly_investment, target_amount, risk_profile, projected_return"
+)
+SELECT_STALE_PROJECTIONS = (
+    f"SELECT {PROJECTION_INPUT_COLUMNS} FROM goals WHERE projected_version IS DISTINCT FROM version LIMIT $1"
+)
+SELECT_PROJECTION_INPUTS = f"SELECT {PROJECTION_INPUT_COLUMNS} FROM goals WHERE id > $1 ORDER BY id LIMIT $2"
+# The returns current projections were computed with, to tell whether a sweep is needed.
+SELECT_PROJECTED_RETURNS = (
+    "SELECT DISTINCT risk_profile, projected_return FROM goals WHERE projected_version = version"
+)
+# Session advisory lock held by the one process running projection passes; see projection_lock.
+PROJECTION_LOCK_ID = 0x70726F6A  # "proj"
+# Only applies where the goal is still at the version the projection was computed from.
+SAVE_PROJECTIONS = (
+    "UPDATE goals AS g SET projected_value = u.value, projected_completion_date = u.completion_date, "
+    "projected_return = u.annual_return, projected_version = u.version "
+    "FROM unnest($1::text[], $2::int[], $3::float8[], $4::date[], $5::float8[]) "
+    "AS u(id, version, value, completion_date, annual_return) "
+    "WHERE g.id = u.id AND g.version = u.version RETURNING g.user_id"
+)
+
+
+def is_sqlite_url(url: str) -> bool:
+    return url.startswith("sqlite:")
+
+
+def sqlite_path(url: str) -> str:
+    """``sqlite:///relative/path.db`` or ``sqlite:////absolute/path.db``, as in SQLAlchemy."""
+    path = url[len("sqlite:"):]
+    if path.startswith("///"):
+        return path[3:]
+    raise ValueError(f"expected sqlite:///<path>, got {url!r}")
+
+
+def goals_page_query(user_id: str, limit: int, after: Optional[tuple] = None, goal_type: Optional[str] = None,
+                     risk_profile: Optional[str] = None, min_target: Optional[float] = None,
+                     max_target: Optional[float] = None, placeholder: str = "$"):
+    """One page of a user's goals, newest first, in ``idx_goals_user_created`` order.
+
+    ``after`` is the (created_at, id) of the last goal on the previous page.
+    One extra row is fetched so the caller can tell whether another page follows.
+    """
+    args = [user_id]
+    conditions = [f"user_id = {placeholder}1"]
+
+    def bind(value):
+        args.append(value)
+        return f"{placeholder}{len(args)}"
+
+    if after is not None:
+        created_at, goal_id = bind(after[0]), bind(after[1])
+        # The first bound is an index range condition; the second breaks ties on id.
+        conditions.append(f"created_at <= {created_at} AND (created_at < {created_at} OR id > {goal_id})")
+    if goal_type is not None:
+        conditions.append(f"goal_type = {bind(goal_type)}")
+    if risk_profile is not None:
+        conditions.append(f"risk_profile = {bind(risk_profile)}")
+    if min_target is not None:
+        conditions.append(f"target_amount >= {bind(min_target)}")
+    if max_target is not None:
+        conditions.append(f"target_amount <= {bind(max_target)}")
+    query = f"{SELECT_GOALS} WHERE {' AND '.join(conditions)} ORDER BY created_at DESC, id LIMIT {bind(limit + 1)}"
+    return query, args
+
+
+HISTORY_RESOLUTIONS = ("day", "month", "year")
+
+
+def goal_history_query(goal_id: str, resolution: str, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                       limit: int = 500, placeholder: str = "$"):
+    """Rollup rows for one goal, newest period first, straight off the rollup primary key.
+
+    ``start`` is inclusive and ``end`` exclusive; one extra row is fetched so
+    the caller can tell whether earlier periods remain.
+    """
+    args = [goal_id, resolution]
+    conditions = [f"goal_id = {placeholder}1", f"resolution = {placeholder}2"]
+
+    def bind(value):
+        args.append(value)
+        return f"{placeholder}{len(args)}"
+
+    if start is not None:
+        conditions.append(f"period_start >= {bind(start)}")
+    if end is not None:
+        conditions.append(f"period_start < {bind(end)}")
+    query = (
+        f"SELECT period_start, contributed, balance, contributions FROM goal_contribution_rollups "
+        f"WHERE {' AND '.join(conditions)} ORDER BY period_start DESC LIMIT {bind(limit + 1)}"
+    )
+    return query, args
+
+
+def warmup_queries(page_size: int):
+    return [
+        (SELECT_USER_BY_ID, ("",)),
+        (SELECT_USER_FOR_LOGIN, ("",)),
+        (SELECT_GOALS_VERSION, ("",)),
+        goals_page_query("", page_size),
+    ]
+
+
+class PostgresStorage:
+    """Storage on the primary pool, with reads routed through ``reads``.
+
+    Every write marks its user in ``reads`` so their next reads see it.
+    """
+
+    def __init__(self, get_pool, reads: ReadRouter, connect: Optional[Callable[[], Awaitable]] = None):
+        self.get_pool = get_pool
+        self.reads = reads
+        # Opens the connection that holds the projection lock, kept outside the pool.
+        self.connect = connect
+        self._lock_conn = None
+
+    # Users
+
+    async def get_user(self, user_id: str) -> Optional[Mapping]:
+        async with self.reads.acquire(user_id) as conn:
+            return await conn.fetchrow(SELECT_USER_BY_ID, user_id)
+
+    async def get_user_for_login(self, email: str) -> Optional[Mapping]:
+        # From the primary: a user may log in right after registering, before we know their id.
+        async with self.get_pool().acquire() as conn:
+            return await conn.fetchrow(SELECT_USER_FOR_LOGIN, email)
+
+    async def create_user(self, user: Sequence) -> bool:
+        """Insert ``user`` (values in ``USER_INSERT_COLUMNS`` order); False if the email is taken."""
+        async with self.get_pool().acquire() as conn:
+            existing = await conn.fetchrow("SELECT id FROM users WHERE email = $1", user[1])
+            if existing:
+                return False
+            await conn.execute(
+                """
+                INSERT INTO users (id, email, name, picture, password_hash, created_at)
+                VALUES ($1, $2, $3, $4, $5, $6)
+                """,
+                *user
+            )
+        self.reads.mark_write(user[0])
+        return True
+
+    async def set_password_hash(self, user_id: str, password_hash: str):
+        async with self.get_pool().acquire() as conn:
+            await conn.execute("UPDATE users SET password_hash = $1 WHERE id = $2", password_hash, user_id)
+
+    # Goals
+
+    async def goals_version(self, user_id: str) -> int:
+        async with self.reads.acquire(user_id) as conn:
+            return await conn.fetchval(SELECT_GOALS_VERSION, user_id)
+
+    async def goals_page(self, user_id: str, limit: int, after: Optional[tuple] = None, goal_type: Optional[str] = None,
+                         risk_profile: Optional[str] = None, min_target: Optional[float] = None,
+                         max_target: Optional[float] = None) -> List[Mapping]:
+        """Up to ``limit + 1`` goals; see :func:`goals_page_query`."""
+        query, args = goals_page_query(user_id, limit, after, goal_type, risk_profile, min_target, max_target)
+        async with self.reads.acquire(user_id) as conn:
+            return await conn.fetch(query, *args)
+
+    async def goals_for_summary(self, user_id: str) -> List[Mapping]:
+        async with self.reads.acquire(user_id) as conn:
+            return await conn.fetch(SELECT_GOALS_FOR_SUMMARY, user_id)
+
+    async def create_goal(self, goal: Sequence):
+        """Insert one goal, values in ``GOAL_INSERT_COLUMNS`` order."""
+        async with self.get_pool().acquire() as conn:
+            await conn.execute(
+                """
+                INSERT INTO goals (id, user_id, goal_type, target_amount, current_amount, monthly_investment, risk_profile, created_at)
+                VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+                """,
+                *goal
+            )
+        self.reads.mark_write(goal[1])
+
+    async def import_goals(self, user_id: str, batches: List[List[tuple]]):
+        """Write every batch of goal records in one transaction, with one COPY per batch."""
+        async with self.get_pool().acquire() as conn:
+            async with conn.transaction():
+                for batch in batches:
+                    await conn.copy_records_to_table("goals", records=batch, columns=GOAL_INSERT_COLUMNS)
+        self.reads.mark_write(user_id)
+
+    async def update_goal(self, user_id: str, goal_id: str, changes: Dict[str, object],
+                          expected_version: Optional[int] = None) -> Tuple[Optional[Mapping], bool]:
+        """Apply ``changes`` and bump the version; returns (updated row, whether the goal exists).
+
+        With ``expected_version`` the update only applies at that version.
+        """
+        values = list(changes.values()) + [user_id, goal_id]
+        set_clauses = [f"{column} = ${idx}" for idx, column in enumerate(changes, start=1)]
+        query = f"UPDATE goals SET {', '.join(set_clauses)}, version = version + 1 WHERE user_id = ${len(values) - 1} AND id = ${len(values)}"
+        if expected_version is not None:
+            values.append(expected_version)
+            query += f" AND version = ${len(values)}"
+        async with self.get_pool().acquire() as conn:
+            row = await conn.fetchrow(f"{query} RETURNING {GOAL_COLUMNS}", *values)
+            exists = row is not None
+            if not row and expected_version is not None:
+                exists = bool(await conn.fetchval("SELECT 1 FROM goals WHERE id = $1 AND user_id = $2", goal_id, user_id))
+        self.reads.mark_write(user_id)
+        return row, exists
+
+    async def update_goals(self, user_id: str, ids: List[str], versions: List[Optional[int]],
+                           columns: List[list]) -> Tuple[Dict[str, int], Set[str]]:
+        """Bulk update; ``columns`` holds one list of new values (None keeps the old one) per
+        ``GOAL_UPDATE_TYPES`` column. Returns the new version of each updated goal and the ids
+        among the rest that exist but were at another version.
+        """
+        async with self.get_pool().acquire() as conn:
+            async with conn.transaction():
+                rows = await conn.fetch(BULK_UPDATE_GOALS, user_id, ids, versions, *columns)
+                updated = {r["id"]: r["version"] for r in rows}
+                missed = [goal_id for goal_id in ids if goal_id not in updated]
+                existing = set()
+                if missed:
+                    existing = {r["id"] for r in await conn.fetch(
+                        "SELECT id FROM goals WHERE user_id = $1 AND id = ANY($2::text[])", user_id, missed
+                    )}
+        self.reads.mark_write(user_id)
+        return updated, existing
+
+    async def delete_goal(self, user_id: str, goal_id: str) -> bool:
+        async with self.get_pool().acquire() as conn:
+            result = await conn.execute("DELETE FROM goals WHERE id = $1 AND user_id = $2", goal_id, user_id)
+        self.reads.mark_write(user_id)
+        return not result.endswith("DELETE 0")
+
+    async def delete_goals(self, user_id: str, ids: List[str]) -> Set[str]:
+        async with self.get_pool().acquire() as conn:
+            async with conn.transaction():
+                rows = await conn.fetch(
+                    "DELETE FROM goals WHERE user_id = $1 AND id = ANY($2::text[]) RETURNING id", user_id, ids
+                )
+        self.reads.mark_write(user_id)
+        return {r["id"] for r in rows}
+
+    async def add_contribution(self, user_id: str, goal_id: str, amount: float) -> Optional[Mapping]:
+        """Add ``amount`` to the goal's current amount; the goals triggers record it as a contribution."""
+        async with self.get_pool().acquire() as conn:
+            row = await conn.fetchrow(
+                f"UPDATE goals SET current_amount = current_amount + $1, version = version + 1 "
+                f"WHERE user_id = $2 AND id = $3 RETURNING {GOAL_COLUMNS}",
+                amount, user_id, goal_id,
+            )
+        self.reads.mark_write(user_id)
+        return row
+
+    async def goal_history(self, user_id: str, goal_id: str, resolution: str, start: Optional[datetime] = None,
+                           end: Optional[datetime] = None, limit: int = 500) -> Optional[List[Mapping]]:
+        """Up to ``limit + 1`` rollup rows, see :func:`goal_history_query`; None if the user has no such goal."""
+        query, args = goal_history_query(goal_id, resolution, start, end, limit)
+        async with self.reads.acquire(user_id) as conn:
+            if not await conn.fetchval("SELECT 1 FROM goals WHERE id = $1 AND user_id = $2", goal_id, user_id):
+                return None
+            return await conn.fetch(query, *args)
+
+    # Materialized projections, read and written on the primary
+
+    async def stale_projections(self, limit: int) -> List[Mapping]:
+        async with self.get_pool().acquire() as conn:
+            return await conn.fetch(SELECT_STALE_PROJECTIONS, limit)
+
+    async def projection_inputs(self, after_id: str, limit: int) -> List[Mapping]:
+        async with self.get_pool().acquire() as conn:
+            return await conn.fetch(SELECT_PROJECTION_INPUTS, after_id, limit)
+
+    @asynccontextmanager
+    async def projection_lock(self) -> AsyncIterator[bool]:
+        """Yield True while holding the projection lock, or False if another process holds it.
+
+        Only the holder recomputes projections, so each stale goal is computed
+        once however many processes share the database. The lock lives on a
+        dedicated connection, opened on first use and kept between passes, so
+        a pass only borrows pool connections for its individual queries.
+        """
+        if self._lock_conn is None or self._lock_conn.is_closed():
+            self._lock_conn = await self.connect()
+        conn = self._lock_conn
+        if not await conn.fetchval("SELECT pg_try_advisory_lock($1)", PROJECTION_LOCK_ID):
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock($1)", PROJECTION_LOCK_ID)
+
+    async def projected_returns(self) -> List[Mapping]:
+        """Distinct (risk_profile, projected_return) pairs of up-to-date projections."""
+        async with self.get_pool().acquire() as conn:
+            return await conn.fetch(SELECT_PROJECTED_RETURNS)
+
+    async def save_projections(self, ids: List[str], versions: List[int], values: List[Optional[float]],
+                               completion_dates: List[Optional[date]], annual_returns: List[float]) -> List[str]:
+        """Store projections for goals still at ``versions``; returns the owners of the goals updated."""
+        async with self.get_pool().acquire() as conn:
+            rows = await conn.fetch(SAVE_PROJECTIONS, ids, versions, values, completion_dates, annual_returns)
+        user_ids = [r["user_id"] for r in rows]
+        for user_id in set(user_ids):
+            self.reads.mark_write(user_id)
+        return user_ids
+
+    # Contact messages
+
+    async def add_contact_messages(self, records: List[tuple]):
+        """Insert messages, values in ``CONTACT_COLUMNS`` order, with one COPY."""
+        async with self.get_pool().acquire() as conn:
+            await conn.copy_records_to_table("contact_messages", records=records, columns=CONTACT_COLUMNS)
+
+    def stats(self) -> Optional[dict]:
+        """Primary pool stats plus the replica's and read routing; None before startup."""
+        pool = self.get_pool()
+        if not pool:
+            return None
+        replica = self.reads.get_replica()
+        return {**pool.stats(), "replica": replica.stats() if replica else None, "reads": self.reads.stats()}
+
+    async def close(self):
+        if self._lock_conn is not None:
+            await self._lock_conn.close()
+            self._lock_conn = None
+        pool = self.get_pool()
+        if pool:
+            await pool.close()
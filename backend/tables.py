@@ -0,0 +1,111 @@
+"""Precomputed projection tables shared between worker processes.
+
+For every annual return in use, the annuity factor for each month up to
+retirement is computed once and written to a ``.npy`` file named after its
+inputs. Workers memory-map that file read-only, so they share one copy
+through the page cache, and the first worker to start builds it for the
+rest. The default directory is shared with other local users, so a mapped
+file is only used when it matches the tables built in process (a few
+microseconds of work); anything else is rebuilt. When ``RISK_RETURNS_FILE`` is set, :func:`watch` reloads the return
+assumptions from that JSON file whenever it changes and swaps in new tables.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import tempfile
+from typing import Dict, List
+
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+import projection
+from projection import RETIREMENT_AGE, RISK_RETURNS, annuity_factors
+
+logger = logging.getLogger(__name__)
+
+TABLES_DIR = os.environ.get('PROJECTION_TABLES_DIR', tempfile.gettempdir())
+RISK_RETURNS_FILE = os.environ.get('RISK_RETURNS_FILE', '')
+RELOAD_INTERVAL_SECONDS = float(os.environ.get('RISK_RETURNS_RELOAD_SECONDS', '5'))
+
+_FORMAT_VERSION = 1
+_MONTHS = np.arange(12 * RETIREMENT_AGE + 1, dtype=np.float64)
+
+
+def build(rates: List[float]) -> np.ndarray:
+    """Annuity factors shaped (rates, months) for the given annual returns."""
+    table = np.empty((len(rates), len(_MONTHS)))
+    for row, rate in enumerate(rates):
+        table[row] = annuity_factors(rate / 12, _MONTHS)
+    return table
+
+
+def table_path(rates: List[float], directory: str) -> str:
+    key = json.dumps([_FORMAT_VERSION, RETIREMENT_AGE, [rate.hex() for rate in rates]])
+    return os.path.join(directory, f"wealthhub-projection-{hashlib.sha1(key.encode()).hexdigest()[:16]}.npy")
+
+
+def load(returns: Dict[str, float], directory: str = TABLES_DIR) -> Dict[float, np.ndarray]:
+    """Map the tables for ``returns``, building the file first if no worker has yet."""
+    rates = sorted(set(returns.values()))
+    path = table_path(rates, directory)
+    expected = build(rates)
+    try:
+        table = np.load(path, mmap_mode='r')
+        if table.shape != expected.shape or table.dtype != np.float64 or not np.array_equal(table, expected):
+            raise ValueError(f"table file {path} does not match the expected factors")
+    except (OSError, ValueError):
+        table = expected
+        try:
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                np.save(f, table)
+            os.replace(tmp_path, path)  # atomic, so other workers never map a partial file
+            table = np.load(path, mmap_mode='r')
+        except OSError as e:
+            logger.warning("Keeping projection tables in process memory, could not write %s: %s", path, e)
+    return {rate: np.asarray(table[row]) for row, rate in enumerate(rates)}
+
+
+def install(returns: Dict[str, float], directory: str = TABLES_DIR):
+    """Make ``returns`` the current risk profile assumptions, with their tables."""
+    projection.use_factor_tables(load(returns, directory))
+    # Update in place so every module holding RISK_RETURNS sees the change.
+    RISK_RETURNS.update(returns)
+    for profile in set(RISK_RETURNS) - set(returns):
+        del RISK_RETURNS[profile]
+
+
+def read_returns(path: str) -> Dict[str, float]:
+    with open(path) as f:
+        data = json.load(f)
+    if not isinstance(data, dict) or not data:
+        raise ValueError("expected a non-empty object of risk profile -> annual return")
+    returns = {}
+    for profile, rate in data.items():
+        if isinstance(rate, bool) or not isinstance(rate, (int, float)) or not math.isfinite(rate) or not -1 < rate < 1:
+            raise ValueError(f"invalid annual return for {profile!r}: {rate!r}")
+        returns[profile.lower()] = float(rate)
+    return returns
+
+
+async def watch(path: str, interval: float, directory: str = TABLES_DIR):
+    """Reload return assumptions from ``path`` every time it changes."""
+    last_mtime = None
+    while True:
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime != last_mtime:
+            # Remember the mtime even if loading fails, so a bad file is reported once.
+            last_mtime = mtime
+            try:
+                returns = read_returns(path)
+                await run_in_threadpool(install, returns, directory)
+                logger.info("Loaded return assumptions from %s: %s", path, returns)
+            except (OSError, ValueError) as e:
+                logger.warning("Could not load return assumptions from %s: %s", path, e)
+        await asyncio.sleep(interval)
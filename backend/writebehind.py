@@ -0,0 +1,159 @@
+"""Write-behind queue for rows nobody waits to read back.
+
+Callers enqueue a record and return straight away; a background task
+collects records into batches of up to ``batch_size`` or whatever arrived
+within ``flush_interval`` and hands each batch to ``write`` (for contact
+messages, one COPY or one batched insert, depending on the storage). The queue is
+bounded: once full, ``put`` waits up to ``enqueue_timeout`` for room and
+then raises :class:`QueueFull`. ``drain`` flushes everything queued so far
+and stops the worker.
+
+A batch that fails with one of the ``transient`` errors (a lost connection,
+a timeout) is retried until it is written, waiting ``retry_seconds`` and
+doubling up to ``max_retry_seconds`` between attempts. Meanwhile the queue
+fills and ``put`` starts raising :class:`QueueFull`, so callers are refused
+rather than acknowledged and lost. Any other error means some row in the
+batch can never be written, so the batch is split in halves until the bad
+rows are isolated; those are logged and counted as dropped, and the rest
+are written, so one bad row cannot stall the queue.
+"""
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, List, Optional, Tuple, Type
+
+from metrics import Histogram
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class QueueFull(Exception):
+    """Raised when the queue stays full for longer than the enqueue timeout."""
+
+
+class WriteBehindQueue:
+    def __init__(self, name: str, write: Callable[[List[tuple]], Awaitable[None]], max_queue: int,
+                 batch_size: int, flush_interval: float, enqueue_timeout: float, retry_seconds: float = 1.0,
+                 max_retry_seconds: float = 30.0,
+                 transient: Tuple[Type[BaseException], ...] = (OSError, asyncio.TimeoutError)):
+        self.name = name
+        self.write = write
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.retry_seconds = retry_seconds
+        self.max_retry_seconds = max_retry_seconds
+        self.transient = transient
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop = None
+        self._worker: Optional[asyncio.Task] = None
+        self.enqueued = 0
+        self.flushed = 0
+        self.batches = 0
+        self.rejected = 0
+        self.flush_failures = 0
+        self.dropped = 0
+        self.flush_seconds = Histogram()
+
+    async def put(self, record: tuple):
+        queue = self._ensure_worker()
+        try:
+            await asyncio.wait_for(queue.put(record), self.enqueue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise QueueFull() from None
+        self.enqueued += 1
+
+    async def drain(self, timeout: float):
+        """Flush everything queued so far, waiting at most ``timeout`` seconds."""
+        if self._worker is None or self._worker.done() or self._loop is not asyncio.get_running_loop():
+            return
+        try:
+            await asyncio.wait_for(self._queue.put(_STOP), timeout)
+            await asyncio.wait_for(asyncio.shield(self._worker), timeout)
+        except asyncio.TimeoutError:
+            logger.error("Gave up draining %s with %d rows still queued", self.name, self._queue.qsize())
+            self._worker.cancel()
+        self._worker = None
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "max_queue": self.max_queue,
+            "enqueued": self.enqueued,
+            "flushed": self.flushed,
+            "batches": self.batches,
+            "rejected": self.rejected,
+            "flush_failures": self.flush_failures,
+            "dropped": self.dropped,
+            "flush_seconds": self.flush_seconds.snapshot(),
+        }
+
+    def _ensure_worker(self) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._queue = asyncio.Queue(self.max_queue)
+            self._loop = loop
+            self._worker = None
+        if self._worker is None or self._worker.done():
+            self._worker = loop.create_task(self._run())
+        return self._queue
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            record = await self._queue.get()
+            if record is _STOP:
+                return
+            batch = [record]
+            deadline = loop.time() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    record = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if record is _STOP:
+                    stop = True
+                    break
+                batch.append(record)
+            await self._flush(batch)
+            if stop:
+                return
+
+    async def _flush(self, batch: list):
+        started_at = time.perf_counter()
+        written = await self._write(batch)
+        self.flush_seconds.observe(time.perf_counter() - started_at)
+        self.flushed += written
+        self.batches += 1
+
+    async def _write(self, batch: list) -> int:
+        """Write ``batch`` and return how many of its rows made it."""
+        delay = self.retry_seconds
+        attempt = 0
+        while True:
+            try:
+                await self.write(batch)
+                return len(batch)
+            except self.transient:
+                self.flush_failures += 1
+                attempt += 1
+                logger.warning("Failed to write %d rows to %s (attempt %d), retrying in %.1fs",
+                               len(batch), self.name, attempt, delay, exc_info=True)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_retry_seconds)
+            except Exception:
+                self.flush_failures += 1
+                if len(batch) == 1:
+                    self.dropped += 1
+                    logger.exception("Dropped a row %s rejected: %r", self.name, batch[0])
+                    return 0
+                middle = len(batch) // 2
+                return await self._write(batch[:middle]) + await self._write(batch[middle:])
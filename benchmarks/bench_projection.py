@@ -0,0 +1,51 @@
+"""Microbenchmark: closed-form projection engine vs. the month-by-month loop.
+
+Run from the repository root with ``python -m benchmarks.bench_projection``.
+"""
+import random
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from projection import RISK_RETURNS, _project_iterative, project, project_batch  # noqa: E402
+
+CASES = [
+    ("goal never reached, age 25", (25, 5000.0, 1e12, 0.10)),
+    ("goal never reached, age 18", (18, 2500.0, 1e12, 0.13)),
+    ("goal reached after 17 years", (30, 5000.0, 2500000.0, 0.10)),
+    ("goal reached after 5 years", (40, 10000.0, 750000.0, 0.07)),
+]
+
+
+def best_of(func, args, number=2000, repeat=5):
+    return min(timeit.repeat(lambda: func(*args), number=number, repeat=repeat)) / number
+
+
+def batch_cases(count, seed=1):
+    rng = random.Random(seed)
+    return [
+        (rng.randint(22, 50), round(rng.uniform(500, 20000), 2), round(rng.uniform(1e5, 5e7), -3),
+         rng.choice(list(RISK_RETURNS.values())))
+        for _ in range(count)
+    ]
+
+
+def main():
+    print(f"{'case':<32}{'loop (us)':>12}{'closed (us)':>14}{'speedup':>10}")
+    for name, args in CASES:
+        assert project(*args) == _project_iterative(*args)
+        loop = best_of(_project_iterative, args)
+        closed = best_of(project, args)
+        print(f"{name:<32}{loop * 1e6:>12.1f}{closed * 1e6:>14.1f}{loop / closed:>9.1f}x")
+
+    cases = batch_cases(1000)
+    columns = list(zip(*cases))
+    singles = min(timeit.repeat(lambda: [project(*case) for case in cases], number=1, repeat=5))
+    batch = min(timeit.repeat(lambda: project_batch(*columns), number=1, repeat=5))
+    print(f"\n1000 scenarios: {singles * 1e3:.1f} ms one by one, {batch * 1e3:.1f} ms as one batch")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Benchmark: default response_model serialization vs. the fast JSON path.
+
+Serves a page of 1,000 goals through the real GET /api/goals handler (with
+an in-memory stand-in for the database) with FAST_JSON_RESPONSES off and on.
+
+Run from the repository root with ``python -m benchmarks.bench_serialization``.
+"""
+import logging
+import sys
+import timeit
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import fastjson  # noqa: E402
+import server  # noqa: E402
+
+GOALS = 1000
+USER = server.UserPublic(id="user-1", email="a@b.c", name="A", picture="", created_at=datetime.now(timezone.utc))
+
+
+class Pool:
+    def __init__(self, rows):
+        self.rows = rows
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self
+
+    async def fetchval(self, query, *args):
+        return 1
+
+    async def fetch(self, query, *args):
+        return self.rows
+
+
+def rows(count):
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return [
+        {
+            "id": f"goal-{index:06d}",
+            "user_id": USER.id,
+            "goal_type": "Retirement",
+            "target_amount": 1000000.0 + index,
+            "current_amount": 12345.67,
+            "monthly_investment": 500.25,
+            "risk_profile": "moderate",
+            "created_at": start - timedelta(minutes=index),
+            "version": 1,
+        }
+        for index in range(count)
+    ]
+
+
+def main():
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    server.app.dependency_overrides[server.get_current_user] = lambda: USER
+    server.app.state.pg_pool = Pool(rows(GOALS))
+    server.goals_version_cache.clear()
+    client = TestClient(server.app)
+    url = f"/api/goals?limit={GOALS}"
+
+    timings = {}
+    bodies = {}
+    for enabled in (False, True):
+        fastjson.ENABLED = enabled
+        bodies[enabled] = client.get(url).json()
+        timings[enabled] = min(timeit.repeat(lambda: client.get(url), number=20, repeat=5)) / 20
+    assert bodies[False] == bodies[True]
+
+    print(f"GET /api/goals with {GOALS} goals")
+    print(f"  response_model path: {timings[False] * 1e3:8.2f} ms")
+    print(f"  fast JSON path:      {timings[True] * 1e3:8.2f} ms  ({timings[False] / timings[True]:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Profile worker cold start: wall time to import the app, and which imports cost most.
+
+Imports ``server`` in fresh interpreters (best of ``REPEAT``), then once more
+under ``-X importtime`` and lists the slowest top-level imports.
+
+Run from the repository root with ``python -m benchmarks.bench_startup``.
+"""
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parent.parent / "backend"
+REPEAT = 5
+TOP = 15
+
+
+def run_seconds(code, *flags):
+    started_at = time.perf_counter()
+    result = subprocess.run([sys.executable, *flags, "-c", code], cwd=BACKEND, capture_output=True, text=True, check=True)
+    return time.perf_counter() - started_at, result.stderr
+
+
+def parse_importtime(stderr):
+    """(self us, cumulative us, depth, module) for each line of ``-X importtime`` output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        own, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((int(own), int(cumulative), depth, name.strip()))
+    return rows
+
+
+def main():
+    baseline = min(run_seconds("pass")[0] for _ in range(REPEAT))
+    wall = min(run_seconds("import server")[0] for _ in range(REPEAT))
+    print(f"interpreter start:    {baseline * 1e3:7.0f} ms")
+    print(f"import server:        {wall * 1e3:7.0f} ms (best of {REPEAT})")
+
+    _, stderr = run_seconds("import server", "-X", "importtime")
+    rows = parse_importtime(stderr)
+    # Depth 1 is imported by server (or by site); deeper entries are their dependencies.
+    top_level = sorted((row for row in rows if row[2] <= 1), key=lambda row: row[1], reverse=True)[:TOP]
+    print(f"\n{'module':<36}{'cumulative (ms)':>16}{'self (ms)':>12}")
+    for own, cumulative, _, name in top_level:
+        print(f"{name:<36}{cumulative / 1e3:>16.1f}{own / 1e3:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+"""Load test: concurrent workloads against the app, reported as JSON.
+
+Runs ``server.app`` in-process through httpx's ASGI transport, so nothing
+needs to be deployed. With ``DATABASE_URL`` set (or ``--database-url``) the
+app starts against that database as it would in production. Against
+Postgres, use a scratch database migrated with ``python -m migrations``,
+since the benchmark users and goals are left behind. Without one, the app
+runs on a throwaway embedded SQLite file (see ``sqlite_storage``), so the
+numbers cover the app itself plus a local, zero-latency database.
+
+Workloads:
+
+* ``login``: a storm of concurrent logins, bound by password hashing.
+* ``calculate``: a mix of cached and uncached POST/GET /api/calculate and
+  100-item batches.
+* ``goals-<n>``: goal listing, summaries, updates, creates and deletes for
+  users holding ``n`` goals each, for every ``--goals-per-user`` level.
+
+Each workload reports throughput and p50/p95/p99 latency. ``--baseline``
+compares against an earlier report and exits non-zero when any workload's
+p95 or throughput regressed by more than ``--max-regression``.
+
+Run from the repository root with ``python -m benchmarks.load``.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tempfile
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import httpx  # noqa: E402
+import numpy as np  # noqa: E402
+
+import server  # noqa: E402
+
+PASSWORD = "benchmark-password"
+RISK_PROFILES = ["conservative", "moderate", "aggressive"]
+
+
+class BenchUser:
+    def __init__(self, email, token):
+        self.email = email
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.seeded = []  # never deleted, so updates always find them
+        self.created = []  # made by the workload, deleted by it too
+
+
+async def register_users(client, count):
+    run_id = uuid.uuid4().hex[:8]
+
+    async def register(index):
+        email = f"bench-{run_id}-{index}@example.com"
+        response = await client.post("/api/auth/register", json={"email": email, "name": f"Bench {index}", "password": PASSWORD})
+        response.raise_for_status()
+        response = await client.post("/api/auth/login", json={"email": email, "password": PASSWORD})
+        response.raise_for_status()
+        return BenchUser(email, response.json()["access_token"])
+
+    return await asyncio.gather(*(register(index) for index in range(count)))
+
+
+def goal_payload(rng):
+    return {
+        "goal_type": rng.choice(["Retirement", "House", "Education", "Travel"]),
+        "target_amount": round(rng.uniform(1e5, 5e6), 2),
+        "current_amount": round(rng.uniform(0, 1e5), 2),
+        "monthly_investment": round(rng.uniform(100, 10000), 2),
+        "risk_profile": rng.choice(RISK_PROFILES),
+    }
+
+
+async def seed_goals(client, user, count, rng):
+    body = "".join(json.dumps(goal_payload(rng)) + "\n" for _ in range(count))
+    response = await client.post("/api/goals/bulk", content=body,
+                                 headers={**user.headers, "Content-Type": "application/x-ndjson"})
+    response.raise_for_status()
+    user.seeded.extend(result["id"] for result in response.json()["results"] if result["status"] == 201)
+
+
+def calculation(rng, cached):
+    if cached:
+        # A small set of popular inputs, as repeat visitors and shared links produce.
+        rng = random.Random(rng.randrange(20))
+    return {
+        "age": rng.randint(22, 55),
+        "monthly_investment": float(rng.randrange(500, 20000, 500)),
+        "goal_amount": float(rng.randrange(100000, 10000000, 50000)),
+        "risk_profile": rng.choice(RISK_PROFILES),
+    }
+
+
+def login_operation(users):
+    async def operation(client, rng):
+        return await client.post("/api/auth/login", json={"email": rng.choice(users).email, "password": PASSWORD})
+    return operation
+
+
+async def calculate_operation(client, rng):
+    roll = rng.random()
+    if roll < 0.5:
+        return await client.post("/api/calculate", json=calculation(rng, cached=rng.random() < 0.8))
+    if roll < 0.9:
+        return await client.get("/api/calculate", params=calculation(rng, cached=rng.random() < 0.8))
+    return await client.post("/api/calculate/batch", json=[calculation(rng, cached=False) for _ in range(100)])
+
+
+def goals_operation(users):
+    async def operation(client, rng):
+        user = rng.choice(users)
+        roll = rng.random()
+        if roll < 0.5:
+            return await client.get("/api/goals", params={"limit": 100}, headers=user.headers)
+        if roll < 0.6:
+            return await client.get("/api/goals/summary", params={"age": 35}, headers=user.headers)
+        if roll < 0.8:
+            return await client.put(f"/api/goals/{rng.choice(user.seeded)}", headers=user.headers,
+                                    json={"current_amount": round(rng.uniform(0, 1e5), 2)})
+        if roll < 0.9 or not user.created:
+            response = await client.post("/api/goals", json=goal_payload(rng), headers=user.headers)
+            if response.status_code == 200:
+                user.created.append(response.json()["id"])
+            return response
+        return await client.delete(f"/api/goals/{user.created.pop()}", headers=user.headers)
+    return operation
+
+
+def percentile_ms(latencies, q):
+    return round(float(np.percentile(latencies, q)) * 1e3, 3) if latencies else None
+
+
+async def drive(client, operation, requests, concurrency, seed):
+    """Issue ``requests`` calls to ``operation`` from ``concurrency`` concurrent workers."""
+    latencies = []
+    errors = Counter()
+    remaining = iter(range(requests))
+
+    async def worker(worker_id):
+        rng = random.Random(seed * 100003 + worker_id)
+        for _ in remaining:
+            started_at = time.perf_counter()
+            try:
+                response = await operation(client, rng)
+            except Exception as e:
+                errors[type(e).__name__] += 1
+                continue
+            latencies.append(time.perf_counter() - started_at)
+            if response.status_code >= 400:
+                errors[str(response.status_code)] += 1
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(worker(worker_id) for worker_id in range(concurrency)))
+    elapsed = time.perf_counter() - started_at
+    return {
+        "requests": requests,
+        "errors": dict(errors),
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 1),
+        "latency_ms": {
+            "p50": percentile_ms(latencies, 50),
+            "p95": percentile_ms(latencies, 95),
+            "p99": percentile_ms(latencies, 99),
+            "max": percentile_ms(latencies, 100),
+        },
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=Path(__file__).resolve().parent).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(workloads, requests, concurrency, users, goals_per_user, database_url=None, seed=1):
+    with tempfile.TemporaryDirectory() as scratch:
+        server.DATABASE_URL = database_url or f"sqlite:///{scratch}/bench.db"
+        await server.app.router.startup()
+        try:
+            return await run_workloads(workloads, requests, concurrency, users, goals_per_user, database_url, seed)
+        finally:
+            await server.app.router.shutdown()
+
+
+async def run_workloads(workloads, requests, concurrency, users, goals_per_user, database_url, seed):
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "backend": "postgres" if database_url else "sqlite",
+            "requests": requests,
+            "concurrency": concurrency,
+            "users": users,
+            "fast_json": server.fastjson.ENABLED,
+            "stateless_tokens": server.AUTH_STATELESS_TOKENS,
+        },
+        "workloads": {},
+    }
+    rng = random.Random(seed)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://bench") as client:
+        bench_users = await register_users(client, users)
+        if "login" in workloads:
+            report["workloads"]["login"] = await drive(client, login_operation(bench_users), requests, concurrency, seed)
+        if "calculate" in workloads:
+            report["workloads"]["calculate"] = await drive(client, calculate_operation, requests, concurrency, seed)
+        if "goals" in workloads:
+            for level in sorted(goals_per_user):
+                for user in bench_users:
+                    await seed_goals(client, user, level - len(user.seeded), rng)
+                report["workloads"][f"goals-{level}"] = await drive(
+                    client, goals_operation(bench_users), requests, concurrency, seed
+                )
+    return report
+
+
+def regressions(report, baseline, max_regression):
+    found = []
+    for name, result in report["workloads"].items():
+        before = baseline.get("workloads", {}).get(name)
+        if not before:
+            continue
+        if result["latency_ms"]["p95"] > before["latency_ms"]["p95"] * (1 + max_regression):
+            found.append(f"{name}: p95 {before['latency_ms']['p95']} ms -> {result['latency_ms']['p95']} ms")
+        if result["throughput_rps"] < before["throughput_rps"] * (1 - max_regression):
+            found.append(f"{name}: throughput {before['throughput_rps']} -> {result['throughput_rps']} req/s")
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--workloads", default="login,calculate,goals", help="comma-separated subset to run")
+    parser.add_argument("--requests", type=int, default=500, help="requests per workload")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--goals-per-user", default="10,100,1000", help="comma-separated levels for the goals workload")
+    parser.add_argument("--database-url", default=os.environ.get("DATABASE_URL"), help="database to run against (default: a temporary SQLite file)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed fractional regression vs. baseline")
+    args = parser.parse_args(argv)
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    report = asyncio.run(run(
+        set(args.workloads.split(",")), args.requests, args.concurrency, args.users,
+        [int(level) for level in args.goals_per_user.split(",")], args.database_url, args.seed,
+    ))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    else:
+        print(text)
+    if args.baseline:
+        found = regressions(report, json.loads(Path(args.baseline).read_text()), args.max_regression)
+        for line in found:
+            print(f"regression: {line}", file=sys.stderr)
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -692,8 +692,14 @@ const Dashboard = () => {
 
   const loadGoals = async () => {
     try {
-      const response = await axios.get(`${API}/goals`);
-      setGoals(response.data);
+      const loaded = [];
+      let after = null;
+      do {
+        const response = await axios.get(`${API}/goals`, { params: after ? { after } : {} });
+        loaded.push(...response.data);
+        after = response.headers["x-next-cursor"];
+      } while (after);
+      setGoals(loaded);
     } catch (error) {
       console.error("Load goals error:", error);
     }
@@ -0,0 +1,18 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+
+@pytest.fixture
+def sqlite_db(tmp_path):
+    from sqlite_storage import SqliteStorage
+
+    db = SqliteStorage(str(tmp_path / "wealthhub.db"), readers=2).open()
+    yield db
+    asyncio.run(db.close())
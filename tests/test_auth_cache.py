@@ -0,0 +1,85 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+
+import jwt
+import pytest
+
+import server
+from cache import ResultCache
+
+CREATED = datetime(2024, 5, 1, tzinfo=timezone.utc)
+USER_ROW = {
+    "id": "user-1",
+    "email": "ada@example.com",
+    "name": "Ada",
+    "picture": "",
+    "created_at": CREATED,
+    "password_hash": server.password_hasher.context.hash("secret"),
+}
+
+
+class CountingPool:
+    def __init__(self):
+        self.queries = []
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self
+
+    async def fetchrow(self, query, *args):
+        self.queries.append(query)
+        return USER_ROW
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = CountingPool()
+    monkeypatch.setattr(server.app.state, "pg_pool", pool, raising=False)
+    monkeypatch.setattr(server, "token_cache", ResultCache(100, 100, 60))
+    monkeypatch.setattr(server, "user_cache", ResultCache(100, 100, 60))
+    return pool
+
+
+def bearer(**claims):
+    claims.setdefault("sub", "user-1")
+    claims.setdefault("exp", datetime.now(timezone.utc) + timedelta(hours=1))
+    return "Bearer " + jwt.encode(claims, server.JWT_SECRET, algorithm=server.JWT_ALG)
+
+
+def current_user(header):
+    return asyncio.run(server.get_current_user(header))
+
+
+def test_users_are_looked_up_once_per_ttl(pool):
+    header = bearer()
+    first = current_user(header)
+    assert current_user(header) == first
+    assert current_user(bearer(iat=1)) == first
+    assert len(pool.queries) == 1
+    server.invalidate_user("user-1")
+    assert current_user(header) == first
+    assert len(pool.queries) == 2
+
+
+def test_invalid_tokens_are_rejected(pool):
+    assert current_user("Bearer not-a-token") is None
+    assert current_user(bearer(exp=datetime.now(timezone.utc) - timedelta(seconds=1))) is None
+    assert pool.queries == []
+
+
+def test_token_cache_never_outlives_expiry(pool, monkeypatch):
+    ttls = []
+    put = server.token_cache.put
+    monkeypatch.setattr(server.token_cache, "put", lambda *args, ttl: ttls.append(ttl) or put(*args, ttl=ttl))
+    current_user(bearer(exp=datetime.now(timezone.utc) + timedelta(seconds=2)))
+    assert len(ttls) == 1 and 0 < ttls[0] <= 2
+
+
+def test_stateless_tokens_skip_the_database(pool, monkeypatch):
+    monkeypatch.setattr(server, "AUTH_STATELESS_TOKENS", True)
+    token = asyncio.run(server.login(server.LoginRequest(email="ada@example.com", password="secret"))).access_token
+    pool.queries.clear()
+    user = current_user("Bearer " + token)
+    assert user == server.UserPublic(id="user-1", email="ada@example.com", name="Ada", picture="", created_at=CREATED)
+    assert pool.queries == []
@@ -0,0 +1,183 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+import bulk
+import server
+
+USER = server.UserPublic(id="user-1", email="a@b.c", name="A", picture="", created_at=datetime.now(timezone.utc))
+
+
+async def chunked(data: bytes, size: int):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def parse(data: bytes, fmt: str, size: int = 3):
+    async def main():
+        return [record async for record in bulk.iter_records(chunked(data, size), fmt)]
+    return asyncio.run(main())
+
+
+def test_ndjson_records_survive_arbitrary_chunking():
+    data = '{"a": 1}\n\n{"b": "é"}\r\nnot json\n{"c": 3}'.encode()
+    records = parse(data, "ndjson", size=1)
+    assert records[:2] == [(0, {"a": 1}), (1, {"b": "é"})]
+    assert isinstance(records[2][1], str)
+    assert records[3] == (3, {"c": 3})
+
+
+def test_csv_records_use_header_and_flag_bad_rows():
+    data = b"\xef\xbb\xbfgoal_type,target_amount\nEducation,5000\n\"Home, big\",\nshort\n"
+    assert parse(data, "csv") == [
+        (0, {"goal_type": "Education", "target_amount": "5000"}),
+        (1, {"goal_type": "Home, big"}),
+        (2, "Expected 2 fields, got 1"),
+    ]
+
+
+def test_csv_quoted_fields_may_span_lines():
+    data = b'goal_type,target_amount\n"Home\nand garden",5000\n\n"say ""hi""",1\n"unterminated,2\n'
+    assert parse(data, "csv", size=4) == [
+        (0, {"goal_type": "Home\nand garden", "target_amount": "5000"}),
+        (1, {"goal_type": 'say "hi"', "target_amount": "1"}),
+        (2, "Expected 2 fields, got 1"),
+    ]
+
+
+def test_csv_quotes_inside_unquoted_fields_are_literal():
+    data = b'goal_type,target_amount\nTV 55" screen,1\nSofa,2\n"A ""B""\nC",3\nDesk,4\n'
+    assert parse(data, "csv") == [
+        (0, {"goal_type": 'TV 55" screen', "target_amount": "1"}),
+        (1, {"goal_type": "Sofa", "target_amount": "2"}),
+        (2, {"goal_type": 'A "B"\nC', "target_amount": "3"}),
+        (3, {"goal_type": "Desk", "target_amount": "4"}),
+    ]
+
+
+@pytest.mark.parametrize("data, fmt", [
+    (b'{"a": 1}\n{"b": "' + b"x" * 100 + b'"}\n', "ndjson"),
+    (b"x" * 100, "ndjson"),
+    (b'goal_type\n"' + b"x\n" * 60, "csv"),
+])
+def test_over_long_lines_are_rejected(data, fmt):
+    async def main():
+        return [record async for record in bulk.iter_records(chunked(data, 7), fmt, max_line_length=64)]
+
+    with pytest.raises(bulk.LineTooLong):
+        asyncio.run(main())
+
+
+def test_body_format():
+    assert bulk.body_format("application/x-ndjson; charset=utf-8") == "ndjson"
+    assert bulk.body_format("text/csv") == "csv"
+    with pytest.raises(bulk.UnsupportedFormat):
+        bulk.body_format("application/json")
+
+
+class BulkPool:
+    def __init__(self, existing=()):
+        self.existing = {goal_id: 1 for goal_id in existing}
+        self.copied = []
+        self.queries = []
+        self.acquired = 0
+
+    @asynccontextmanager
+    async def acquire(self):
+        self.acquired += 1
+        yield self
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+
+    async def copy_records_to_table(self, table, records, columns):
+        self.copied.append((table, list(records), columns))
+
+    async def fetch(self, query, *args):
+        self.queries.append(query)
+        if query.startswith("UPDATE"):
+            _, ids, versions, *_ = args
+            return [
+                {"id": goal_id, "version": self.existing[goal_id] + 1}
+                for goal_id, version in zip(ids, versions)
+                if goal_id in self.existing and version in (None, self.existing[goal_id])
+            ]
+        return [{"id": goal_id} for goal_id in args[1] if goal_id in self.existing]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setitem(server.app.dependency_overrides, server.get_current_user, lambda: USER)
+    return TestClient(server.app)
+
+
+def test_bulk_create_copies_valid_rows_in_chunks(client, monkeypatch):
+    pool = BulkPool()
+    monkeypatch.setattr(server.app.state, "pg_pool", pool, raising=False)
+    monkeypatch.setattr(server, "GOALS_BULK_COPY_ROWS", 2)
+    body = "goal_type,target_amount,current_amount,monthly_investment,risk_profile\n" + "".join(
+        f"Education,{1000 * i},0,100,moderate\n" for i in range(3)
+    ) + "Education,lots,0,100,moderate\n"
+    response = client.post("/api/goals/bulk", content=body, headers={"Content-Type": "text/csv"})
+    results = response.json()["results"]
+    assert [r["status"] for r in results] == [201, 201, 201, 422]
+    assert [len(records) for _, records, _ in pool.copied] == [2, 1]
+    table, records, columns = pool.copied[0]
+    assert table == "goals" and columns == server.GOAL_INSERT_COLUMNS
+    assert records[1][columns.index("target_amount")] == 1000.0
+    assert records[0][columns.index("id")] == results[0]["id"]
+
+
+def test_bulk_create_reads_the_whole_body_before_taking_a_connection(client, monkeypatch):
+    pool = BulkPool()
+    monkeypatch.setattr(server.app.state, "pg_pool", pool, raising=False)
+    connections_during_upload = []
+
+    def body():
+        for i in range(3):
+            connections_during_upload.append(pool.acquired)
+            yield f'{{"goal_type": "A", "target_amount": {i + 1}, "current_amount": 0, "monthly_investment": 1, ' \
+                  f'"risk_profile": "moderate"}}\n'.encode()
+
+    response = client.post("/api/goals/bulk", content=body(), headers={"Content-Type": "application/x-ndjson"})
+    assert [r["status"] for r in response.json()["results"]] == [201] * 3
+    assert connections_during_upload == [0, 0, 0] and pool.acquired == 1
+
+
+def test_bulk_create_rejects_other_content_types_and_oversized_bodies(client, monkeypatch):
+    monkeypatch.setattr(server.app.state, "pg_pool", BulkPool(), raising=False)
+    assert client.post("/api/goals/bulk", json=[]).status_code == 415
+    monkeypatch.setattr(server, "GOALS_BULK_MAX_ITEMS", 1)
+    body = '{"goal_type": "A"}\n{"goal_type": "B"}\n'
+    response = client.post("/api/goals/bulk", content=body, headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 413
+    monkeypatch.setattr(server, "GOALS_BULK_MAX_LINE_LENGTH", 10)
+    response = client.post("/api/goals/bulk", content='{"goal_type": "A"}\n', headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 413 and "10 characters" in response.json()["detail"]
+
+
+def test_bulk_update_reports_each_item(client, monkeypatch):
+    pool = BulkPool(existing=["g1", "g2"])
+    monkeypatch.setattr(server.app.state, "pg_pool", pool, raising=False)
+    items = [
+        {"id": "g1", "target_amount": 10},
+        {"id": "g2", "current_amount": 5, "version": 9},
+        {"id": "g3", "risk_profile": "aggressive"},
+        {"id": "g1", "target_amount": 20},
+        {"id": "g4"},
+        {"id": "g5", "user_id": "someone-else"},
+    ]
+    results = client.patch("/api/goals/bulk", json=items).json()["results"]
+    assert [r["status"] for r in results] == [200, 412, 404, 422, 400, 422]
+    assert results[0]["version"] == 2
+    assert sum(query.startswith("UPDATE") for query in pool.queries) == 1
+
+
+def test_bulk_delete_reports_missing_goals(client, monkeypatch):
+    monkeypatch.setattr(server.app.state, "pg_pool", BulkPool(existing=["g1"]), raising=False)
+    response = client.request("DELETE", "/api/goals/bulk", json=["g1", "g2"])
+    assert [r["status"] for r in response.json()["results"]] == [200, 404]
@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import cache
+import server
+from cache import MISSING, ResultCache
+
+
+def test_evicts_least_recently_used_by_entries():
+    results = ResultCache(max_entries=2, max_bytes=1000, ttl_seconds=60)
+    results.put("a", 1, 10)
+    results.put("b", 2, 10)
+    assert results.get("a") == 1
+    results.put("c", 3, 10)
+    assert results.get("b") is MISSING
+    assert results.get("a") == 1 and results.get("c") == 3
+    assert results.evictions == 1
+
+
+def test_evicts_to_stay_within_byte_budget():
+    results = ResultCache(max_entries=10, max_bytes=100, ttl_seconds=60)
+    results.put("a", 1, 60)
+    results.put("b", 2, 60)
+    assert results.get("a") is MISSING
+    assert results.bytes == 60
+    results.put("huge", 3, 500)
+    assert results.get("huge") is MISSING
+
+
+def test_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    results = ResultCache(max_entries=10, max_bytes=100, ttl_seconds=5)
+    results.put("a", 1, 1)
+    now[0] += 4
+    assert results.get("a") == 1
+    now[0] += 2
+    assert results.get("a") is MISSING
+    assert results.expirations == 1 and results.bytes == 0
+
+
+def test_concurrent_misses_share_one_computation():
+    results = ResultCache(max_entries=10, max_bytes=1000, ttl_seconds=60)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "value"
+
+    async def main():
+        return await asyncio.gather(*(results.get_or_compute("k", compute, lambda v: 1) for _ in range(5)))
+
+    assert asyncio.run(main()) == ["value"] * 5
+    assert len(calls) == 1
+    assert results.coalesced == 4
+    assert results.get("k") == "value"
+
+
+def test_failed_computation_reaches_every_waiter_and_is_not_cached():
+    results = ResultCache(max_entries=10, max_bytes=1000, ttl_seconds=60)
+
+    async def compute():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def main():
+        return await asyncio.gather(
+            *(results.get_or_compute("k", compute, lambda v: 1) for _ in range(3)), return_exceptions=True
+        )
+
+    assert all(isinstance(outcome, ValueError) for outcome in asyncio.run(main()))
+    assert results.get("k") is MISSING
+
+
+@pytest.fixture
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(server, "result_cache", ResultCache(100, 1 << 20, 60))
+    return server.result_cache
+
+
+def test_calculate_and_batch_share_entries(fresh_cache, monkeypatch):
+    monkeypatch.setattr(server, "PROFILE_ADMIN_TOKEN", "secret")
+    client = TestClient(server.app)
+    body = {"age": 30, "monthly_investment": 5000, "goal_amount": 1000000, "risk_profile": "Moderate"}
+    first = client.post("/api/calculate", json=body).json()
+    assert client.post("/api/calculate", json=dict(body, risk_profile="moderate")).json() == first
+    batch = client.post("/api/calculate/batch", json=[body]).json()
+    assert batch["results"] == [first]
+    assert client.get("/api/cache/stats").status_code == 403
+    stats = client.get("/api/cache/stats", headers={"X-Admin-Token": "secret"}).json()["results"]
+    assert stats["misses"] == 1 and stats["hits"] == 2 and stats["entries"] == 1
@@ -0,0 +1,204 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from db import InstrumentedPool, PoolExhausted, ReadRouter
+
+
+class FakeConnection:
+    def __init__(self, pid):
+        self.pid = pid
+        self.closed = False
+        self.queries = []
+
+    def get_server_pid(self):
+        return self.pid
+
+    def is_closed(self):
+        return self.closed
+
+    async def close(self):
+        self.closed = True
+
+    async def fetch(self, query, *args):
+        self.queries.append(query)
+        return []
+
+
+class FakePool:
+    """Stands in for asyncpg.Pool: a fixed set of connections handed out in order."""
+
+    def __init__(self, size):
+        self.connections = [FakeConnection(pid) for pid in range(size)]
+        self.idle = asyncio.Queue()
+        for conn in self.connections:
+            self.idle.put_nowait(conn)
+        self.released = []
+
+    async def acquire(self, timeout=None):
+        return await asyncio.wait_for(self.idle.get(), timeout)
+
+    async def release(self, conn):
+        self.released.append(conn)
+        self.idle.put_nowait(conn)
+
+    def get_size(self):
+        return len(self.connections)
+
+    def get_idle_size(self):
+        return self.idle.qsize()
+
+    def get_min_size(self):
+        return len(self.connections)
+
+    def get_max_size(self):
+        return len(self.connections)
+
+
+def instrumented(size, acquire_timeout=1, max_waiters=10, max_lifetime=0):
+    pool = InstrumentedPool(acquire_timeout, max_waiters, max_lifetime)
+    pool.pool = FakePool(size)
+    return pool
+
+
+def test_acquire_is_timed_and_gauged():
+    pool = instrumented(2)
+
+    async def main():
+        async with pool.acquire():
+            return pool.stats()
+
+    during = asyncio.run(main())
+    assert (during["size"], during["in_use"], during["idle"]) == (2, 1, 1)
+    after = pool.stats()
+    assert after["in_use"] == 0
+    assert after["acquire_seconds"]["count"] == 1
+
+
+def test_exhausted_pool_raises_after_timeout():
+    pool = instrumented(1, acquire_timeout=0.05)
+
+    async def main():
+        async with pool.acquire():
+            with pytest.raises(PoolExhausted):
+                async with pool.acquire():
+                    pass
+
+    asyncio.run(main())
+    assert pool.exhausted == 1 and pool.waiting == 0
+
+
+def test_waiters_beyond_limit_fail_immediately():
+    pool = instrumented(1, acquire_timeout=5, max_waiters=0)
+
+    async def main():
+        with pytest.raises(PoolExhausted):
+            async with pool.acquire():
+                pass
+
+    asyncio.run(main())
+    assert pool.acquire_seconds.snapshot()["count"] == 0
+
+
+def test_connections_past_max_lifetime_are_closed_on_release():
+    pool = instrumented(1, max_lifetime=60)
+    conn = pool.pool.connections[0]
+
+    async def main():
+        await pool.init_connection(conn)
+        async with pool.acquire():
+            pass
+        pool._connected_at[conn.pid] -= 120
+        async with pool.acquire():
+            pass
+
+    asyncio.run(main())
+    assert pool.pool.released == [conn]
+    assert conn.closed and pool.recycled == 1
+
+
+def test_warmup_runs_queries_on_every_min_connection():
+    pool = instrumented(3)
+    asyncio.run(pool.warmup([("SELECT 1", ()), ("SELECT $1", ("x",))]))
+    assert all(conn.queries == ["SELECT 1", "SELECT $1"] for conn in pool.pool.connections)
+    assert pool.pool.get_idle_size() == 3
+
+
+def test_exhausted_pool_maps_to_503(monkeypatch):
+    class Pool:
+        @asynccontextmanager
+        async def acquire(self):
+            raise PoolExhausted()
+            yield
+
+    monkeypatch.setattr(server.app.state, "pg_pool", Pool(), raising=False)
+    response = TestClient(server.app).post("/api/auth/login", json={"email": "a@b.c", "password": "pw"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(server.DB_RETRY_AFTER_SECONDS)
+
+
+class NamedPool:
+    def __init__(self, name, fail=False):
+        self.name = name
+        self.fail = fail
+
+    @asynccontextmanager
+    async def acquire(self):
+        if self.fail:
+            raise PoolExhausted()
+        yield self.name
+
+
+def router(replica, read_your_writes=60, retry_after=60):
+    return ReadRouter(lambda: NamedPool("primary"), lambda: replica, read_your_writes, retry_after, 100)
+
+
+def read(router, key=None):
+    async def main():
+        async with router.acquire(key) as conn:
+            return conn
+
+    return asyncio.run(main())
+
+
+def test_reads_use_the_replica_unless_the_user_just_wrote():
+    reads = router(NamedPool("replica"), read_your_writes=0.05)
+    assert read(reads) == read(reads, "user-1") == "replica"
+    reads.mark_write("user-1")
+    assert (read(reads, "user-1"), read(reads, "user-2")) == ("primary", "replica")
+    time.sleep(0.06)
+    assert read(reads, "user-1") == "replica"
+    assert reads.stats()["pinned_reads"] == 1
+
+
+def test_reads_without_a_replica_use_the_primary():
+    assert read(router(None)) == "primary"
+
+
+def test_failing_replica_falls_back_to_the_primary_until_retry():
+    replica = NamedPool("replica", fail=True)
+    reads = router(replica, retry_after=0.05)
+    assert read(reads) == "primary"
+    replica.fail = False
+    assert read(reads) == "primary"
+    time.sleep(0.06)
+    assert read(reads) == "replica"
+    assert reads.stats()["replica_failures"] == 1
+
+
+def test_connection_errors_during_a_replica_read_mark_it_down():
+    reads = router(NamedPool("replica"))
+
+    async def main():
+        async with reads.acquire() as conn:
+            assert conn == "replica"
+            raise ConnectionResetError()
+
+    with pytest.raises(ConnectionResetError):
+        asyncio.run(main())
+    assert not reads.replica_healthy()
+    assert read(reads) == "primary"
@@ -0,0 +1,228 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+
+USER = server.UserPublic(id="user-1", email="a@b.c", name="A", picture="", created_at=datetime.now(timezone.utc))
+
+
+def goal_row(index):
+    return {
+        "id": f"goal-{index:03d}",
+        "user_id": USER.id,
+        "goal_type": "Education",
+        "target_amount": 1000.0 * index,
+        "current_amount": 0.0,
+        "monthly_investment": 100.0,
+        "risk_profile": "moderate",
+        "created_at": datetime(2024, 1, 1, tzinfo=timezone.utc) - timedelta(days=index),
+        "version": 1,
+        "projected_value": None,
+        "projected_completion_date": None,
+    }
+
+
+class GoalsPool:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = []
+        self.goals_version = 1
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self
+
+    async def fetch(self, query, *args):
+        self.queries.append((query, args))
+        return self.rows[:args[-1]]
+
+    async def fetchrow(self, query, *args):
+        self.queries.append((query, args))
+        if "version = version + 1" in query:
+            row = self.rows[0] if self.rows else None
+            if row and "AND version =" in query and args[-1] != row["version"]:
+                return None
+            return row and {**row, "version": row["version"] + 1}
+        return None
+
+    async def fetchval(self, query, *args):
+        self.queries.append((query, args))
+        if query == server.storage.SELECT_GOALS_VERSION:
+            return self.goals_version
+        return 1 if self.rows else None
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setitem(server.app.dependency_overrides, server.get_current_user, lambda: USER)
+    monkeypatch.setattr(server, "goals_version_cache", server.ResultCache(100, 100, 60))
+    return TestClient(server.app)
+
+
+def test_page_sets_next_cursor(client, monkeypatch):
+    pool = GoalsPool([goal_row(i) for i in range(5)])
+    monkeypatch.setattr(server.app.state, "pg_pool", pool, raising=False)
+    response = client.get("/api/goals", params={"limit": 3})
+    assert [goal["id"] for goal in response.json()] == ["goal-000", "goal-001", "goal-002"]
+    cursor = response.headers["X-Next-Cursor"]
+    assert server.decode_goal_cursor(cursor) == (goal_row(2)["created_at"], "goal-002")
+    assert pool.queries[-1][1] == ("user-1", 4)
+
+
+def test_last_page_has_no_cursor(client, monkeypatch):
+    pool = GoalsPool([goal_row(i) for i in range(2)])
+    monkeypatch.setattr(server.app.state, "pg_pool", pool, raising=False)
+    response = client.get("/api/goals", params={"limit": 3})
+    assert len(response.json()) == 2
+    assert "X-Next-Cursor" not in response.headers
+
+
+def test_cursor_and_filters_are_bound(client, monkeypatch):
+    pool = GoalsPool([])
+    monkeypatch.setattr(server.app.state, "pg_pool", pool, raising=False)
+    row = goal_row(7)
+    params = {
+        "after": server.encode_goal_cursor(row["created_at"], row["id"]),
+        "goal_type": "Education",
+        "risk_profile": "moderate",
+        "min_target": 10,
+        "max_target": 20,
+    }
+    assert client.get("/api/goals", params=params).status_code == 200
+    query, args = pool.queries[-1]
+    assert args == ("user-1", row["created_at"], row["id"], "Education", "moderate", 10.0, 20.0, server.GOALS_DEFAULT_PAGE_SIZE + 1)
+    assert query.endswith("ORDER BY created_at DESC, id LIMIT $8")
+
+
+def test_invalid_cursor_and_limit_are_rejected(client, monkeypatch):
+    monkeypatch.setattr(server.app.state, "pg_pool", GoalsPool([]), raising=False)
+    assert client.get("/api/goals", params={"after": "not-a-cursor"}).status_code == 400
+    assert client.get("/api/goals", params={"limit": server.GOALS_MAX_PAGE_SIZE + 1}).status_code == 422
+
+
+def test_update_is_a_single_returning_statement(client, monkeypatch):
+    pool = GoalsPool([goal_row(1)])
+    monkeypatch.setattr(server.app.state, "pg_pool", pool, raising=False)
+    response = client.put("/api/goals/goal-001", json={"target_amount": 5000, "risk_profile": "aggressive"})
+    assert response.status_code == 200
+    assert response.headers["ETag"] == '"2"'
+    assert response.json()["version"] == 2
+    [(query, args)] = pool.queries
+    assert query.startswith("UPDATE goals SET target_amount = $1, risk_profile = $2, version = version + 1")
+    assert "RETURNING" in query
+    assert args == (5000.0, "aggressive", "user-1", "goal-001")
+
+
+def test_update_rejects_unknown_columns_and_empty_bodies(client, monkeypatch):
+    monkeypatch.setattr(server.app.state, "pg_pool", GoalsPool([goal_row(1)]), raising=False)
+    assert client.put("/api/goals/goal-001", json={"user_id": "someone-else"}).status_code == 422
+    assert client.put("/api/goals/goal-001", json={}).status_code == 400
+
+
+def test_if_match_mismatch_is_412_and_missing_goal_is_404(client, monkeypatch):
+    monkeypatch.setattr(server.app.state, "pg_pool", GoalsPool([goal_row(1)]), raising=False)
+    headers = {"If-Match": '"7"'}
+    assert client.put("/api/goals/goal-001", json={"current_amount": 1}, headers=headers).status_code == 412
+    headers = {"If-Match": '"1"'}
+    assert client.put("/api/goals/goal-001", json={"current_amount": 1}, headers=headers).status_code == 200
+    monkeypatch.setattr(server.app.state, "pg_pool", GoalsPool([]), raising=False)
+    assert client.put("/api/goals/missing", json={"current_amount": 1}, headers=headers).status_code == 404
+
+
+def test_summary_projects_goals_from_current_amount(client, monkeypatch):
+    rows = [
+        {**goal_row(1), "current_amount": 500.0, "target_amount": 2000.0},
+        {**goal_row(2), "current_amount": 3000.0, "target_amount": 2000.0, "risk_profile": "aggressive"},
+        {**goal_row(3), "monthly_investment": 0.0, "target_amount": 1e9},
+    ]
+    pool = GoalsPool(rows)
+    pool.fetch = lambda query, *args: asyncio.sleep(0, rows)
+    monkeypatch.setattr(server.app.state, "pg_pool", pool, raising=False)
+    summary = client.get("/api/goals/summary", params={"age": 60}).json()
+
+    def step(row, months):
+        value = row["current_amount"]
+        growth = 1 + server.annual_return_for(row["risk_profile"]) / 12
+        for _ in range(months):
+            value = (value + row["monthly_investment"]) * growth
+        return value
+
+    goals = summary["goals"]
+    assert [goal["years_to_target"] for goal in goals] == [2, 0, None]
+    assert goals[0]["projected_value"] == round(step(rows[0], 60), 2)
+    assert len(summary["timeline"]) == 5
+    assert summary["timeline"][0]["value"] == round(sum(step(row, 12) for row in rows), 2)
+    assert summary["timeline"][-1]["invested"] == summary["total_invested"] == 3500.0 + 200 * 60
+    assert summary["total_projected"] == round(sum(goal["projected_value"] for goal in goals), 2)
+
+
+def test_summary_without_goals_or_years(client, monkeypatch):
+    pool = GoalsPool([])
+    pool.fetch = lambda query, *args: asyncio.sleep(0, [])
+    monkeypatch.setattr(server.app.state, "pg_pool", pool, raising=False)
+    summary = client.get("/api/goals/summary", params={"age": 65}).json()
+    assert summary["goals"] == [] and summary["timeline"] == [] and summary["total_projected"] == 0
+
+
+def test_unchanged_goals_are_not_modified_without_a_query(client, monkeypatch):
+    pool = GoalsPool([goal_row(i) for i in range(3)])
+    monkeypatch.setattr(server.app.state, "pg_pool", pool, raising=False)
+    first = client.get("/api/goals", params={"limit": 2})
+    etag = first.headers["ETag"]
+    assert first.headers["Cache-Control"] == "private, no-cache"
+    queries = len(pool.queries)
+
+    second = client.get("/api/goals", params={"limit": 2}, headers={"If-None-Match": etag})
+    assert second.status_code == 304 and second.headers["ETag"] == etag
+    assert len(pool.queries) == queries
+
+    other_page = client.get("/api/goals", params={"limit": 3}, headers={"If-None-Match": etag})
+    assert other_page.status_code == 200
+
+
+def test_goal_writes_invalidate_the_goals_etag(client, monkeypatch):
+    pool = GoalsPool([goal_row(1)])
+    monkeypatch.setattr(server.app.state, "pg_pool", pool, raising=False)
+    etag = client.get("/api/goals").headers["ETag"]
+    assert client.put("/api/goals/goal-001", json={"target_amount": 5}).status_code == 200
+    pool.goals_version = 2  # bumped by the database trigger
+    response = client.get("/api/goals", headers={"If-None-Match": etag})
+    assert response.status_code == 200 and response.headers["ETag"] != etag
+
+
+@pytest.mark.parametrize("path, method, body", [
+    ("/api/goals?limit=3", "GET", None),
+    ("/api/goals/goal-000", "PUT", {"target_amount": 123.45}),
+])
+def test_fast_json_path_matches_the_default_encoding(client, monkeypatch, path, method, body):
+    rows = [goal_row(i) for i in range(5)]
+    rows[1]["created_at"] = rows[1]["created_at"].replace(microsecond=123456)
+    monkeypatch.setattr(server.app.state, "pg_pool", GoalsPool(rows), raising=False)
+    default = client.request(method, path, json=body)
+    monkeypatch.setattr(server.fastjson, "ENABLED", True)
+    fast = client.request(method, path, json=body)
+    assert fast.status_code == default.status_code == 200
+    assert fast.json() == default.json()
+    assert fast.headers["ETag"] == default.headers["ETag"]
+    assert fast.headers.get("X-Next-Cursor") == default.headers.get("X-Next-Cursor")
+
+
+def test_reads_move_to_the_primary_after_a_write(client, monkeypatch):
+    primary = GoalsPool([goal_row(0)])
+    replica = GoalsPool([goal_row(0)])
+    monkeypatch.setattr(server.app.state, "pg_pool", primary, raising=False)
+    monkeypatch.setattr(server.app.state, "pg_read_pool", replica, raising=False)
+    reads = server.db.ReadRouter(lambda: server.app.state.pg_pool, lambda: server.app.state.pg_read_pool, 60, 60, 100)
+    monkeypatch.setattr(server.app.state, "storage", server.storage.PostgresStorage(lambda: primary, reads))
+    client.get("/api/goals")
+    assert replica.queries and not primary.queries
+
+    client.put("/api/goals/goal-000", json={"current_amount": 5.0})
+    primary.queries.clear()
+    replica.queries.clear()
+    client.get("/api/goals")
+    assert len(primary.queries) == 2 and not replica.queries
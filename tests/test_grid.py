@@ -0,0 +1,65 @@
+import base64
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+
+GRID = {
+    "age": 30,
+    "goal_amount": 1000000,
+    "monthly_investment": {"start": 500, "stop": 5000, "num": 10},
+    "risk_profiles": ["conservative", "moderate", "aggressive"],
+    "horizon_years": {"start": 5, "stop": 35, "step": 5},
+}
+
+
+@pytest.fixture
+def client():
+    return TestClient(server.app)
+
+
+def decode(array):
+    return np.frombuffer(base64.b64decode(array["data"]), dtype=array["dtype"]).reshape(array["shape"])
+
+
+def test_grid_matches_calculate(client):
+    body = client.post("/api/calculate/grid", json=GRID).json()
+    assert body["horizon_years"] == [5, 10, 15, 20, 25, 30, 35]
+    for i, amount in enumerate(body["monthly_investment"]):
+        for j, profile in enumerate(body["risk_profiles"]):
+            plan = client.post("/api/calculate", json={
+                "age": 30, "monthly_investment": amount, "goal_amount": 1e15, "risk_profile": profile,
+            }).json()
+            for k, years in enumerate(body["horizon_years"]):
+                assert body["projected_value"][i][j][k] == pytest.approx(plan["projection"][years - 1]["value"], abs=0.01)
+            to_goal = client.post("/api/calculate", json={
+                "age": 30, "monthly_investment": amount, "goal_amount": 1000000, "risk_profile": profile,
+            }).json()
+            reached = to_goal["projected_value"] >= 1000000
+            assert body["years_to_goal"][i][j] == (to_goal["years_to_goal"] if reached else None)
+
+
+def test_base64_encoding_matches_json(client):
+    plain = client.post("/api/calculate/grid", json=GRID).json()
+    packed = client.post("/api/calculate/grid", json=dict(GRID, encoding="base64")).json()
+    values = decode(packed["projected_value"])
+    assert values.shape == (10, 3, 7)
+    np.testing.assert_allclose(values, np.array(plain["projected_value"]), rtol=1e-6)
+    years = decode(packed["years_to_goal"])
+    expected = np.array([[np.nan if y is None else y for y in row] for row in plain["years_to_goal"]])
+    np.testing.assert_array_equal(years, expected.astype("<f4"))
+
+
+def test_grid_size_is_capped(client, monkeypatch):
+    monkeypatch.setattr(server, "MAX_GRID_CELLS", 100)
+    assert client.post("/api/calculate/grid", json=GRID).status_code == 413
+
+
+@pytest.mark.parametrize("axis, value", [
+    ("monthly_investment", {"start": 500, "stop": 5000, "num": 10 ** 11}),
+    ("horizon_years", {"start": 1, "stop": 10 ** 12, "step": 1}),
+])
+def test_oversized_axes_are_rejected_before_they_are_built(client, axis, value):
+    assert client.post("/api/calculate/grid", json={**GRID, axis: value}).status_code == 413
@@ -0,0 +1,103 @@
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+from passlib.context import CryptContext
+
+import server
+from cache import MISSING, ResultCache
+from hashing import HashingUnavailable, PasswordHasher
+
+
+def context(rounds):
+    return CryptContext(
+        schemes=["pbkdf2_sha256"],
+        pbkdf2_sha256__default_rounds=rounds,
+        pbkdf2_sha256__min_rounds=rounds,
+        pbkdf2_sha256__max_rounds=rounds,
+    )
+
+
+def test_hash_and_verify_off_the_event_loop():
+    hasher = PasswordHasher(context(1000), max_concurrency=2, max_queue=4, queue_timeout=1)
+
+    async def main():
+        password_hash = await hasher.hash("secret")
+        return password_hash, await hasher.verify_and_update("secret", password_hash)
+
+    password_hash, (valid, new_hash) = asyncio.run(main())
+    assert valid and new_hash is None
+    assert hasher.stats()["hash_seconds"]["count"] == 2
+
+
+def test_saturated_queue_is_rejected():
+    release = threading.Event()
+
+    class SlowContext:
+        def hash(self, password):
+            release.wait(5)
+            return "hash"
+
+    hasher = PasswordHasher(SlowContext(), max_concurrency=1, max_queue=1, queue_timeout=0.05)
+
+    async def main():
+        slow = asyncio.ensure_future(hasher.hash("a"))
+        await asyncio.sleep(0.01)
+        queued = asyncio.ensure_future(hasher.hash("b"))
+        await asyncio.sleep(0)
+        with pytest.raises(HashingUnavailable):
+            await hasher.hash("c")
+        with pytest.raises(HashingUnavailable):
+            await queued
+        release.set()
+        return await slow
+
+    assert asyncio.run(main()) == "hash"
+    assert hasher.rejected == 2
+    hasher.shutdown()
+
+
+def test_register_returns_503_with_retry_after(monkeypatch):
+    monkeypatch.setattr(server, "password_hasher", PasswordHasher(context(1000), 1, max_queue=0, queue_timeout=1))
+    response = TestClient(server.app).post("/api/auth/register", json={"email": "a@b.c", "name": "A", "password": "pw"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(server.HASH_RETRY_AFTER_SECONDS)
+
+
+def test_login_rehashes_when_rounds_change(monkeypatch):
+    stored = context(1000).hash("secret")
+    updates = []
+
+    class Pool:
+        @asynccontextmanager
+        async def acquire(self):
+            yield self
+
+        async def fetchrow(self, query, *args):
+            return {"id": "user-1", "email": "a@b.c", "name": "A", "picture": "",
+                    "created_at": datetime.now(timezone.utc), "password_hash": stored}
+
+        async def execute(self, query, *args):
+            updates.append(args)
+
+    monkeypatch.setattr(server.app.state, "pg_pool", Pool(), raising=False)
+    monkeypatch.setattr(server, "password_hasher", PasswordHasher(context(2000), 1, 4, 1))
+    monkeypatch.setattr(server, "user_cache", ResultCache(10, 10, 60))
+    server.user_cache.put("user-1", "cached user", 1)
+    asyncio.run(server.login(server.LoginRequest(email="a@b.c", password="secret")))
+    assert len(updates) == 1
+    new_hash, user_id = updates[0]
+    assert user_id == "user-1" and "$2000$" in new_hash and context(2000).verify("secret", new_hash)
+    assert server.user_cache.get("user-1") is MISSING
+
+
+def test_stats_require_the_admin_token(monkeypatch):
+    client = TestClient(server.app)
+    assert client.get("/api/hashing/stats").status_code == 404
+    monkeypatch.setattr(server, "PROFILE_ADMIN_TOKEN", "secret")
+    assert client.get("/api/hashing/stats", headers={"X-Admin-Token": "nope"}).status_code == 403
+    stats = client.get("/api/hashing/stats", headers={"X-Admin-Token": "secret"}).json()
+    assert stats["max_concurrency"] == server.password_hasher.stats()["max_concurrency"]
@@ -0,0 +1,100 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+
+import server
+import storage
+import sqlite_storage
+
+NOW = datetime.now(timezone.utc)
+
+
+@pytest.fixture(autouse=True)
+def sqlite_app(sqlite_db, monkeypatch):
+    monkeypatch.setattr(server.app.state, "storage", sqlite_db)
+
+
+def user(user_id):
+    return server.UserPublic(id=user_id, email=f"{user_id}@b.c", name="A", picture="", created_at=NOW)
+
+
+async def setup_goal(db, current_amount=100.0):
+    for user_id in ("user-1", "user-2"):
+        await db.create_user((user_id, f"{user_id}@b.c", "A", "", "hash", NOW))
+    await db.create_goal(("goal-1", "user-1", "House", 1e6, current_amount, 500.0, "moderate", NOW))
+
+
+def call(current_user, requests):
+    server.app.dependency_overrides[server.get_current_user] = lambda: current_user
+
+    async def main():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return [await client.request(method, url, **kwargs) for method, url, kwargs in requests]
+
+    try:
+        return asyncio.run(main())
+    finally:
+        server.app.dependency_overrides.clear()
+
+
+def test_contributions_and_updates_roll_up_into_history(sqlite_db):
+    asyncio.run(setup_goal(sqlite_db))
+    responses = call(user("user-1"), [
+        ("POST", "/api/goals/goal-1/contributions", {"json": {"amount": 50.0}}),
+        ("POST", "/api/goals/goal-1/contributions", {"json": {"amount": -30.0}}),
+        ("PUT", "/api/goals/goal-1", {"json": {"current_amount": 200.0}}),
+        ("PUT", "/api/goals/goal-1", {"json": {"monthly_investment": 600.0}}),
+        ("GET", "/api/goals/goal-1/history", {"params": {"resolution": "day"}}),
+        ("GET", "/api/goals/goal-1/history", {"params": {"resolution": "year"}}),
+    ])
+    assert responses[0].json()["current_amount"] == 150.0 and responses[0].headers["ETag"] == '"2"'
+    assert responses[1].json()["current_amount"] == 120.0
+    for response in responses[4:]:
+        # The opening balance, two contributions and one update; the monthly_investment change is not one.
+        [point] = response.json()["points"]
+        assert point["contributed"] == 200.0 and point["balance"] == 200.0 and point["contributions"] == 4
+        assert response.json()["next_end"] is None
+    assert responses[5].json()["points"][0]["period_start"].startswith(f"{NOW.year}-01-01T00:00:00")
+
+
+def test_history_is_paged_newest_first_and_returned_oldest_first(sqlite_db):
+    asyncio.run(setup_goal(sqlite_db, current_amount=0.0))
+    start = datetime(2023, 1, 1, 12, tzinfo=timezone.utc)
+    daily = [("goal-1", 10.0, 10.0 * (day + 1), start + timedelta(days=day)) for day in range(365)]
+    asyncio.run(sqlite_db._write(
+        sqlite_storage._insert_many, "goal_contributions", ["goal_id", "amount", "balance", "created_at"], daily
+    ))
+    first, second, ranged = call(user("user-1"), [
+        ("GET", "/api/goals/goal-1/history", {"params": {"limit": 8}}),
+        ("GET", "/api/goals/goal-1/history", {"params": {"limit": 8, "end": "2023-05-01T00:00:00Z"}}),
+        ("GET", "/api/goals/goal-1/history", {"params": {"resolution": "day", "start": "2023-03-01T00:00:00Z",
+                                                          "end": "2023-03-08T00:00:00Z"}}),
+    ])
+    months = [point["period_start"][:7] for point in first.json()["points"]]
+    assert months == [f"2023-{month:02d}" for month in range(5, 13)]
+    assert first.json()["points"][-1] == {"period_start": "2023-12-01T00:00:00Z", "contributed": 310.0,
+                                          "balance": 3650.0, "contributions": 31}
+    assert first.json()["next_end"].startswith("2023-05-01")
+    assert [point["period_start"][:7] for point in second.json()["points"]] == ["2023-01", "2023-02", "2023-03", "2023-04"]
+    assert second.json()["next_end"] is None
+    assert [point["period_start"][:10] for point in ranged.json()["points"]] == [f"2023-03-0{day}" for day in range(1, 8)]
+
+
+def test_goals_of_other_users_and_empty_contributions_are_rejected(sqlite_db):
+    asyncio.run(setup_goal(sqlite_db))
+    history, contribution, zero = call(user("user-2"), [
+        ("GET", "/api/goals/goal-1/history", {}),
+        ("POST", "/api/goals/goal-1/contributions", {"json": {"amount": 5.0}}),
+        ("POST", "/api/goals/goal-1/contributions", {"json": {"amount": 0}}),
+    ])
+    assert history.status_code == contribution.status_code == 404
+    assert zero.status_code == 422
+
+
+def test_history_query_reads_one_goal_resolution_range():
+    query, args = storage.goal_history_query("goal-1", "day", start=NOW, limit=10)
+    assert query.endswith("WHERE goal_id = $1 AND resolution = $2 AND period_start >= $3 ORDER BY period_start DESC LIMIT $4")
+    assert args == ["goal-1", "day", NOW, 11]
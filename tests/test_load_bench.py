@@ -0,0 +1,25 @@
+import asyncio
+
+import server
+from benchmarks import load
+
+
+def test_every_workload_runs_cleanly_against_sqlite(monkeypatch):
+    monkeypatch.setattr(server, "DATABASE_URL", None)
+    monkeypatch.setattr(server.app.state, "storage", server.app.state.storage)
+    # The benchmark shuts the app down, which stops the hasher's executor.
+    monkeypatch.setattr(server, "password_hasher", server.PasswordHasher(server.build_pwd_context, 2, 100, 5))
+    report = asyncio.run(load.run({"login", "calculate", "goals"}, requests=20, concurrency=4, users=2, goals_per_user=[3, 6]))
+    assert report["meta"]["backend"] == "sqlite"
+    assert set(report["workloads"]) == {"login", "calculate", "goals-3", "goals-6"}
+    for result in report["workloads"].values():
+        assert result["errors"] == {}
+        assert result["latency_ms"]["p50"] <= result["latency_ms"]["p99"]
+
+
+def test_regressions_flag_slower_p95_and_lower_throughput():
+    def report(p95, rps):
+        return {"workloads": {"calculate": {"latency_ms": {"p95": p95}, "throughput_rps": rps}}}
+
+    assert load.regressions(report(11, 95), report(10, 100), 0.2) == []
+    assert len(load.regressions(report(13, 70), report(10, 100), 0.2)) == 2
@@ -0,0 +1,227 @@
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+import projection
+import server
+import storage
+from db import ReadRouter
+from materialize import ProjectionWorker, add_months
+
+NOW = datetime.now(timezone.utc)
+
+
+def make_worker(db, saved=None, chunk_size=2):
+    return ProjectionWorker(lambda: db, (saved if saved is not None else []).append, chunk_size, 0.01, 600)
+
+
+async def add_goals(db, goals):
+    await db.create_user(("user-1", "a@b.c", "A", "", "hash", NOW))
+    for goal_id, current_amount, monthly_investment, target_amount, risk_profile in goals:
+        await db.create_goal((goal_id, "user-1", "House", target_amount, current_amount, monthly_investment, risk_profile, NOW))
+
+
+async def listed(db):
+    return {row["id"]: row for row in await db.goals_page("user-1", 100)}
+
+
+def test_goal_completions_match_stepping_each_goal():
+    current = [0.0, 5000.0, 100.0, 0.0]
+    monthly = [1000.0, 0.0, 50.0, 0.0]
+    target = [20000.0, 1000.0, 1e9, 1.0]
+    returns = [0.10, 0.07, 0.13, 0.10]
+    reached_month, value = projection.goal_completions(current, monthly, target, returns, 120)
+    for i in range(len(current)):
+        balance, month = current[i], 0
+        while balance < target[i] and month < 120:
+            balance = (balance + monthly[i]) * (1 + returns[i] / 12)
+            month += 1
+        assert reached_month[i] == (month if balance >= target[i] else -1)
+        assert value[i] == balance
+    assert reached_month.tolist()[1:] == [0, -1, -1]
+
+
+def test_add_months_clamps_to_the_end_of_the_month():
+    assert add_months(date(2024, 1, 31), 1) == date(2024, 2, 29)
+    assert add_months(date(2024, 11, 15), 14) == date(2026, 1, 15)
+    assert add_months(date(2024, 5, 5), 0) == date(2024, 5, 5)
+
+
+def test_stale_goals_are_materialized_and_edits_make_them_stale_again(sqlite_db):
+    saved = []
+    worker = make_worker(sqlite_db, saved)
+
+    async def main():
+        await add_goals(sqlite_db, [("g1", 0.0, 1000.0, 20000.0, "moderate"), ("g2", 0.0, 0.0, 1e6, "moderate"),
+                                    ("g3", 5000.0, 10.0, 1000.0, "aggressive")])
+        before = await listed(sqlite_db)
+        await worker.run_once()
+        after = await listed(sqlite_db)
+        await sqlite_db.update_goal("user-1", "g1", {"current_amount": 19000.0})
+        edited = await listed(sqlite_db)
+        await worker.run_once()
+        return before, after, edited, await listed(sqlite_db)
+
+    before, after, edited, recomputed = asyncio.run(main())
+    assert all(row["projected_value"] is None for row in before.values())
+    reached_month, value = projection.goal_completions([0.0], [1000.0], [20000.0], [0.10], 600)
+    assert after["g1"]["projected_value"] == round(value[0], 2)
+    assert after["g1"]["projected_completion_date"] == add_months(NOW.date(), int(reached_month[0]))
+    # Never reached: no date, and the balance at the end of the horizon.
+    assert after["g2"]["projected_completion_date"] is None and after["g2"]["projected_value"] == 0.0
+    assert after["g3"]["projected_completion_date"] == NOW.date() and after["g3"]["projected_value"] == 5000.0
+    assert edited["g1"]["projected_value"] is None and edited["g3"]["projected_value"] == 5000.0
+    assert recomputed["g1"]["projected_completion_date"] == add_months(NOW.date(), 1)
+    # Nothing was projected with other returns, so there was nothing to sweep.
+    assert worker.recomputed == 4 and worker.sweeps == 0 and saved == ["user-1"] * 3
+
+
+def test_changed_returns_recompute_only_the_affected_profiles(sqlite_db, monkeypatch):
+    worker = make_worker(sqlite_db)
+
+    async def main():
+        await add_goals(sqlite_db, [("g1", 0.0, 1000.0, 1e5, "moderate"), ("g2", 0.0, 1000.0, 1e5, "aggressive")])
+        await worker.run_once()
+        first = await listed(sqlite_db)
+        monkeypatch.setitem(projection.RISK_RETURNS, "aggressive", 0.2)
+        await worker.run_once()
+        return first, await listed(sqlite_db)
+
+    first, second = asyncio.run(main())
+    assert worker.sweeps == 1 and worker.recomputed == 3
+    assert second["g1"] == first["g1"]
+    assert second["g2"]["projected_completion_date"] < first["g2"]["projected_completion_date"]
+
+
+def test_a_restarted_worker_only_sweeps_when_returns_changed(sqlite_db, monkeypatch):
+    async def main():
+        await add_goals(sqlite_db, [("g1", 0.0, 1000.0, 1e5, "moderate"), ("g2", 0.0, 1000.0, 1e5, "aggressive")])
+        await make_worker(sqlite_db).run_once()
+        restarted = make_worker(sqlite_db)
+        await restarted.run_once()
+        monkeypatch.setitem(projection.RISK_RETURNS, "moderate", 0.05)
+        changed = make_worker(sqlite_db)
+        await changed.run_once()
+        return restarted, changed
+
+    restarted, changed = asyncio.run(main())
+    assert restarted.sweeps == 0 and restarted.recomputed == 0
+    assert changed.sweeps == 1 and changed.recomputed == 1
+
+
+class LockConn:
+    def __init__(self, held):
+        self.held = held
+        self.executed = []
+        self.closed = False
+
+    def is_closed(self):
+        return self.closed
+
+    async def fetchval(self, query, *args):
+        assert query == "SELECT pg_try_advisory_lock($1)" and args == (storage.PROJECTION_LOCK_ID,)
+        return not self.held
+
+    async def execute(self, query, *args):
+        self.executed.append(query)
+
+    async def close(self):
+        self.closed = True
+
+
+class QueryPool:
+    def __init__(self):
+        self.executed = []
+        self.in_use = 0
+
+    @asynccontextmanager
+    async def acquire(self):
+        self.in_use += 1
+        try:
+            yield self
+        finally:
+            self.in_use -= 1
+
+    async def fetch(self, query, *args):
+        self.executed.append((query, self.in_use))
+        return []
+
+    async def close(self):
+        pass
+
+
+@pytest.mark.parametrize("held", [False, True])
+def test_only_the_process_holding_the_lock_recomputes(held):
+    lock_conn = LockConn(held)
+    pool = QueryPool()
+    connects = []
+
+    async def connect():
+        connects.append(1)
+        return lock_conn
+
+    db = storage.PostgresStorage(lambda: pool, ReadRouter(lambda: pool, lambda: None, 60, 60, 100), connect)
+    worker = make_worker(db)
+
+    async def main():
+        await worker.run_once()
+        await worker.run_once()
+        await db.close()
+
+    asyncio.run(main())
+    # One lock connection for both passes, outside the pool, closed with the storage.
+    assert len(connects) == 1 and lock_conn.closed
+    if held:
+        assert pool.executed == [] and worker.skipped == 2
+    else:
+        # The lock connection never takes a pool slot: each query runs with only its own.
+        assert pool.executed == [(storage.SELECT_PROJECTED_RETURNS, 1)] + [(storage.SELECT_STALE_PROJECTIONS, 1)] * 2
+        assert lock_conn.executed == ["SELECT pg_advisory_unlock($1)"] * 2
+        assert worker.skipped == 0
+
+
+def test_projections_computed_from_an_old_version_are_discarded(sqlite_db):
+    async def main():
+        await add_goals(sqlite_db, [("g1", 0.0, 1000.0, 1e5, "moderate")])
+        [row] = await sqlite_db.stale_projections(10)
+        await sqlite_db.update_goal("user-1", "g1", {"monthly_investment": 2000.0})
+        saved = await sqlite_db.save_projections(["g1"], [row["version"]], [1.0], [NOW.date()], [0.1])
+        return saved, await sqlite_db.stale_projections(10)
+
+    saved, stale = asyncio.run(main())
+    assert saved == [] and [row["id"] for row in stale] == ["g1"]
+
+
+def test_the_running_worker_is_woken_by_goal_writes(sqlite_db):
+    worker = make_worker(sqlite_db)
+    worker.poll_interval = 60
+
+    async def main():
+        worker.start()
+        try:
+            await asyncio.sleep(0.05)
+            await add_goals(sqlite_db, [("g1", 0.0, 1000.0, 1e5, "moderate")])
+            worker.notify()
+            for _ in range(100):
+                if worker.recomputed:
+                    break
+                await asyncio.sleep(0.01)
+            return await listed(sqlite_db)
+        finally:
+            await worker.stop()
+
+    rows = asyncio.run(main())
+    assert rows["g1"]["projected_value"] is not None
+    assert worker.stats()["running"] is False
+
+
+def test_stats_require_the_admin_token(monkeypatch):
+    client = TestClient(server.app)
+    assert client.get("/api/projections/stats").status_code == 404
+    monkeypatch.setattr(server, "PROFILE_ADMIN_TOKEN", "secret")
+    assert client.get("/api/projections/stats", headers={"X-Admin-Token": "nope"}).status_code == 403
+    stats = client.get("/api/projections/stats", headers={"X-Admin-Token": "secret"}).json()
+    assert stats["recomputed"] == server.projection_worker.recomputed
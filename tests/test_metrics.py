@@ -0,0 +1,67 @@
+import asyncio
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+
+import server
+from db import InstrumentedPool, statement_label
+from metrics import Exposition, HistogramFamily
+
+
+def test_exposition_text_format():
+    family = HistogramFamily(["route"], buckets=(0.1, 1.0))
+    family.labels('/a"b').observe(0.05)
+    family.labels('/a"b').observe(2.0)
+    exposition = Exposition(prefix="app_")
+    exposition.histogram("latency_seconds", "Latency.", family.samples())
+    exposition.scalar("queue_depth", "gauge", "Depth.", [({}, 3)])
+    assert exposition.render().splitlines() == [
+        "# HELP app_latency_seconds Latency.",
+        "# TYPE app_latency_seconds histogram",
+        'app_latency_seconds_bucket{route="/a\\"b",le="0.1"} 1',
+        'app_latency_seconds_bucket{route="/a\\"b",le="1.0"} 1',
+        'app_latency_seconds_bucket{route="/a\\"b",le="+Inf"} 2',
+        'app_latency_seconds_sum{route="/a\\"b"} 2.05',
+        'app_latency_seconds_count{route="/a\\"b"} 2',
+        "# HELP app_queue_depth Depth.",
+        "# TYPE app_queue_depth gauge",
+        "app_queue_depth 3",
+    ]
+
+
+def test_requests_are_timed_by_route_template(monkeypatch):
+    monkeypatch.setattr(server, "PROFILE_ADMIN_TOKEN", "secret")
+    client = TestClient(server.app)
+    params = {"age": 30, "monthly_investment": 500, "goal_amount": 1000000, "risk_profile": "moderate"}
+    client.get("/api/calculate", params=params)
+    client.get("/no/such/path")
+    assert server.request_seconds.labels("GET", "/api/calculate", "200").count >= 1
+    assert server.request_seconds.labels("GET", "unmatched", "404").count >= 1
+
+    assert client.get("/metrics").status_code == 403
+    response = client.get("/metrics", headers={"X-Admin-Token": "secret"})
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+    assert 'wealthhub_http_request_duration_seconds_count{method="GET",route="/api/calculate",status="200"}' in body
+    assert 'wealthhub_compute_duration_seconds_count{operation="calculate"}' in body
+    assert "wealthhub_password_hash_seconds_count" in body
+
+
+def test_metrics_endpoint_can_be_disabled(monkeypatch):
+    # Like the other admin endpoints, hidden until an admin token is configured.
+    assert TestClient(server.app).get("/metrics").status_code == 404
+    monkeypatch.setattr(server, "PROFILE_ADMIN_TOKEN", "secret")
+    monkeypatch.setattr(server, "METRICS_ENABLED", False)
+    assert TestClient(server.app).get("/metrics", headers={"X-Admin-Token": "secret"}).status_code == 404
+
+
+def test_pool_times_every_statement():
+    loggers = []
+    conn = SimpleNamespace(get_server_pid=lambda: 1, add_query_logger=loggers.append)
+    family = HistogramFamily(["statement"])
+    pool = InstrumentedPool(1, 10, 0, query_seconds=family)
+    asyncio.run(pool.init_connection(conn))
+    [observe] = loggers
+    observe(SimpleNamespace(query="SELECT 1\n   FROM users", elapsed=0.25))
+    assert family.labels("SELECT 1 FROM users").sum == 0.25
+    assert statement_label("x" * 500) == "x" * 200
@@ -0,0 +1,66 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+import migrations
+
+
+class MigrationConnection:
+    """Records statements; ``schema_version`` rows live in ``applied``."""
+
+    def __init__(self, applied=()):
+        self.applied = list(applied)
+        self.table_exists = bool(applied)
+        self.statements = []
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+
+    async def fetchval(self, query, *args):
+        if "to_regclass" in query:
+            return "schema_version" if self.table_exists else None
+        return max(self.applied, default=0)
+
+    async def execute(self, query, *args):
+        self.statements.append((" ".join(query.split()), args))
+        if "CREATE TABLE IF NOT EXISTS schema_version" in query:
+            self.table_exists = True
+        if query.startswith("INSERT INTO schema_version"):
+            self.applied.append(args[0])
+
+
+def test_pending_migrations_apply_in_order_under_the_lock():
+    conn = MigrationConnection()
+    assert asyncio.run(migrations.migrate(conn)) == [number for number, _, _ in migrations.MIGRATIONS]
+    assert conn.statements[0] == ("SELECT pg_advisory_lock($1)", (migrations.LOCK_ID,))
+    assert conn.statements[-1] == ("SELECT pg_advisory_unlock($1)", (migrations.LOCK_ID,))
+    assert conn.applied == list(range(1, migrations.LATEST_VERSION + 1))
+
+
+def test_applied_migrations_are_skipped():
+    conn = MigrationConnection(applied=[1, 2])
+    assert asyncio.run(migrations.migrate(conn)) == list(range(3, migrations.LATEST_VERSION + 1))
+    assert asyncio.run(migrations.migrate(conn)) == []
+
+
+def test_lock_is_released_when_a_migration_fails():
+    class Failing(MigrationConnection):
+        async def execute(self, query, *args):
+            if "boom" in query:
+                raise RuntimeError("syntax error")
+            await super().execute(query, *args)
+
+    conn = Failing()
+    with pytest.raises(RuntimeError):
+        asyncio.run(migrations.migrate(conn, [(1, "ok", "SELECT 1"), (2, "bad", "boom")]))
+    assert conn.applied == [1]
+    assert conn.statements[-1][0] == "SELECT pg_advisory_unlock($1)"
+
+
+def test_startup_check_requires_the_latest_version():
+    with pytest.raises(migrations.SchemaOutOfDate):
+        asyncio.run(migrations.require_latest(MigrationConnection()))
+    # Newer than this build is fine.
+    asyncio.run(migrations.require_latest(MigrationConnection(applied=list(range(1, migrations.LATEST_VERSION + 2)))))
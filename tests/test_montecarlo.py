@@ -0,0 +1,73 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+import montecarlo
+import server
+
+REQUEST = {
+    "age": 35,
+    "monthly_investment": 4000,
+    "goal_amount": 5000000,
+    "risk_profile": "aggressive",
+    "paths": 6000,
+    "seed": 1234,
+}
+
+
+def simulate(**overrides):
+    args = dict(age=35, monthly_investment=4000.0, goal_amount=5e6, annual_return=0.13,
+                volatility=0.18, paths=6000, seed=1234)
+    args.update(overrides)
+    return asyncio.run(montecarlo.simulate(**args))
+
+
+def test_same_seed_reproduces_bands():
+    client = TestClient(server.app)
+    first = client.post("/api/calculate/montecarlo", json=REQUEST).json()
+    second = client.post("/api/calculate/montecarlo", json=REQUEST).json()
+    assert first == second
+    assert first["seed"] == 1234
+    assert len(first["projection"]) == 65 - 35
+
+
+def test_process_pool_matches_inline(monkeypatch):
+    inline = simulate()
+    monkeypatch.setattr(montecarlo, "POOL_WORKERS", 2)
+    monkeypatch.setattr(montecarlo, "POOL_MIN_PATHS", 1000)
+    try:
+        pooled = simulate()
+    finally:
+        montecarlo.shutdown_pool()
+    assert pooled == inline
+
+
+def test_bands_are_ordered_and_probability_grows():
+    result = simulate(seed=7)
+    probabilities = [year["probability_of_goal"] for year in result["projection"]]
+    assert probabilities == sorted(probabilities)
+    assert result["probability_of_goal"] == probabilities[-1]
+    for year in result["projection"]:
+        assert year["p10"] <= year["p50"] <= year["p90"]
+
+
+def test_median_tracks_fixed_return_projection():
+    # Growth factors have the profile's return as their mean, so the
+    # deterministic balance sits between the bands.
+    result = simulate(volatility=0.12, annual_return=0.10, goal_amount=1e12, seed=3)
+    fixed = server.project(35, 4000.0, 1e12, 0.10)["projection"]
+    for band, year in zip(result["projection"], fixed):
+        assert band["p10"] <= year["value"] <= band["p90"]
+
+
+def test_no_years_left():
+    assert simulate(age=70) == {"projection": [], "probability_of_goal": 0.0}
+
+
+def test_amounts_that_would_overflow_are_rejected():
+    client = TestClient(server.app)
+    for field in ("monthly_investment", "goal_amount"):
+        for amount in (1e308, -1e308, server.MAX_AMOUNT * 10):
+            assert client.post("/api/calculate/montecarlo", json={**REQUEST, field: amount}).status_code == 422
+    largest = client.post("/api/calculate/montecarlo", json={**REQUEST, "monthly_investment": server.MAX_AMOUNT, "age": 0})
+    assert largest.status_code == 200 and largest.json()["projection"][-1]["p90"] > 0
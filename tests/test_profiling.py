@@ -0,0 +1,83 @@
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import server
+from profiler import Profile, ProfileStore, ProfilingMiddleware
+
+
+def busy_wait(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def profiled_app(sample_rate=0.0, token="secret", size=2):
+    app = FastAPI()
+
+    @app.get("/work")
+    def work():
+        busy_wait(0.05)
+        return {"ok": True}
+
+    store = ProfileStore(size)
+    app.add_middleware(ProfilingMiddleware, store=store, sample_rate=sample_rate, token=token, interval=0.001)
+    return TestClient(app), store
+
+
+def test_only_requests_with_the_admin_header_are_profiled():
+    client, store = profiled_app()
+    assert "x-profile-id" not in client.get("/work").headers
+    assert "x-profile-id" not in client.get("/work", headers={"X-Profile": "wrong"}).headers
+    assert store.list() == []
+
+    response = client.get("/work", headers={"X-Profile": "secret"})
+    profile = store.get(int(response.headers["x-profile-id"]))
+    assert (profile.method, profile.path, profile.status) == ("GET", "/work", 200)
+    assert any("busy_wait" in ";".join(stack) for stack in profile.samples)
+
+
+def test_sample_rate_profiles_without_a_header():
+    client, store = profiled_app(sample_rate=1.0, token="")
+    client.get("/work")
+    assert len(store.list()) == 1
+
+
+def test_ring_buffer_keeps_the_latest_profiles():
+    client, store = profiled_app(sample_rate=1.0, size=2)
+    ids = [int(client.get("/work").headers["x-profile-id"]) for _ in range(3)]
+    assert [profile["id"] for profile in store.list()] == ids[:0:-1]
+    assert store.get(ids[0]) is None
+
+
+def test_exports():
+    profile = Profile("GET", "/x", interval=0.01)
+    profile.samples = {("main", "a", "b"): 3, ("main", "a"): 1}
+    assert profile.collapsed() == "main;a 1\nmain;a;b 3\n"
+    speedscope = profile.speedscope()
+    frames = [frame["name"] for frame in speedscope["shared"]["frames"]]
+    [sampled] = speedscope["profiles"]
+    assert [[frames[i] for i in sample] for sample in sampled["samples"]] == [["main", "a", "b"], ["main", "a"]]
+    assert sampled["weights"] == [0.03, 0.01]
+
+
+def test_admin_endpoints(monkeypatch):
+    client = TestClient(server.app)
+    assert client.get("/api/admin/profiles").status_code == 404
+
+    profile = Profile("POST", "/api/calculate", interval=0.01)
+    profile.samples = {("main", "calculate"): 2}
+    store = ProfileStore(5)
+    store.add(profile)
+    monkeypatch.setattr(server, "PROFILE_ADMIN_TOKEN", "secret")
+    monkeypatch.setattr(server, "profile_store", store)
+    assert client.get("/api/admin/profiles", headers={"X-Admin-Token": "nope"}).status_code == 403
+
+    headers = {"X-Admin-Token": "secret"}
+    assert [p["id"] for p in client.get("/api/admin/profiles", headers=headers).json()] == [profile.id]
+    collapsed = client.get(f"/api/admin/profiles/{profile.id}", params={"format": "collapsed"}, headers=headers)
+    assert collapsed.text == "main;calculate 2\n"
+    speedscope = client.get(f"/api/admin/profiles/{profile.id}", headers=headers).json()
+    assert speedscope["profiles"][0]["type"] == "sampled"
+    assert client.get("/api/admin/profiles/0", headers=headers).status_code == 404
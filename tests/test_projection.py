@@ -0,0 +1,190 @@
+import random
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from projection import RISK_RETURNS, annual_return_for, project, project_batch
+from server import InvestmentResult
+
+
+def legacy_calculate(age, monthly_investment, goal_amount, risk_profile):
+    """The month-by-month loop /api/calculate used before the closed-form engine."""
+    risk_returns = {
+        "conservative": 0.07,
+        "moderate": 0.10,
+        "aggressive": 0.13
+    }
+    annual_return = risk_returns.get(risk_profile.lower(), 0.10)
+    monthly_return = annual_return / 12
+    projection = []
+    current_value = 0
+    months = 0
+    max_years = 65 - age
+    for year in range(max_years):
+        for month in range(12):
+            current_value = (current_value + monthly_investment) * (1 + monthly_return)
+            months += 1
+            if month == 11:
+                projection.append({
+                    "year": year + 1,
+                    "age": age + year + 1,
+                    "value": round(current_value, 2),
+                    "invested": round((months * monthly_investment), 2)
+                })
+            if current_value >= goal_amount:
+                return InvestmentResult(
+                    projection=projection,
+                    total_invested=round(months * monthly_investment, 2),
+                    projected_value=round(current_value, 2),
+                    years_to_goal=year + 1
+                )
+    return InvestmentResult(
+        projection=projection,
+        total_invested=round(months * monthly_investment, 2),
+        projected_value=round(current_value, 2),
+        years_to_goal=max_years
+    )
+
+
+def closed_form(age, monthly_investment, goal_amount, risk_profile):
+    return InvestmentResult(**project(age, monthly_investment, goal_amount, annual_return_for(risk_profile)))
+
+
+def random_cases(count, seed):
+    rng = random.Random(seed)
+    profiles = list(RISK_RETURNS) + ["MODERATE", "unknown"]
+    for _ in range(count):
+        monthly = round(rng.uniform(0.01, 200000), rng.choice([0, 2, 3]))
+        goal = rng.choice([
+            rng.uniform(1000, 1e8),
+            round(rng.uniform(1e4, 5e7), -3),
+            1e15,
+        ])
+        yield rng.randint(0, 70), monthly, goal, rng.choice(profiles)
+
+
+@pytest.mark.parametrize("case", list(random_cases(3000, seed=20240601)))
+def test_closed_form_matches_legacy_loop(case):
+    assert closed_form(*case).model_dump_json() == legacy_calculate(*case).model_dump_json()
+
+
+@pytest.mark.parametrize("case", [
+    (30, 5000.0, 1000000.0, "moderate"),
+    (64, 100.0, 1e9, "aggressive"),
+    (65, 100.0, 1e6, "moderate"),
+    (80, 100.0, 1e6, "moderate"),
+    (30, 0.0, 1e6, "moderate"),
+    (30, -250.0, 1e6, "conservative"),
+    (30, 500.0, 0.0, "moderate"),
+    (30, 500.0, -10.0, "moderate"),
+    (30, 1e300, 1e308, "aggressive"),
+    (30, 0.005, 10.0, "moderate"),
+    (30, 1234.565, 1e12, "conservative"),
+])
+def test_edge_cases_match_legacy_loop(case):
+    assert closed_form(*case).model_dump_json() == legacy_calculate(*case).model_dump_json()
+
+
+def test_negative_ages_project_the_whole_horizon():
+    result = project(-5, 100.0, 1e12, 0.10)
+    assert len(result["projection"]) == 70 and result["projected_value"] == 12877806.17
+    assert closed_form(-5, 100.0, 1e12, "moderate").model_dump_json() == legacy_calculate(-5, 100.0, 1e12, "moderate").model_dump_json()
+
+
+def test_calculation_endpoints_reject_negative_ages():
+    client = TestClient(server.app)
+    body = {"age": -1, "monthly_investment": 500, "goal_amount": 1000000, "risk_profile": "moderate"}
+    response = client.post("/api/calculate", json=body)
+    assert response.status_code == 422 and response.json()["detail"][0]["loc"] == ["body", "age"]
+    assert client.post("/api/calculate/montecarlo", json=body).status_code == 422
+    assert client.post("/api/calculate/solve", json={**body, "target_age": 60}).status_code == 422
+
+
+def test_goal_exactly_on_a_monthly_balance():
+    # Goals equal to a balance the loop produces sit on the decision boundary.
+    monthly_return = 0.10 / 12
+    balance = 0
+    for month in range(1, 200):
+        balance = (balance + 750.0) * (1 + monthly_return)
+        case = (40, 750.0, balance, "moderate")
+        assert closed_form(*case).model_dump_json() == legacy_calculate(*case).model_dump_json()
+
+
+def test_calculate_endpoint_is_byte_identical():
+    client = TestClient(server.app)
+    for age, monthly, goal, profile in random_cases(50, seed=7):
+        response = client.post("/api/calculate", json={
+            "age": age, "monthly_investment": monthly, "goal_amount": goal, "risk_profile": profile,
+        })
+        assert response.status_code == 200
+        assert response.content == legacy_calculate(age, monthly, goal, profile).model_dump_json().encode()
+
+
+def test_batch_matches_single_projection():
+    cases = list(random_cases(500, seed=99))
+    batch = project_batch(*zip(*[(age, monthly, goal, annual_return_for(profile)) for age, monthly, goal, profile in cases]))
+    for case, result in zip(cases, batch):
+        assert InvestmentResult(**result).model_dump_json() == legacy_calculate(*case).model_dump_json()
+
+
+@pytest.mark.parametrize("cases", [
+    [],
+    [(70, 5.0, 1.0, "moderate"), (65, 100.0, 1e6, "aggressive")],
+    [(-5, 100.0, 1e12, "moderate"), (30, 100.0, 1e6, "conservative"), (65, 100.0, 1e6, "moderate")],
+])
+def test_batch_without_months_to_step(cases):
+    columns = [list(column) for column in zip(*cases)] or [[], [], [], []]
+    batch = project_batch(*columns[:3], [annual_return_for(profile) for profile in columns[3]])
+    assert [InvestmentResult(**result) for result in batch] == [legacy_calculate(*case) for case in cases]
+
+
+def test_batch_endpoint_reports_item_errors_in_place():
+    client = TestClient(server.app)
+    items = [
+        {"age": 30, "monthly_investment": 5000, "goal_amount": 1000000, "risk_profile": "moderate"},
+        {"age": "thirty", "monthly_investment": 5000, "goal_amount": 1000000, "risk_profile": "moderate"},
+        {"age": 45, "monthly_investment": 800, "goal_amount": 250000, "risk_profile": "aggressive"},
+        {"age": -5, "monthly_investment": 100, "goal_amount": 1e12, "risk_profile": "moderate"},
+    ]
+    response = client.post("/api/calculate/batch", json=items)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["results"][1] is None and body["results"][3] is None
+    assert [error["index"] for error in body["errors"]] == [1, 3]
+    assert body["errors"][0]["detail"][0]["loc"] == body["errors"][1]["detail"][0]["loc"] == ["age"]
+    for index in (0, 2):
+        single = client.post("/api/calculate", json=items[index]).json()
+        assert body["results"][index] == single
+
+
+def test_batch_endpoint_rejects_oversized_batches(monkeypatch):
+    monkeypatch.setattr(server, "MAX_BATCH_SIZE", 2)
+    client = TestClient(server.app)
+    item = {"age": 30, "monthly_investment": 5000, "goal_amount": 1000000, "risk_profile": "moderate"}
+    assert client.post("/api/calculate/batch", json=[item] * 3).status_code == 413
+
+
+def test_calculate_etag_and_get_form():
+    client = TestClient(server.app)
+    params = {"age": 30, "monthly_investment": 500, "goal_amount": 1000000, "risk_profile": "moderate"}
+    posted = client.post("/api/calculate", json=params)
+    fetched = client.get("/api/calculate", params=params)
+    assert fetched.json() == posted.json()
+    assert fetched.headers["ETag"] == posted.headers["ETag"]
+    assert fetched.headers["Cache-Control"] == f"public, max-age={server.CALCULATE_MAX_AGE_SECONDS}"
+
+    revalidated = client.get("/api/calculate", params=params, headers={"If-None-Match": posted.headers["ETag"]})
+    assert revalidated.status_code == 304 and not revalidated.content
+    other = client.post("/api/calculate", json={**params, "age": 31}, headers={"If-None-Match": posted.headers["ETag"]})
+    assert other.status_code == 200 and other.headers["ETag"] != posted.headers["ETag"]
+
+
+def test_calculate_fast_json_path(monkeypatch):
+    client = TestClient(server.app)
+    params = {"age": 30, "monthly_investment": 500, "goal_amount": 1e12, "risk_profile": "moderate"}
+    default = client.post("/api/calculate", json=params)
+    monkeypatch.setattr(server.fastjson, "ENABLED", True)
+    fast = client.post("/api/calculate", json=params)
+    assert fast.json() == default.json()
+    assert fast.headers["ETag"] == default.headers["ETag"]
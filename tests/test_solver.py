@@ -0,0 +1,91 @@
+import random
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from projection import months_to_goal, required_monthly_investment
+
+
+@pytest.fixture
+def client():
+    return TestClient(server.app)
+
+
+def calculate(client, age, monthly, goal, profile):
+    return client.post("/api/calculate", json={
+        "age": age, "monthly_investment": monthly, "goal_amount": goal, "risk_profile": profile,
+    }).json()
+
+
+def reached(result, goal):
+    return result["projected_value"] >= goal
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_required_monthly_investment_is_the_smallest_cent_amount(client, seed):
+    rng = random.Random(seed)
+    age = rng.randint(20, 55)
+    target_age = rng.randint(age + 1, 65)
+    goal = round(rng.uniform(1e4, 2e7), 2)
+    profile = rng.choice(["conservative", "moderate", "aggressive"])
+    response = client.post("/api/calculate/solve", json={
+        "age": age, "goal_amount": goal, "risk_profile": profile, "target_age": target_age,
+    })
+    assert response.status_code == 200
+    body = response.json()
+    assert body["achievable"]
+    assert body["target_age"] <= target_age
+
+    enough = calculate(client, age, body["monthly_investment"], goal, profile)
+    assert age + enough["years_to_goal"] <= target_age
+    assert enough["projected_value"] == body["projected_value"]
+    short = calculate(client, age, round(body["monthly_investment"] - 0.01, 2), goal, profile)
+    assert not (reached(short, goal) and age + short["years_to_goal"] <= target_age)
+
+
+@pytest.mark.parametrize("budget, goal", [(5000, 1000000), (1500, 2000000), (12000.5, 350000)])
+def test_budget_gives_earliest_age(client, budget, goal):
+    body = client.post("/api/calculate/solve", json={
+        "age": 30, "goal_amount": goal, "risk_profile": "moderate", "monthly_budget": budget,
+    }).json()
+    plan = calculate(client, 30, budget, goal, "moderate")
+    assert body["achievable"]
+    assert body["target_age"] == 30 + plan["years_to_goal"]
+    assert body["total_invested"] == plan["total_invested"]
+
+
+def test_unreachable_budget(client):
+    body = client.post("/api/calculate/solve", json={
+        "age": 60, "goal_amount": 1e9, "risk_profile": "conservative", "monthly_budget": 100,
+    }).json()
+    assert body["achievable"] is False
+    assert body["target_age"] is None
+
+
+def test_requires_exactly_one_unknown(client):
+    base = {"age": 30, "goal_amount": 100000, "risk_profile": "moderate"}
+    assert client.post("/api/calculate/solve", json=base).status_code == 422
+    both = dict(base, target_age=50, monthly_budget=100)
+    assert client.post("/api/calculate/solve", json=both).status_code == 422
+    assert client.post("/api/calculate/solve", json=dict(base, target_age=30)).status_code == 400
+
+
+@pytest.mark.parametrize("goal", [1e15, 1e21, 1e300, 1.7e308])
+def test_huge_goals_are_solved_without_stepping_cent_by_cent(goal):
+    monthly = required_monthly_investment(goal, 0.1, 360)
+    assert months_to_goal(monthly, goal, 0.1, 360) is not None
+    below = monthly - 0.01
+    assert below == monthly or months_to_goal(below, goal, 0.1, 360) is None
+
+
+def test_goals_above_the_cap_are_rejected(client):
+    for goal in (server.MAX_AMOUNT * 10, 1.7e308):
+        response = client.post("/api/calculate/solve", json={
+            "age": 30, "goal_amount": goal, "risk_profile": "moderate", "target_age": 60,
+        })
+        assert response.status_code == 422
+    capped = client.post("/api/calculate/solve", json={
+        "age": 30, "goal_amount": server.MAX_AMOUNT, "risk_profile": "moderate", "target_age": 60,
+    })
+    assert capped.status_code == 200 and capped.json()["achievable"]
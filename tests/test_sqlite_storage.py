@@ -0,0 +1,132 @@
+import asyncio
+import json
+from datetime import datetime, timezone
+
+import httpx
+
+import server
+from sqlite_storage import SqliteStorage, from_micros, to_micros
+
+
+def goal(index, target=1000.0):
+    return {"goal_type": "Travel", "target_amount": target + index, "current_amount": 10.0,
+            "monthly_investment": 100.0, "risk_profile": "moderate"}
+
+
+def test_the_api_runs_end_to_end_on_sqlite(sqlite_db, monkeypatch):
+    monkeypatch.setattr(server.app.state, "storage", sqlite_db)
+    monkeypatch.setattr(server, "AUTH_STATELESS_TOKENS", False)
+    monkeypatch.setattr(server, "PROFILE_ADMIN_TOKEN", "secret")
+
+    async def main():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            account = {"email": "sqlite@example.com", "name": "Lite", "password": "hunter22"}
+            assert (await client.post("/api/auth/register", json=account)).status_code == 200
+            assert (await client.post("/api/auth/register", json=account)).status_code == 400
+            login = await client.post("/api/auth/login", json={"email": account["email"], "password": "hunter22"})
+            headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+            me = await client.get("/api/auth/me", headers=headers)
+            assert me.json()["email"] == account["email"]
+
+            created = await client.post("/api/goals", json=goal(0), headers=headers)
+            goal_id = created.json()["id"]
+            body = "".join(json.dumps(goal(index)) + "\n" for index in range(1, 6)) + "not json\n"
+            bulk = await client.post("/api/goals/bulk", content=body,
+                                     headers={**headers, "Content-Type": "application/x-ndjson"})
+            assert [result["status"] for result in bulk.json()["results"]] == [201] * 5 + [422]
+
+            first = await client.get("/api/goals", params={"limit": 4}, headers=headers)
+            second = await client.get("/api/goals", params={"limit": 4, "after": first.headers["X-Next-Cursor"]},
+                                      headers=headers)
+            assert "X-Next-Cursor" not in second.headers
+            listed = [g["id"] for g in first.json() + second.json()]
+            assert len(set(listed)) == 6 and goal_id in listed
+            again = await client.get("/api/goals", params={"limit": 4}, headers={**headers, "If-None-Match": first.headers["ETag"]})
+            assert again.status_code == 304
+            assert (await client.get("/api/goals", params={"min_target": 1004}, headers=headers)).json()[0]["target_amount"] == 1005
+
+            updated = await client.put(f"/api/goals/{goal_id}", json={"current_amount": 50.0},
+                                       headers={**headers, "If-Match": '"1"'})
+            assert updated.json()["current_amount"] == 50.0 and updated.headers["ETag"] == '"2"'
+            stale = await client.put(f"/api/goals/{goal_id}", json={"current_amount": 60.0},
+                                     headers={**headers, "If-Match": '"1"'})
+            assert stale.status_code == 412
+            changed = await client.get("/api/goals", params={"limit": 4}, headers={**headers, "If-None-Match": first.headers["ETag"]})
+            assert changed.status_code == 200
+
+            other_id = next(listed_id for listed_id in listed if listed_id != goal_id)
+            patched = await client.request("PATCH", "/api/goals/bulk", headers=headers, json=[
+                {"id": goal_id, "version": 2, "monthly_investment": 200.0},
+                {"id": other_id, "version": 7, "current_amount": 1.0},
+                {"id": "missing", "current_amount": 1.0},
+            ])
+            assert [result["status"] for result in patched.json()["results"]] == [200, 412, 404]
+
+            summary = await client.get("/api/goals/summary", params={"age": 40}, headers=headers)
+            assert len(summary.json()["goals"]) == 6
+            assert summary.json()["total_monthly_investment"] == 700.0
+
+            deleted = await client.request("DELETE", "/api/goals/bulk", headers=headers, json=listed[:2] + ["missing"])
+            assert [result["status"] for result in deleted.json()["results"]] == [200, 200, 404]
+            assert (await client.delete(f"/api/goals/{listed[0]}", headers=headers)).status_code == 404
+            assert (await client.delete(f"/api/goals/{listed[2]}", headers=headers)).status_code == 200
+
+            assert (await client.post("/api/contact", json={"name": "A", "email": "a@b.c", "message": "hi"})).status_code == 200
+            await server.contact_queue.drain(timeout=5)
+            assert (await client.get("/api/db/stats")).status_code == 403
+            return (await client.get("/api/db/stats", headers={"X-Admin-Token": "secret"})).json()
+
+    stats = asyncio.run(main())
+    assert stats["backend"] == "sqlite" and stats["writes"] > 0
+    conn = sqlite_db._reader()
+    assert conn.execute("SELECT count(*) FROM goals").fetchone()[0] == 3
+    assert conn.execute("SELECT message FROM contact_messages").fetchone()[0] == "hi"
+
+
+def test_concurrent_writes_share_commits_and_fail_independently(sqlite_db):
+    now = datetime.now(timezone.utc)
+
+    async def main():
+        await sqlite_db.create_user(("user-1", "a@b.c", "A", "", "hash", now))
+        writes = [sqlite_db.create_goal((f"goal-{i}", "user-1", "Travel", 1.0, 0.0, 1.0, "moderate", now)) for i in range(50)]
+        # Violates the foreign key, so only this write fails.
+        writes.append(sqlite_db.create_goal(("orphan", "nobody", "Travel", 1.0, 0.0, 1.0, "moderate", now)))
+        return await asyncio.gather(*writes, return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert results[:50] == [None] * 50 and isinstance(results[50], Exception)
+    assert sqlite_db.write_batches < sqlite_db.writes
+    conn = sqlite_db._reader()
+    assert conn.execute("SELECT count(*) FROM goals").fetchone()[0] == 50
+    # One bump per inserted goal, from the triggers.
+    assert conn.execute("SELECT goals_version FROM users").fetchone()[0] == 50
+
+
+def test_data_and_schema_survive_reopening(tmp_path):
+    path = str(tmp_path / "wealthhub.db")
+    created_at = datetime(2024, 5, 6, 7, 8, 9, 123456, tzinfo=timezone.utc)
+
+    async def write():
+        db = SqliteStorage(path).open()
+        assert await db.create_user(("user-1", "a@b.c", "A", "", "hash", created_at))
+        assert not await db.create_user(("user-2", "a@b.c", "B", "", "hash", created_at))
+        await db.close()
+
+    async def read():
+        db = SqliteStorage(path).open()
+        try:
+            return await db.get_user_for_login("a@b.c"), db._reader().execute("PRAGMA journal_mode").fetchone()[0]
+        finally:
+            await db.close()
+
+    asyncio.run(write())
+    row, journal_mode = asyncio.run(read())
+    assert row["id"] == "user-1" and row["created_at"] == created_at
+    assert journal_mode == "wal"
+
+
+def test_timestamps_round_trip_at_microsecond_precision():
+    value = datetime(1999, 12, 31, 23, 59, 59, 999999, tzinfo=timezone.utc)
+    assert from_micros(to_micros(value)) == value
+    assert to_micros(value.replace(tzinfo=None)) == to_micros(value)
@@ -0,0 +1,29 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parent.parent / "backend"
+# Generous enough for a loaded CI runner; a fresh import takes well under a second.
+COLD_START_BUDGET_SECONDS = float(os.environ.get("COLD_START_BUDGET_SECONDS", "2.0"))
+
+PROBE = """
+import sys, json
+import server
+from lazy import loaded
+print(json.dumps({
+    "passlib": "passlib.context" in sys.modules,
+    "jwt": loaded(server.jwt),
+    "montecarlo": loaded(server.montecarlo),
+}))
+"""
+
+
+def test_app_imports_within_cold_start_budget_without_heavy_modules():
+    started_at = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", PROBE], cwd=BACKEND, capture_output=True, text=True, check=True)
+    elapsed = time.perf_counter() - started_at
+    assert json.loads(result.stdout) == {"passlib": False, "jwt": False, "montecarlo": False}
+    assert elapsed < COLD_START_BUDGET_SECONDS, f"importing server took {elapsed:.2f}s"
@@ -0,0 +1,89 @@
+import asyncio
+import json
+import os
+
+import numpy as np
+import pytest
+
+import projection
+import tables
+from projection import RISK_RETURNS, annuity_factors, project
+from tests.test_projection import legacy_calculate, random_cases
+from server import InvestmentResult
+
+
+@pytest.fixture(autouse=True)
+def restore_assumptions():
+    original = dict(RISK_RETURNS)
+    yield
+    RISK_RETURNS.clear()
+    RISK_RETURNS.update(original)
+    projection.use_factor_tables({})
+
+
+def test_tables_are_built_once_and_memory_mapped(tmp_path):
+    first = tables.load(RISK_RETURNS, str(tmp_path))
+    [path] = tmp_path.iterdir()
+    mtime = os.stat(path).st_mtime_ns
+    second = tables.load(RISK_RETURNS, str(tmp_path))
+    assert os.stat(path).st_mtime_ns == mtime
+    assert isinstance(np.load(path, mmap_mode='r'), np.memmap)
+    for rate, row in second.items():
+        assert np.array_equal(row, first[rate])
+        assert np.array_equal(row, annuity_factors(rate / 12, np.arange(len(row), dtype=np.float64)))
+
+
+def test_corrupt_table_file_is_rebuilt(tmp_path):
+    rates = sorted(set(RISK_RETURNS.values()))
+    np.save(tables.table_path(rates, str(tmp_path)), np.zeros((1, 3)))
+    loaded = tables.load(RISK_RETURNS, str(tmp_path))
+    assert len(loaded[0.10]) == 12 * projection.RETIREMENT_AGE + 1
+
+
+def test_tampered_table_file_is_not_used(tmp_path):
+    rates = sorted(set(RISK_RETURNS.values()))
+    path = tables.table_path(rates, str(tmp_path))
+    np.save(path, tables.build(rates) * 2)
+    loaded = tables.load(RISK_RETURNS, str(tmp_path))
+    assert np.array_equal(loaded[0.10], annuity_factors(0.10 / 12, np.arange(len(loaded[0.10]), dtype=np.float64)))
+    assert np.array_equal(np.load(path), tables.build(rates))
+
+
+def test_table_lookups_match_the_legacy_loop(tmp_path):
+    tables.install(dict(RISK_RETURNS), str(tmp_path))
+    for age, monthly, goal, profile in random_cases(3000, seed=15):
+        result = InvestmentResult(**project(age, monthly, goal, projection.annual_return_for(profile)))
+        assert result == legacy_calculate(age, monthly, goal, profile)
+
+
+def test_install_replaces_assumptions(tmp_path):
+    tables.install({"moderate": 0.08, "cautious": 0.04}, str(tmp_path))
+    assert RISK_RETURNS == {"moderate": 0.08, "cautious": 0.04}
+    assert projection.annual_return_for("Cautious") == 0.04
+    assert set(projection._factor_tables) == {0.04, 0.08}
+
+
+@pytest.mark.parametrize("body", ['[]', '{}', '{"moderate": "high"}', '{"moderate": 1.5}', '{"moderate": true}'])
+def test_invalid_assumptions_are_rejected(tmp_path, body):
+    path = tmp_path / "returns.json"
+    path.write_text(body)
+    with pytest.raises(ValueError):
+        tables.read_returns(str(path))
+
+
+def test_watch_reloads_when_the_file_changes(tmp_path):
+    path = tmp_path / "returns.json"
+    path.write_text(json.dumps({"moderate": 0.09}))
+
+    async def main():
+        watcher = asyncio.create_task(tables.watch(str(path), 0.01, str(tmp_path)))
+        await asyncio.sleep(0.1)
+        first = dict(RISK_RETURNS)
+        path.write_text(json.dumps({"moderate": 0.11}))
+        os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1_000_000))
+        await asyncio.sleep(0.1)
+        watcher.cancel()
+        return first
+
+    assert asyncio.run(main()) == {"moderate": 0.09}
+    assert RISK_RETURNS == {"moderate": 0.11}
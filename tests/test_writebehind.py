@@ -0,0 +1,151 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from writebehind import QueueFull, WriteBehindQueue
+
+
+class CopyPool:
+    def __init__(self, failures=0):
+        self.batches = []
+        self.failures = failures
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self
+
+    async def copy_records_to_table(self, table, records, columns):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("connection lost")
+        self.batches.append(list(records))
+
+
+def make_queue(pool, max_queue=100, batch_size=3, flush_interval=0.05, enqueue_timeout=0.05):
+    async def write(batch):
+        async with pool.acquire() as conn:
+            await conn.copy_records_to_table("contact_messages", records=batch, columns=["id"])
+
+    return WriteBehindQueue("contact_messages", write, max_queue, batch_size, flush_interval, enqueue_timeout,
+                            retry_seconds=0)
+
+
+def test_records_are_flushed_by_size_and_interval():
+    pool = CopyPool()
+    queue = make_queue(pool)
+
+    async def main():
+        for i in range(4):
+            await queue.put((i,))
+        await asyncio.sleep(0.2)
+
+    asyncio.run(main())
+    assert pool.batches == [[(0,), (1,), (2,)], [(3,)]]
+    stats = queue.stats()
+    assert stats["flushed"] == 4 and stats["batches"] == 2 and stats["queue_depth"] == 0
+    assert stats["flush_seconds"]["count"] == 2
+
+
+def test_drain_flushes_without_waiting_for_the_interval():
+    pool = CopyPool()
+    queue = make_queue(pool, batch_size=100, flush_interval=60)
+
+    async def main():
+        for i in range(5):
+            await queue.put((i,))
+        await asyncio.wait_for(queue.drain(timeout=1), 1)
+
+    asyncio.run(main())
+    assert pool.batches == [[(i,) for i in range(5)]]
+
+
+def test_failed_flushes_are_retried():
+    pool = CopyPool(failures=2)
+    queue = make_queue(pool)
+
+    async def main():
+        await queue.put((1,))
+        await queue.drain(timeout=1)
+
+    asyncio.run(main())
+    assert pool.batches == [[(1,)]]
+    assert queue.flush_failures == 2
+
+
+def test_a_row_that_never_writes_is_dropped_and_the_rest_are_written():
+    class RejectingPool(CopyPool):
+        async def copy_records_to_table(self, table, records, columns):
+            if ("bad\x00",) in records:
+                raise ValueError("invalid byte sequence for encoding UTF8: 0x00")
+            await super().copy_records_to_table(table, records, columns)
+
+    pool = RejectingPool()
+    queue = make_queue(pool, batch_size=5)
+
+    async def main():
+        for record in [(0,), (1,), ("bad\x00",), (3,), (4,), (5,)]:
+            await queue.put(record)
+        await asyncio.wait_for(queue.drain(timeout=1), 1)
+
+    asyncio.run(main())
+    assert sorted(row for batch in pool.batches for row in batch) == [(0,), (1,), (3,), (4,), (5,)]
+    stats = queue.stats()
+    assert stats["dropped"] == 1 and stats["flushed"] == 5 and stats["queue_depth"] == 0
+
+
+def test_an_outage_fills_the_queue_instead_of_dropping_rows(monkeypatch):
+    pool = CopyPool(failures=10 ** 9)
+    queue = make_queue(pool, max_queue=2, batch_size=1, flush_interval=0)
+    monkeypatch.setattr(server, "contact_queue", queue)
+
+    async def main():
+        accepted = []
+        for i in range(3):  # one retrying, two queued
+            await queue.put((i,))
+            accepted.append((i,))
+            await asyncio.sleep(0.01)
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            refused = await client.post("/api/contact", json={"name": "A", "email": "a@b.c", "message": "hi"})
+        pool.failures = 0
+        await asyncio.wait_for(queue.drain(timeout=1), 1)
+        return accepted, refused
+
+    accepted, refused = asyncio.run(main())
+    assert refused.status_code == 503 and refused.headers["Retry-After"] == str(server.CONTACT_RETRY_AFTER_SECONDS)
+    assert [row for batch in pool.batches for row in batch] == accepted
+    assert queue.dropped == 0 and queue.flush_failures > 10
+
+
+def test_full_queue_applies_backpressure():
+    class StuckPool(CopyPool):
+        async def copy_records_to_table(self, table, records, columns):
+            await asyncio.sleep(10)
+
+    queue = make_queue(StuckPool(), max_queue=2, batch_size=1, flush_interval=0)
+
+    async def main():
+        for i in range(3):  # one in flight, two queued
+            await queue.put((i,))
+            await asyncio.sleep(0)
+        with pytest.raises(QueueFull):
+            await queue.put((3,))
+
+    asyncio.run(main())
+    assert queue.rejected == 1
+
+
+def test_contact_is_acknowledged_before_it_is_written(monkeypatch):
+    pool = CopyPool()
+    monkeypatch.setattr(server.app.state, "pg_pool", pool, raising=False)
+    monkeypatch.setattr(server, "contact_queue", make_queue(pool))
+    monkeypatch.setattr(server, "PROFILE_ADMIN_TOKEN", "secret")
+    client = TestClient(server.app)
+    response = client.post("/api/contact", json={"name": "A", "email": "a@b.c", "message": "hi"})
+    assert response.status_code == 200
+    assert client.get("/api/contact/stats").status_code == 403
+    assert client.get("/api/contact/stats", headers={"X-Admin-Token": "secret"}).json()["enqueued"] == 1